@@ -0,0 +1,26 @@
+import argparse
+import time
+
+from epub_reader import EPUB_PATH
+from epub_to_md import ENGINES, get_chapter_id, read_items
+
+# Compares how many EPUB items per second each epub_to_md.py engine converts.
+parser = argparse.ArgumentParser()
+parser.add_argument("epub", nargs="?", default=EPUB_PATH)
+parser.add_argument(
+    "--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES)
+)
+args = parser.parse_args()
+
+items = list(read_items(args.epub))
+
+for engine in args.engines:
+    start = time.perf_counter()
+    markdown = ENGINES[engine](items)
+    elapsed = time.perf_counter() - start
+
+    chapters = sum(get_chapter_id(md) is not None for md in markdown)
+    print(
+        f"{engine}: {len(items)} items ({chapters} chapters) in {elapsed:.2f}s, "
+        f"{len(items) / elapsed:.1f} items/s"
+    )
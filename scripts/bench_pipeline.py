@@ -0,0 +1,395 @@
+import argparse
+import html
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from typing import Callable, Dict, List, Optional
+
+from chapter_writer import FORMATS, ChapterWriter
+from parse_cross_references import (
+    compile_references,
+    read_cross_references,
+    write_references_json,
+)
+from references import BOOK_NAMES, OSIS_IDS
+from usfm_to_md import convert_book, get_book_id, sort_books
+from verse_ids import load_verses, unpack_verse
+
+# Timings depend on the machine, so the baseline isn't committed. Make one
+# with `python scripts/bench_pipeline.py --save-baseline` before a change,
+# and later runs are compared against it.
+BASELINE_PATH = "scripts/bench_baseline.json"
+BENCHMARKS = ["usfm", "cross_references", "epub", "emit"]
+
+VERSE_RE = re.compile(r"\[(\d+)\]")
+
+# A benchmark does its work once and returns how long it took, how many items
+# (chapters, references) it handled, how many bytes it read or wrote and the
+# unit its items are counted in. It can add anything else it measured under
+# "details".
+Benchmark = Callable[[], dict]
+
+
+def measure(benchmark: Benchmark, repeat: int = 3) -> dict:
+    """
+    Runs a benchmark `repeat` times and keeps the fastest run, then runs it
+    once more under tracemalloc for its peak memory, so that tracing doesn't
+    slow down the timed runs.
+    """
+    result = min((benchmark() for _ in range(repeat)), key=lambda run: run["seconds"])
+
+    tracemalloc.start()
+    try:
+        benchmark()
+        result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    seconds = result["seconds"] or 1e-9
+    result["items_per_second"] = result["items"] / seconds
+    result["mb_per_second"] = result["bytes"] / seconds / 1e6
+    return result
+
+
+def get_book_file_paths(translation: str) -> List[str]:
+    usfm_dir = f"data/{translation}_usfm"
+    return [os.path.join(usfm_dir, name) for name in sort_books(os.listdir(usfm_dir))]
+
+
+def bench_usfm(book_file_paths: List[str], chapters: List[dict]) -> Benchmark:
+    # Converts every book with usfm_to_markdown, timing each one. The
+    # chapters of the last run are kept for the benchmarks that need them.
+    def run() -> dict:
+        books = {}
+        converted = []
+        size = 0
+        for book_file_path in book_file_paths:
+            size += os.path.getsize(book_file_path)
+            start = time.perf_counter()
+            converted.extend(convert_book(book_file_path))
+            books[get_book_id(os.path.basename(book_file_path))] = (
+                time.perf_counter() - start
+            )
+        chapters[:] = converted
+        return {
+            "seconds": sum(books.values()),
+            "items": len(converted),
+            "bytes": size,
+            "unit": "chapters",
+            "details": {"books": books},
+        }
+
+    return run
+
+
+def write_cross_references(path: str, chapter_lengths_path: str, seed: int = 0):
+    # The OpenBible cross references aren't in the repo, so make a file just
+    # like them: a header, then about ten references a verse, some of them
+    # ranges.
+    verses = load_verses(chapter_lengths_path)
+    rng = random.Random(seed)
+
+    def osis(packed: int) -> str:
+        book_id, chapter, verse = unpack_verse(packed)
+        return f"{OSIS_IDS[book_id]}.{chapter}.{verse}"
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("From Verse\tTo Verse\tVotes\t#www.openbible.info CC-BY\n")
+        for verse in verses:
+            for _ in range(rng.randint(0, 20)):
+                start = rng.randrange(len(verses))
+                reference = osis(verses[start])
+                if rng.random() < 0.2 and start + 3 < len(verses):
+                    reference += "-" + osis(verses[start + rng.randint(1, 3)])
+                file.write(f"{osis(verse)}\t{reference}\t{rng.randint(-5, 100)}\n")
+
+
+def bench_cross_references(cross_references_path: str, out_dir: str) -> Benchmark:
+    # Parses the cross references and writes both the JSON and the compiled
+    # index, like parse_cross_references.py does.
+    def run() -> dict:
+        start = time.perf_counter()
+        references = list(read_cross_references(cross_references_path))
+        write_references_json(references, os.path.join(out_dir, "references.json"))
+        compile_references(references, os.path.join(out_dir, "references.bin"))
+        return {
+            "seconds": time.perf_counter() - start,
+            "items": len(references),
+            "bytes": os.path.getsize(cross_references_path),
+            "unit": "references",
+        }
+
+    return run
+
+
+def chapter_to_xhtml(chapter: dict, book_name: str) -> str:
+    # Marks a chapter up like the NET EPUB does: a heading with the book and
+    # chapter, and paragraphs with a span for every verse number.
+    book_id, chapter_number = chapter["chapterId"].split(".")
+    paragraphs = []
+    for text in chapter["md"].split("\n\n"):
+        text = VERSE_RE.sub(
+            rf'<span class="verse">{book_id} {chapter_number}:\1</span>',
+            html.escape(text.strip(), quote=False),
+        )
+        if text:
+            paragraphs.append(f'<p class="bodytext">{text}</p>')
+
+    body = "\n".join(paragraphs)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml"><body>\n'
+        f"<h1>{book_name} Chapter {chapter_number}</h1>\n{body}\n</body></html>"
+    )
+
+
+def write_epub(path: str, chapters: List[dict], book_names: Dict[str, str]):
+    # An EPUB with one XHTML item per chapter, for epub_reader to read.
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("mimetype", "application/epub+zip")
+        archive.writestr(
+            "META-INF/container.xml",
+            '<?xml version="1.0"?>\n'
+            '<container version="1.0" '
+            'xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+            '<rootfile full-path="OEBPS/content.opf" '
+            'media-type="application/oebps-package+xml"/></rootfiles></container>',
+        )
+        for index, chapter in enumerate(chapters):
+            book_name = book_names[chapter["chapterId"].split(".")[0]]
+            archive.writestr(
+                f"OEBPS/Text/{index}.xhtml", chapter_to_xhtml(chapter, book_name)
+            )
+
+        manifest = "".join(
+            f'<item id="c{index}" href="Text/{index}.xhtml" '
+            'media-type="application/xhtml+xml"/>'
+            for index in range(len(chapters))
+        )
+        spine = "".join(
+            f'<itemref idref="c{index}"/>' for index in range(len(chapters))
+        )
+        archive.writestr(
+            "OEBPS/content.opf",
+            '<?xml version="1.0"?>\n'
+            '<package version="2.0" xmlns="http://www.idpf.org/2007/opf">'
+            f"<manifest>{manifest}</manifest><spine>{spine}</spine></package>",
+        )
+
+
+def bench_epub(epub_path: str) -> Benchmark:
+    # Reads and converts every item of an EPUB with mobi_to_txt.py.
+    from epub_reader import iter_chapters
+    from mobi_to_txt import convert_chapter, default_parser, merge_chapters
+
+    parser = default_parser()
+
+    def run() -> dict:
+        start = time.perf_counter()
+        size = 0
+        converted = []
+        for item in iter_chapters(epub_path):
+            content = item.get_content()
+            size += len(content)
+            converted.append(convert_chapter(content.decode(), parser))
+        chapters = list(merge_chapters(converted))
+        return {
+            "seconds": time.perf_counter() - start,
+            "items": len(chapters),
+            "bytes": size,
+            "unit": "chapters",
+            "details": {"parser": parser},
+        }
+
+    return run
+
+
+def bench_emit(chapters: List[dict], format: str, out_dir: str) -> Benchmark:
+    # Writes chapters out with ChapterWriter.
+    path = os.path.join(out_dir, f"chapters.{format}")
+
+    def run() -> dict:
+        start = time.perf_counter()
+        with ChapterWriter(path, format) as writer:
+            for chapter in chapters:
+                writer.write(chapter)
+        return {
+            "seconds": time.perf_counter() - start,
+            "items": len(chapters),
+            "bytes": os.path.getsize(path),
+            "unit": "chapters",
+        }
+
+    return run
+
+
+def compare(
+    results: Dict[str, dict], baseline: Dict[str, dict], threshold: float
+) -> List[str]:
+    """
+    Describes every benchmark that got more than `threshold` (0.1 for 10%)
+    slower or hungrier than its baseline. Throughput is compared rather than
+    time, so a benchmark whose input grew isn't counted as a regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        if result["items_per_second"] and old["items_per_second"]:
+            slowdown = old["items_per_second"] / result["items_per_second"] - 1
+            if slowdown > threshold:
+                regressions.append(f"{name}: {slowdown:.0%} slower")
+        if old.get("peak_memory") and result.get("peak_memory"):
+            growth = result["peak_memory"] / old["peak_memory"] - 1
+            if growth > threshold:
+                regressions.append(f"{name}: {growth:.0%} more peak memory")
+    return regressions
+
+
+def format_result(name: str, result: dict, baseline: Optional[dict]) -> str:
+    line = (
+        f"{name:<22} {result['seconds']:8.3f}s "
+        f"{result['items_per_second']:10.1f} {result['unit']}/s "
+        f"{result['mb_per_second']:7.2f} MB/s "
+        f"{result['peak_memory'] / 1e6:8.1f} MB peak"
+    )
+    if baseline and baseline.get("items_per_second"):
+        change = result["items_per_second"] / baseline["items_per_second"] - 1
+        line += f" ({change:+.0%} vs baseline)"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the data pipeline against the data in the repo."
+    )
+    parser.add_argument(
+        "--translations",
+        nargs="+",
+        default=["bsb", "web", "net"],
+        help="USFM translations to convert (default: bsb web net)",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=BENCHMARKS,
+        help="only run these benchmarks",
+    )
+    parser.add_argument(
+        "--cross-references",
+        default="./cross_references.txt",
+        help="OpenBible cross references (default: generated if it's missing)",
+    )
+    parser.add_argument("--epub", help="EPUB to convert (default: built from BSB)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs each")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store these results as the baseline to compare against",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown that counts as a regression (default: 0.1 for 10%%)",
+    )
+    parser.add_argument("--json", help="also write every result to this file")
+    args = parser.parse_args()
+    only = set(args.only or BENCHMARKS)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+    elif not args.save_baseline:
+        print(
+            f"No baseline at {args.baseline}, so nothing is checked for "
+            "regressions. Run with --save-baseline to make one."
+        )
+
+    results: Dict[str, dict] = {}
+
+    def record(name: str, benchmark: Benchmark):
+        results[name] = measure(benchmark, args.repeat)
+        print(format_result(name, results[name], baseline.get(name)), flush=True)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        # The first translation's chapters feed the EPUB and emit benchmarks.
+        chapters: List[dict] = []
+        if "usfm" in only:
+            for translation in args.translations:
+                translation_chapters: List[dict] = []
+                name = f"usfm:{translation}"
+                record(
+                    name,
+                    bench_usfm(get_book_file_paths(translation), translation_chapters),
+                )
+                books = results[name]["details"]["books"]
+                slowest = sorted(books, key=books.__getitem__, reverse=True)[:3]
+                print(
+                    "  slowest books: "
+                    + ", ".join(f"{book} {books[book]:.3f}s" for book in slowest)
+                )
+                if not chapters:
+                    chapters = translation_chapters
+        elif only & {"epub", "emit"}:
+            for book_file_path in get_book_file_paths(args.translations[0]):
+                chapters.extend(convert_book(book_file_path))
+
+        if "cross_references" in only:
+            cross_references_path = args.cross_references
+            if not os.path.exists(cross_references_path):
+                cross_references_path = os.path.join(out_dir, "cross_references.txt")
+                write_cross_references(
+                    cross_references_path, "data/chapterLengths.json"
+                )
+            record(
+                "cross_references",
+                bench_cross_references(cross_references_path, out_dir),
+            )
+
+        if "epub" in only:
+            epub_path = args.epub
+            try:
+                if epub_path is None:
+                    epub_path = os.path.join(out_dir, "chapters.epub")
+                    book_names = {code: name for name, code in BOOK_NAMES.items()}
+                    write_epub(epub_path, chapters, book_names)
+                record("epub", bench_epub(epub_path))
+            except ImportError as e:
+                print(f"Skipping epub: {e}")
+
+        if "emit" in only:
+            for format in FORMATS:
+                record(f"emit:{format}", bench_emit(chapters, format, out_dir))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not baseline:
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import time
+
+from parse_cross_references import CrossReferenceIndex
+from verse_ids import load_verses
+
+# Times forward and reverse cross reference lookups of every verse in the
+# Bible. Run parse_cross_references.py first.
+verses = load_verses("./data/chapterLengths.json")
+
+for name, path in [
+    ("references", "./data/references.bin"),
+    ("reverse references", "./data/references_reverse.bin"),
+]:
+    with CrossReferenceIndex(path) as index:
+        start = time.perf_counter()
+        found = sum(len(index.lookup(verse)) for verse in verses)
+        elapsed = time.perf_counter() - start
+
+    print(
+        f"{name}: {len(verses)} verses, {found} references in {elapsed:.3f}s "
+        f"({elapsed / len(verses) * 1e6:.2f}us per verse)"
+    )
@@ -0,0 +1,544 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Set, Tuple
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SCRIPTS_DIR)
+STATE_PATH = "data/.build_state.json"
+EPUB_PATH = "data/net.epub"
+TRANSLATIONS = ["bsb", "web", "net"]
+# What each translation's chapters built from USFM are called. The tracked
+# data/net_chapters.json comes from the NET EPUB, so the build leaves it be.
+CHAPTER_NAMES = {"bsb": "bsb", "web": "web", "net": "net_usfm"}
+
+# A file's modification time in nanoseconds, its size and its SHA-256.
+Signature = List
+
+# What happened to a target: it was rebuilt, was already up to date, failed,
+# couldn't run because a source file is missing or was skipped because a
+# target it needs didn't build.
+BUILT = "built"
+FRESH = "up to date"
+FAILED = "failed"
+MISSING = "missing input"
+SKIPPED = "skipped"
+
+
+class Target:
+    """
+    A script run with some arguments, and the files and directories it reads
+    and writes, all relative to the repo. The script and the scripts it
+    imports count as inputs too. Targets that aren't `default` only build
+    when they're asked for.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        script: str,
+        args: List[str],
+        inputs: List[str],
+        outputs: List[str],
+        default: bool = True,
+    ):
+        self.name = name
+        self.script = script
+        self.args = args
+        self.inputs = inputs
+        self.outputs = outputs
+        self.default = default
+
+    @property
+    def command(self) -> List[str]:
+        return [self.script] + self.args
+
+    def __repr__(self) -> str:
+        return f"Target({self.name!r})"
+
+
+def get_chapters_path(translation: str) -> str:
+    return f"data/{CHAPTER_NAMES[translation]}_chapters.json"
+
+
+def get_targets(epub_path: str = EPUB_PATH) -> List[Target]:
+    targets = []
+    for translation in TRANSLATIONS:
+        name = CHAPTER_NAMES[translation]
+        chapters_path = get_chapters_path(translation)
+        # One process each, since the builder already runs a target per core.
+        targets.append(
+            Target(
+                f"chapters:{translation}",
+                "scripts/usfm_to_md.py",
+                [translation, "--jobs", "1"]
+                + (["--name", name] if name != translation else []),
+                [f"data/{translation}_usfm"],
+                [chapters_path],
+            )
+        )
+        targets.append(
+            Target(
+                f"search:{translation}",
+                "scripts/search_index.py",
+                [translation, "--chapters", chapters_path],
+                [chapters_path],
+                [f"data/{translation}_search.bin"],
+            )
+        )
+        targets.append(
+            Target(
+                f"similar:{translation}",
+                "scripts/similar_verses.py",
+                [translation, "--chapters", chapters_path],
+                [chapters_path],
+                [f"data/{translation}_similar.bin"],
+            )
+        )
+        targets.append(
+            Target(
+                f"metrics:{translation}",
+                "scripts/chapter_metrics.py",
+                [translation, "--chapters", chapters_path],
+                [chapters_path],
+                [f"data/{translation}_metrics.bin"],
+            )
+        )
+
+    targets += [
+        Target(
+            "alignment",
+            "scripts/verse_alignment.py",
+            [
+                arg
+                for translation in TRANSLATIONS
+                for arg in ("--chapters", translation, get_chapters_path(translation))
+            ],
+            [get_chapters_path(translation) for translation in TRANSLATIONS],
+            ["data/alignment.bin"],
+        ),
+        Target(
+            "concordance",
+            "scripts/concordance.py",
+            ["web"],
+            ["data/web_usfm"],
+            ["data/web_concordance.bin"],
+        ),
+        Target(
+            "references",
+            "scripts/parse_cross_references.py",
+            [],
+            ["cross_references.txt", "data/chapterLengths.json"],
+            [
+                "data/references.json",
+                "data/references.bin",
+                "data/references_reverse.bin",
+            ],
+        ),
+        Target(
+            "lexicon",
+            "scripts/lexicon_store.py",
+            [],
+            [
+                "data/strongs_definitions.json",
+                "data/lexicalIndex.json",
+                "data/index.json",
+                "data/hebrew",
+            ],
+            ["data/lexicon.sqlite"],
+        ),
+        # The NET from its EPUB rather than its USFM, and the NET audio, only
+        # build when asked for.
+        Target(
+            "chapters:net-epub",
+            "scripts/mobi_to_txt.py",
+            [epub_path, "--name", "net_epub", "--no-md"],
+            [epub_path],
+            ["data/net_epub_chapters.json"],
+            default=False,
+        ),
+        Target(
+            "audio",
+            "scripts/get_audio.py",
+            [],
+            ["data/books.json"],
+            ["data/net_audio/manifest.json"],
+            default=False,
+        ),
+    ]
+    return targets
+
+
+def get_local_imports(script: str, root: str) -> List[str]:
+    # The script and every module next to it that it imports, directly or
+    # not, so that changing a shared module rebuilds what uses it.
+    script_dir = os.path.dirname(script)
+    found = []
+    queue = [script]
+    while queue:
+        path = queue.pop()
+        if path in found:
+            continue
+        found.append(path)
+
+        with open(os.path.join(root, path), "r", encoding="utf-8") as file:
+            tree = ast.parse(file.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module = os.path.join(script_dir, name.split(".")[0] + ".py")
+                if os.path.exists(os.path.join(root, module)):
+                    queue.append(module)
+
+    return sorted(found)
+
+
+def list_files(path: str, root: str) -> List[str]:
+    # A file, or every file in a directory apart from hidden ones like caches.
+    full_path = os.path.join(root, path)
+    if not os.path.isdir(full_path):
+        return [path]
+
+    files = []
+    for dir_path, dir_names, file_names in os.walk(full_path):
+        dir_names[:] = sorted(name for name in dir_names if not name.startswith("."))
+        for file_name in sorted(file_names):
+            if not file_name.startswith("."):
+                files.append(os.path.relpath(os.path.join(dir_path, file_name), root))
+    return files
+
+
+def get_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def get_signature(path: str, previous: Optional[Signature]) -> Signature:
+    # Only files whose time or size changed get hashed again, so that an
+    # up-to-date build only has to stat its inputs.
+    stat = os.stat(path)
+    if previous is not None and previous[:2] == [stat.st_mtime_ns, stat.st_size]:
+        return previous
+    return [stat.st_mtime_ns, stat.st_size, get_sha256(path)]
+
+
+def get_dependencies(targets: List[Target]) -> Dict[str, Set[str]]:
+    producers: Dict[str, str] = {}
+    for target in targets:
+        for output in target.outputs:
+            if output in producers:
+                raise ValueError(
+                    f"{output} is built by both {producers[output]} and {target.name}"
+                )
+            producers[output] = target.name
+
+    dependencies = {}
+    for target in targets:
+        dependencies[target.name] = {
+            producer
+            for output, producer in producers.items()
+            for path in target.inputs
+            if output == path or output.startswith(path.rstrip("/") + "/")
+        }
+        dependencies[target.name].discard(target.name)
+    return dependencies
+
+
+def select_targets(
+    targets: List[Target], names: List[str], dependencies: Dict[str, Set[str]]
+) -> List[Target]:
+    # The targets asked for (or every default one) and everything they need,
+    # in an order where each target comes after its dependencies.
+    by_name = {target.name: target for target in targets}
+    for name in names:
+        if name not in by_name:
+            raise ValueError(f"Unknown target {name!r}")
+
+    ordered: List[str] = []
+    visiting: Set[str] = set()
+
+    def visit(name: str):
+        if name in ordered:
+            return
+        if name in visiting:
+            raise ValueError(f"{name} depends on itself")
+        visiting.add(name)
+        for dependency in sorted(dependencies[name]):
+            visit(dependency)
+        visiting.remove(name)
+        ordered.append(name)
+
+    for name in names or [target.name for target in targets if target.default]:
+        visit(name)
+    return [by_name[name] for name in ordered]
+
+
+class Builder:
+    """
+    Builds targets in dependency order on `jobs` threads, running the ones
+    that don't depend on each other at the same time. A target is rebuilt
+    when its command changed, an output is missing or was changed by hand, or
+    the contents of an input changed since it was last built. What each
+    target was built from is kept in the state file.
+    """
+
+    def __init__(
+        self,
+        targets: List[Target],
+        root: str = ROOT,
+        state_path: str = STATE_PATH,
+        jobs: int = 0,
+        force: bool = False,
+        verbose: bool = False,
+    ):
+        self.targets = targets
+        self.dependencies = get_dependencies(targets)
+        self.root = root
+        self.state_path = os.path.join(root, state_path)
+        self.jobs = jobs or os.cpu_count() or 1
+        self.force = force
+        self.verbose = verbose
+        self.lock = threading.Lock()
+
+        self.state: Dict[str, dict] = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                self.state = json.load(file)
+
+    def _save_state(self):
+        temp_path = f"{self.state_path}.tmp"
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.state, file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.state_path)
+
+    def _log(self, message: str):
+        with self.lock:
+            print(message, flush=True)
+
+    def _get_inputs(
+        self, target: Target, record: dict
+    ) -> Tuple[Dict[str, Signature], List[str]]:
+        # The signature of every input file, and the inputs that don't exist.
+        previous = record.get("inputs", {})
+        signatures = {}
+        missing = []
+        paths = [
+            file
+            for path in get_local_imports(target.script, self.root) + target.inputs
+            for file in list_files(path, self.root)
+        ]
+        for path in paths:
+            full_path = os.path.join(self.root, path)
+            if not os.path.exists(full_path):
+                missing.append(path)
+            else:
+                signatures[path] = get_signature(full_path, previous.get(path))
+        return signatures, missing
+
+    def _get_outputs(self, target: Target) -> Optional[Dict[str, Signature]]:
+        outputs = {}
+        for path in target.outputs:
+            full_path = os.path.join(self.root, path)
+            if not os.path.exists(full_path):
+                return None
+            stat = os.stat(full_path)
+            outputs[path] = [stat.st_mtime_ns, stat.st_size]
+        return outputs
+
+    def is_stale(
+        self, target: Target, record: dict, inputs: Dict[str, Signature]
+    ) -> bool:
+        if self.force or record.get("command") != target.command:
+            return True
+        if self._get_outputs(target) != record.get("outputs"):
+            return True
+        # Compare contents only, so that touching a file doesn't rebuild.
+        old_inputs = record.get("inputs", {})
+        return {path: signature[2] for path, signature in inputs.items()} != {
+            path: signature[2] for path, signature in old_inputs.items()
+        }
+
+    def build_target(self, target: Target) -> str:
+        with self.lock:
+            record = dict(self.state.get(target.name, {}))
+
+        inputs, missing = self._get_inputs(target, record)
+        if missing:
+            self._log(f"{target.name}: {MISSING} {', '.join(missing)}")
+            return MISSING
+
+        if not self.is_stale(target, record, inputs):
+            if inputs != record.get("inputs"):
+                # Remember new times so these files aren't hashed again.
+                with self.lock:
+                    self.state[target.name]["inputs"] = inputs
+                    self._save_state()
+            return FRESH
+
+        self._log(f"{target.name}: building")
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable] + target.command,
+            cwd=self.root,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        elapsed = time.perf_counter() - start
+
+        outputs = self._get_outputs(target)
+        if result.returncode != 0 or outputs is None:
+            problem = (
+                f"exited with {result.returncode}"
+                if result.returncode
+                else "didn't write all of its outputs"
+            )
+            self._log(f"{target.name}: {FAILED}, {problem}\n{result.stdout}")
+            return FAILED
+        if self.verbose:
+            self._log(result.stdout.rstrip())
+
+        with self.lock:
+            self.state[target.name] = {
+                "command": target.command,
+                "inputs": inputs,
+                "outputs": outputs,
+            }
+            self._save_state()
+        self._log(f"{target.name}: {BUILT} in {elapsed:.1f}s")
+        return BUILT
+
+    def build(self, names: Optional[List[str]] = None) -> Dict[str, str]:
+        """Builds the targets asked for, or every default one, by name."""
+        selected = select_targets(self.targets, names or [], self.dependencies)
+        statuses: Dict[str, str] = {}
+        waiting = list(selected)
+        running: Dict[Future, Target] = {}
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while waiting or running:
+                for target in list(waiting):
+                    dependencies = self.dependencies[target.name]
+                    needed = [statuses.get(name) for name in dependencies]
+                    if None in needed:
+                        continue
+                    waiting.remove(target)
+                    if any(status not in (BUILT, FRESH) for status in needed):
+                        statuses[target.name] = SKIPPED
+                        self._log(f"{target.name}: {SKIPPED}")
+                    else:
+                        running[executor.submit(self.build_target, target)] = target
+
+                if running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        statuses[running.pop(future).name] = future.result()
+
+        return statuses
+
+    def plan(self, names: Optional[List[str]] = None) -> Dict[str, str]:
+        """What a build would do, without running anything."""
+        selected = select_targets(self.targets, names or [], self.dependencies)
+        by_name = {target.name: target for target in self.targets}
+        statuses: Dict[str, str] = {}
+        for target in selected:
+            dependencies = self.dependencies[target.name]
+            needed = [statuses[name] for name in dependencies]
+            record = self.state.get(target.name, {})
+            inputs, missing = self._get_inputs(target, record)
+            # Files that a dependency is going to write aren't missing.
+            produced = {
+                output for name in dependencies for output in by_name[name].outputs
+            }
+            if set(missing) - produced:
+                statuses[target.name] = MISSING
+            elif any(status not in (BUILT, FRESH) for status in needed):
+                statuses[target.name] = SKIPPED
+            elif BUILT in needed or self.is_stale(target, record, inputs):
+                statuses[target.name] = BUILT
+            else:
+                statuses[target.name] = FRESH
+        return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild the data files that are out of date."
+    )
+    parser.add_argument(
+        "targets", nargs="*", help="targets to build (default: every default one)"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="targets to build at once (default: one per core)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="rebuild even up-to-date targets"
+    )
+    parser.add_argument(
+        "-n", "--dry-run", action="store_true", help="show what would be rebuilt"
+    )
+    parser.add_argument("--list", action="store_true", help="list every target")
+    parser.add_argument("--epub", default=EPUB_PATH, help="the NET EPUB")
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="show what the scripts print"
+    )
+    args = parser.parse_args()
+
+    targets = get_targets(args.epub)
+    if args.list:
+        dependencies = get_dependencies(targets)
+        for target in targets:
+            needs = ", ".join(sorted(dependencies[target.name])) or "-"
+            default = "" if target.default else " (not built by default)"
+            print(f"{target.name:<20} needs {needs}{default}")
+        return
+
+    builder = Builder(targets, jobs=args.jobs, force=args.force, verbose=args.verbose)
+    try:
+        if args.dry_run:
+            statuses = builder.plan(args.targets)
+            for name, status in statuses.items():
+                print(f"{name}: {'would build' if status == BUILT else status}")
+            return
+        start = time.perf_counter()
+        statuses = builder.build(args.targets)
+    except ValueError as e:
+        parser.error(str(e))
+
+    counts = {
+        status: sum(value == status for value in statuses.values())
+        for status in (BUILT, FRESH, FAILED, MISSING, SKIPPED)
+    }
+    print(
+        ", ".join(f"{count} {status}" for status, count in counts.items() if count)
+        + f" in {time.perf_counter() - start:.2f}s"
+    )
+
+    # Missing sources only matter for targets that were asked for by name.
+    built = counts[BUILT] + counts[FRESH]
+    if counts[FAILED] or (args.targets and built < len(statuses)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable, List, Optional, Tuple
+
+from search_index import VERSE_RE, read_chapters, split_verses, tokenize
+from usfm_to_md import get_text_offsets
+from verse_ids import format_verse_id, parse_verse_id, read_uint32s
+
+# data/<translation>_metrics.bin holds how long every chapter and verse is,
+# so that the app can estimate a chapter's height and reading time without
+# measuring it, as little-endian uint32 tables:
+#
+#   HEADER
+#   one column per CHAPTER_COLUMNS, with a row for every chapter, sorted by
+#     chapter id (the packed id of its verse 0, see verse_ids.py)
+#   one column per VERSE_COLUMNS, with a row for every verse, sorted by id
+#
+# Characters and offsets count UTF-16 code units of the chapter's Markdown,
+# like its textOffsets do. A chapter's characters, words and lines include
+# headings, and its verses' rows run from its first_verse up to the next
+# chapter's.
+MAGIC = b"TOVMETR1"
+HEADER = struct.Struct("<8sII")  # magic, chapter count, verse count
+CHAPTER_COLUMNS = ["id", "first_verse", "characters", "words", "paragraphs", "lines"]
+# A verse's offset is where it starts in the chapter and its word offset how
+# many words the chapter's verses before it have.
+VERSE_COLUMNS = ["id", "offset", "characters", "words", "word_offset"]
+
+WORDS_PER_MINUTE = 238
+
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n")
+
+
+def get_chapter_metrics(chapter: dict) -> Tuple[List[int], List[List[int]]]:
+    """
+    Returns a chapter's row and the rows of its verses, without their
+    first_verse.
+    """
+    md = chapter["md"]
+    offsets = chapter.get("textOffsets") or get_text_offsets(md)
+    book_id, chapter_number = chapter["chapterId"].split(".")
+    chapter_id = parse_verse_id(f"{book_id}.{chapter_number}.0")
+
+    verse_words = {}
+    for verse, text in split_verses(chapter):
+        # A verse 0 has no offset of its own.
+        if verse != chapter_id:
+            verse_words[verse] = verse_words.get(verse, 0) + len(tokenize(text))
+
+    verses = []
+    word_offset = 0
+    for verse, words in sorted(verse_words.items()):
+        number = verse - chapter_id
+        start, end = offsets[number - 1], offsets[number]
+        verses.append([verse, start, end - start, words, word_offset])
+        word_offset += words
+
+    paragraphs = sum(
+        1 for paragraph in _PARAGRAPH_RE.split(md) if not paragraph.isspace()
+    )
+    lines = sum(1 for line in md.splitlines() if line.strip())
+    # Verse numbers aren't words.
+    words = len(tokenize(VERSE_RE.sub(" ", md)))
+    return [chapter_id, offsets[-1], words, paragraphs, lines], verses
+
+
+def compile_metrics(chapters: Iterable[dict], path: str):
+    metrics = sorted(
+        (get_chapter_metrics(chapter) for chapter in chapters),
+        key=lambda chapter_metrics: chapter_metrics[0][0],
+    )
+
+    chapter_columns = [array("I") for _ in CHAPTER_COLUMNS]
+    verse_columns = [array("I") for _ in VERSE_COLUMNS]
+    verse_count = 0
+    for (chapter_id, *counts), verses in metrics:
+        row = [chapter_id, verse_count, *counts]
+        for column, value in zip(chapter_columns, row):
+            column.append(value)
+        for verse_row in verses:
+            for column, value in zip(verse_columns, verse_row):
+                column.append(value)
+        verse_count += len(verses)
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(metrics), verse_count))
+        for column in chapter_columns + verse_columns:
+            if sys.byteorder == "big":
+                column.byteswap()
+            column.tofile(file)
+    os.replace(temp_path, path)
+
+
+def get_reading_seconds(words: int) -> int:
+    return round(words * 60 / WORDS_PER_MINUTE)
+
+
+class ChapterMetrics:
+    """
+    Looks up chapter and verse metrics in a compiled metrics file by binary
+    search, straight from a memory map of the file.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.chapter_count, self.verse_count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a compiled metrics table")
+
+        self.view = memoryview(self.map)
+        self.columns = []
+        offset = HEADER.size
+        counts = [self.chapter_count] * len(CHAPTER_COLUMNS) + [self.verse_count] * (
+            len(VERSE_COLUMNS)
+        )
+        for count in counts:
+            self.columns.append(read_uint32s(self.view, offset, count))
+            offset += count * 4
+        self.chapters = dict(zip(CHAPTER_COLUMNS, self.columns))
+        self.verses = dict(zip(VERSE_COLUMNS, self.columns[len(CHAPTER_COLUMNS) :]))
+
+    def _find(self, ids, packed: int) -> Optional[int]:
+        position = bisect_left(ids, packed)
+        if position == len(ids) or ids[position] != packed:
+            return None
+        return position
+
+    def chapter(self, chapter_id: str) -> Optional[dict]:
+        # A chapter's metrics by an id like "GEN.1", with its verse count and
+        # an estimated reading time.
+        try:
+            packed = parse_verse_id(f"{chapter_id}.0")
+        except (KeyError, ValueError):
+            return None
+        position = self._find(self.chapters["id"], packed)
+        if position is None:
+            return None
+
+        metrics = {name: column[position] for name, column in self.chapters.items()}
+        last_verse = (
+            self.chapters["first_verse"][position + 1]
+            if position + 1 < self.chapter_count
+            else self.verse_count
+        )
+        metrics["verses"] = last_verse - metrics["first_verse"]
+        metrics["reading_seconds"] = get_reading_seconds(metrics["words"])
+        return metrics
+
+    def verse(self, verse_id: str) -> Optional[dict]:
+        try:
+            packed = parse_verse_id(verse_id)
+        except (KeyError, ValueError):
+            return None
+        position = self._find(self.verses["id"], packed)
+        if position is None:
+            return None
+        return {name: column[position] for name, column in self.verses.items()}
+
+    def close(self):
+        for column in self.columns:
+            column.release()
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self) -> "ChapterMetrics":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build data/<translation>_metrics.bin from the chapter output."
+    )
+    parser.add_argument("translation", nargs="?", default="bsb")
+    parser.add_argument(
+        "--chapters",
+        help="chapters to measure (default: data/<translation>_chapters.json)",
+    )
+    parser.add_argument(
+        "--lookup", help="print a chapter's (like GEN.1) or verse's metrics instead"
+    )
+    args = parser.parse_args()
+    metrics_path = f"data/{args.translation}_metrics.bin"
+
+    if args.lookup is not None:
+        with ChapterMetrics(metrics_path) as metrics:
+            if args.lookup.count(".") == 1:
+                found = metrics.chapter(args.lookup)
+            else:
+                found = metrics.verse(args.lookup)
+        if found is None:
+            sys.exit(f"{args.lookup} isn't in {metrics_path}")
+        for name, value in found.items():
+            if name == "id":
+                value = format_verse_id(value)
+            print(f"{name}: {value}")
+        return
+
+    compile_metrics(
+        read_chapters(args.chapters or f"data/{args.translation}_chapters.json"),
+        metrics_path,
+    )
+
+
+if __name__ == "__main__":
+    main()
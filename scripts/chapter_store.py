@@ -0,0 +1,174 @@
+import mmap
+import struct
+import sys
+from array import array
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+# A chapter store is one file laid out as:
+#
+#   MAGIC
+#   the UTF-8 Markdown of every chapter, each followed by its textOffsets as
+#     little-endian uint32s
+#   the book ids, 3 ASCII bytes each, numbered in the order they appear
+#   one INDEX_RECORD per chapter, sorted by (book number, chapter number)
+#   FOOTER
+#
+# so a reader only has to look at the footer and binary search the index to
+# find a chapter's bytes. A chapter without textOffsets has an offset count
+# of 0.
+MAGIC = b"TOVCHAP2"
+# book number, chapter, offset, Markdown length, offset count
+INDEX_RECORD = struct.Struct("<HHIII")
+FOOTER = struct.Struct("<QII8s")  # books offset, book count, chapter count, magic
+BOOK_ID_SIZE = 3
+
+
+def split_chapter_id(chapter_id: str) -> Tuple[str, int]:
+    book_id, chapter = chapter_id.split(".")
+    if len(book_id.encode("ascii")) != BOOK_ID_SIZE or not chapter.isdigit():
+        raise ValueError(f"Can't store chapter id {chapter_id!r}")
+    return book_id, int(chapter)
+
+
+class ChapterStoreIndex:
+    """
+    Collects where each chapter was written so that the index can be appended
+    once all the Markdown is in the file.
+    """
+
+    def __init__(self):
+        self.book_numbers: Dict[str, int] = {}
+        self.records: List[Tuple[int, int, int, int, int]] = []
+
+    def add(self, chapter_id: str, offset: int, length: int, offset_count: int = 0):
+        book_id, chapter = split_chapter_id(chapter_id)
+        book_number = self.book_numbers.setdefault(book_id, len(self.book_numbers))
+        self.records.append((book_number, chapter, offset, length, offset_count))
+
+    def write(self, file: IO[bytes], books_offset: int):
+        file.write("".join(self.book_numbers).encode("ascii"))
+        for record in sorted(self.records):
+            file.write(INDEX_RECORD.pack(*record))
+        file.write(
+            FOOTER.pack(books_offset, len(self.book_numbers), len(self.records), MAGIC)
+        )
+
+
+class ChapterStore:
+    """
+    Reads single chapters out of a chapter store without loading the rest of
+    it, by memory mapping the file.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.map) < len(MAGIC) + FOOTER.size or (
+            self.map[: len(MAGIC)] != MAGIC
+        ):
+            self.map.close()
+            raise ValueError(f"{path} is not a chapter store")
+
+        books_offset, book_count, self.count, magic = FOOTER.unpack_from(
+            self.map, len(self.map) - FOOTER.size
+        )
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a chapter store")
+
+        books = self.map[books_offset : books_offset + book_count * BOOK_ID_SIZE]
+        self.book_ids = [
+            books[i : i + BOOK_ID_SIZE].decode("ascii")
+            for i in range(0, len(books), BOOK_ID_SIZE)
+        ]
+        self.book_numbers = {book_id: i for i, book_id in enumerate(self.book_ids)}
+        self.index_offset = books_offset + len(books)
+
+    def _record(self, position: int) -> Tuple[int, int, int, int, int]:
+        return INDEX_RECORD.unpack_from(
+            self.map, self.index_offset + position * INDEX_RECORD.size
+        )
+
+    def find(self, chapter_id: str) -> Optional[Tuple[int, int, int]]:
+        """
+        Returns the byte offset and length of a chapter's Markdown and how many
+        textOffsets follow it.
+        """
+        book_id, _, chapter = chapter_id.partition(".")
+        book_number = self.book_numbers.get(book_id)
+        if book_number is None or not chapter.isdigit():
+            return None
+        key = (book_number, int(chapter))
+
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record = self._record(middle)
+            if record[:2] < key:
+                low = middle + 1
+            elif record[:2] > key:
+                high = middle
+            else:
+                return record[2], record[3], record[4]
+
+        return None
+
+    def get(self, chapter_id: str) -> Optional[str]:
+        location = self.find(chapter_id)
+        if location is None:
+            return None
+        offset, length, _ = location
+        return self.map[offset : offset + length].decode("utf-8")
+
+    def get_text_offsets(self, chapter_id: str) -> Optional[List[int]]:
+        location = self.find(chapter_id)
+        if location is None or not location[2]:
+            return None
+        offset, length, offset_count = location
+        start = offset + length
+        offsets = array("I", self.map[start : start + offset_count * 4])
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        return offsets.tolist()
+
+    def get_chapter(self, chapter_id: str) -> Optional[dict]:
+        # A chapter as the json formats have it.
+        md = self.get(chapter_id)
+        if md is None:
+            return None
+        chapter = {"chapterId": chapter_id, "md": md}
+        text_offsets = self.get_text_offsets(chapter_id)
+        if text_offsets is not None:
+            chapter["textOffsets"] = text_offsets
+        return chapter
+
+    def __getitem__(self, chapter_id: str) -> str:
+        md = self.get(chapter_id)
+        if md is None:
+            raise KeyError(chapter_id)
+        return md
+
+    def __contains__(self, chapter_id: str) -> bool:
+        return self.find(chapter_id) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[str]:
+        # Chapter ids in the order they were written.
+        records = sorted(
+            (self._record(position) for position in range(self.count)),
+            key=lambda record: record[2],
+        )
+        for book_number, chapter, *_ in records:
+            yield f"{self.book_ids[book_number]}.{chapter}"
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self) -> "ChapterStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
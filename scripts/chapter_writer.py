@@ -0,0 +1,122 @@
+import json
+import os
+import sys
+from array import array
+from typing import IO, Any, List, Optional
+
+from chapter_store import MAGIC, ChapterStoreIndex
+
+FORMATS = ["json", "ndjson", "bin"]
+
+
+def get_output_path(name: str, format: str = "json", by_book: bool = False) -> str:
+    # Sharded output goes in a directory named like the single file would be.
+    if by_book:
+        return f"data/{name}_chapters"
+    return f"data/{name}_chapters.{format}"
+
+
+class ChapterWriter:
+    """
+    Writes chapters to disk as they are produced instead of collecting them
+    all for one json.dump. The `json` format writes the same bytes json.dump
+    would, `ndjson` writes one chapter per line and `bin` writes a chapter
+    store for chapter_store.ChapterStore to read. With `by_book`, `path` is a
+    directory that gets one file per book, like GEN.json.
+
+    Files are written next to their destination and only moved into place
+    when the writer is closed without an error.
+    """
+
+    def __init__(self, path: str, format: str = "json", by_book: bool = False):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown chapter format: {format}")
+
+        self.path = path
+        self.format = format
+        self.by_book = by_book
+        self.book_id: Optional[str] = None
+        self.written_books: List[str] = []
+        self.file: Optional[IO[Any]] = None
+        self.index: Optional[ChapterStoreIndex] = None
+        self.temp_path = ""
+        self.final_path = ""
+        self.count = 0
+
+        if by_book:
+            os.makedirs(path, exist_ok=True)
+        else:
+            self._open(path)
+
+    def _open(self, final_path: str):
+        self.final_path = final_path
+        self.temp_path = f"{final_path}.{os.getpid()}.tmp"
+        self.count = 0
+        if self.format == "bin":
+            self.file = open(self.temp_path, "wb")
+            self.file.write(MAGIC)
+            self.index = ChapterStoreIndex()
+        else:
+            self.file = open(self.temp_path, "w", encoding="utf-8")
+        if self.format == "json":
+            self.file.write("[")
+
+    def _finish(self):
+        if self.file is None:
+            return
+        if self.format == "json":
+            self.file.write("]")
+        elif self.index is not None:
+            self.index.write(self.file, self.file.tell())
+        self.file.close()
+        self.file = None
+        os.replace(self.temp_path, self.final_path)
+
+    def write(self, chapter: dict):
+        if self.by_book:
+            book_id = chapter["chapterId"].split(".")[0]
+            if book_id != self.book_id:
+                if book_id in self.written_books:
+                    raise ValueError(f"Chapters of {book_id} aren't together")
+                self._finish()
+                self.book_id = book_id
+                self.written_books.append(book_id)
+                self._open(os.path.join(self.path, f"{book_id}.{self.format}"))
+
+        assert self.file is not None
+        if self.format == "json":
+            if self.count:
+                self.file.write(", ")
+            self.file.write(json.dumps(chapter))
+        elif self.index is not None:
+            md = chapter["md"].encode("utf-8")
+            text_offsets = array("I", chapter.get("textOffsets", []))
+            self.index.add(
+                chapter["chapterId"], self.file.tell(), len(md), len(text_offsets)
+            )
+            self.file.write(md)
+            if sys.byteorder == "big":
+                text_offsets.byteswap()
+            text_offsets.tofile(self.file)
+        else:
+            self.file.write(json.dumps(chapter) + "\n")
+        self.count += 1
+
+    def close(self):
+        self._finish()
+
+    def discard(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        os.remove(self.temp_path)
+
+    def __enter__(self) -> "ChapterWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
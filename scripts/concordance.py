@@ -0,0 +1,99 @@
+import argparse
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from search_index import Postings, SearchIndex, tokenize, write_index
+from usfm_to_md import get_book_id, sort_books
+from verse_ids import pack_verse
+
+# Footnotes, cross references and section headings aren't part of the verse
+# text.
+_NOTE_RE = re.compile(
+    r"\\f .*?\\f\*|\\x .*?\\x\*|^\\(?:s|ms|mr|r|sr)\d* [^\n]*",
+    re.DOTALL | re.MULTILINE,
+)
+_CONCORDANCE_TOKEN_RE = re.compile(
+    r"\\c (?P<chapter>\d+)"
+    r"|\\v (?P<verse>\d+)"
+    r"|\\\+?w (?P<word>[^|\\]*)\|strong=\"(?P<strong>[^\"]*)\"\\\+?w\*"
+    r"|\\\+?[a-z0-9]+\*?"
+    r"|(?P<text>[^\\]+)"
+)
+
+
+def extract_words(book_id: str, usfm_text: str) -> Iterator[Tuple[str, int, int]]:
+    """
+    Yields the Strong's number, packed verse id and position of every tagged
+    word in a book. Positions count the words of the verse's USFM text with
+    the search index's tokenize, but the chapter Markdown the search index
+    reads drops some of that text, so they aren't search index positions.
+    """
+    chapter = 0
+    verse = 0
+    position = 0
+
+    for match in _CONCORDANCE_TOKEN_RE.finditer(_NOTE_RE.sub(" ", usfm_text)):
+        kind = match.lastgroup
+        if kind == "chapter":
+            chapter = int(match.group("chapter"))
+            verse = 0
+        elif kind == "verse":
+            verse = int(match.group("verse"))
+            position = 0
+        elif kind == "strong":
+            words = len(tokenize(match.group("word")))
+            if verse:
+                packed = pack_verse(book_id, chapter, verse)
+                for strong in match.group("strong").split(","):
+                    yield strong.strip(), packed, position
+            position += words
+        elif kind == "text" and verse:
+            position += len(tokenize(match.group("text")))
+
+
+def build_concordance(book_file_paths: Iterable[str], path: str):
+    concordance: Dict[str, Postings] = {}
+    for book_file_path in book_file_paths:
+        with open(book_file_path, "r", encoding="utf-8") as file:
+            usfm_text = file.read()
+
+        book_id = get_book_id(os.path.basename(book_file_path))
+        for strong, verse, position in extract_words(book_id, usfm_text):
+            positions = concordance.setdefault(strong, {}).setdefault(verse, [])
+            # A word can carry the same number twice, like "H3068,H3068".
+            if not positions or positions[-1] != position:
+                positions.append(position)
+
+    write_index(concordance, path)
+
+
+class Concordance(SearchIndex):
+    """
+    Looks up where a Strong's number is used. `verses("H1254")` gives the
+    packed verse ids and `occurrences("H1254")` also gives the positions of
+    the words in them (see extract_words). Queries to `term`, `prefix`,
+    `phrase` and `search` are Strong's numbers as they are, like "H1254 H0430"
+    or "H12*".
+    """
+
+    def _tokenize(self, text: str) -> List[str]:
+        return text.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build data/<translation>_concordance.bin from Strong's tags."
+    )
+    parser.add_argument("translation", nargs="?", default="web")
+    args = parser.parse_args()
+
+    usfm_dir = f"data/{args.translation}_usfm"
+    build_concordance(
+        [os.path.join(usfm_dir, name) for name in sort_books(os.listdir(usfm_dir))],
+        f"data/{args.translation}_concordance.bin",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import posixpath
+import xml.etree.ElementTree as ElementTree
+import zipfile
+from typing import Iterator, List, Tuple
+from urllib.parse import unquote
+
+# Where the scripts look for the NET EPUB by default.
+EPUB_PATH = "data/net.epub"
+
+CONTAINER_PATH = "META-INF/container.xml"
+XHTML = "application/xhtml+xml"
+
+NAMESPACES = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+}
+
+
+class EpubItem:
+    """
+    An item of an EPUB whose content is only read out of the archive when it
+    is asked for.
+    """
+
+    def __init__(
+        self,
+        archive: zipfile.ZipFile,
+        epub_path: str,
+        file_name: str,
+        media_type: str,
+    ):
+        self.archive = archive
+        self.epub_path = epub_path
+        self.file_name = file_name
+        self.media_type = media_type
+
+    def get_content(self) -> bytes:
+        # Once iter_chapters is done with the archive it's closed, so items
+        # that outlive it open the EPUB again.
+        if self.archive.fp is not None:
+            return self.archive.read(self.file_name)
+        with zipfile.ZipFile(self.epub_path) as archive:
+            return archive.read(self.file_name)
+
+    def __repr__(self) -> str:
+        return f"EpubItem({self.file_name!r})"
+
+
+def read_spine(archive: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    # The file name and media type of every item in the spine, in reading
+    # order.
+    container = ElementTree.fromstring(archive.read(CONTAINER_PATH))
+    rootfile = container.find(".//container:rootfile", NAMESPACES)
+    if rootfile is None:
+        raise ValueError("EPUB container has no rootfile")
+    opf_path = rootfile.attrib["full-path"]
+
+    package = ElementTree.fromstring(archive.read(opf_path))
+    opf_dir = posixpath.dirname(opf_path)
+    manifest = {
+        item.attrib["id"]: (
+            posixpath.normpath(posixpath.join(opf_dir, unquote(item.attrib["href"]))),
+            item.attrib.get("media-type", ""),
+        )
+        for item in package.iterfind("opf:manifest/opf:item", NAMESPACES)
+    }
+
+    return [
+        manifest[itemref.attrib["idref"]]
+        for itemref in package.iterfind("opf:spine/opf:itemref", NAMESPACES)
+        if itemref.attrib.get("idref") in manifest
+    ]
+
+
+def iter_chapters(epub_path: str) -> Iterator[EpubItem]:
+    """
+    Yields the XHTML items of an EPUB in reading order. Only the container and
+    the package document are read up front; images and other items are never
+    loaded, and each item's content is read when get_content is called.
+    """
+    with zipfile.ZipFile(epub_path) as archive:
+        for file_name, media_type in read_spine(archive):
+            if media_type == XHTML:
+                yield EpubItem(archive, epub_path, file_name, media_type)
@@ -1,89 +1,24 @@
+import argparse
 import os.path
 import re
 import subprocess
-from typing import Any
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import pandoc
 from bs4 import BeautifulSoup
-from ebooklib import epub
-from pandoc.types import *
 
-# This is just a basic example which can easily break in real world.
-
-BOOK_NAMES = {
-    "Genesis": "GEN",
-    "Exodus": "EXO",
-    "Leviticus": "LEV",
-    "Numbers": "NUM",
-    "Deuteronomy": "DEU",
-    "Joshua": "JOS",
-    "Judges": "JDG",
-    "Ruth": "RUT",
-    "1 Samuel": "1SA",
-    "2 Samuel": "2SA",
-    "1 Kings": "1KI",
-    "2 Kings": "2KI",
-    "1 Chronicles": "1CH",
-    "2 Chronicles": "2CH",
-    "Ezra": "EZR",
-    "Nehemiah": "NEH",
-    "Esther": "EST",
-    "Job": "JOB",
-    "Psalms": "PSA",
-    "Proverbs": "PRO",
-    "Ecclesiastes": "ECC",
-    "Song of Solomon": "SNG",
-    "Isaiah": "ISA",
-    "Jeremiah": "JER",
-    "Lamentations": "LAM",
-    "Ezekiel": "EZK",
-    "Daniel": "DAN",
-    "Hosea": "HOS",
-    "Joel": "JOL",
-    "Amos": "AMO",
-    "Obadiah": "OBA",
-    "Jonah": "JON",
-    "Micah": "MIC",
-    "Nahum": "NAM",
-    "Habakkuk": "HAB",
-    "Zephaniah": "ZEP",
-    "Haggai": "HAG",
-    "Zechariah": "ZEC",
-    "Malachi": "MAL",
-    "Matthew": "MAT",
-    "Mark": "MRK",
-    "Luke": "LUK",
-    "John": "JHN",
-    "Acts": "ACT",
-    "Romans": "ROM",
-    "1 Corinthians": "1CO",
-    "2 Corinthians": "2CO",
-    "Galatians": "GAL",
-    "Ephesians": "EPH",
-    "Philippians": "PHP",
-    "Colossians": "COL",
-    "1 Thessalonians": "1TH",
-    "2 Thessalonians": "2TH",
-    "1 Timothy": "1TI",
-    "2 Timothy": "2TI",
-    "Titus": "TIT",
-    "Philemon": "PHM",
-    "Hebrews": "HEB",
-    "James": "JAS",
-    "1 Peter": "1PE",
-    "2 Peter": "2PE",
-    "1 John": "1JN",
-    "2 John": "2JN",
-    "3 John": "3JN",
-    "Jude": "JUD",
-    "Revelation": "REV",
-}
+from epub_reader import EPUB_PATH, iter_chapters
+from references import parse_book
 
-# read epub
-book = epub.read_epub("/Users/trentcowden/Downloads/net.epub")
+# This is just a basic example which can easily break in real world.
 
-# get base filename from the epub
-# base_name = os.path.basename(os.path.splitext(sys.argv[1])[0])
+# Marks where each item starts when many are converted by one pandoc process.
+# Plain letters and digits so that pandoc leaves it alone.
+ITEM_BREAK = "TOVITEMBREAK"
+ITEM_BREAK_RE = re.compile(rf"^{ITEM_BREAK}(\d+)$", re.MULTILINE)
+BODY_RE = re.compile(r"<body[^>]*>(.*)</body>", re.DOTALL | re.IGNORECASE)
+# How many items convert_epub hands to an engine at once.
+BATCH_SIZE = 100
 
 
 def parse_bible_chapter(html_content: Any):
@@ -116,50 +51,18 @@ def parse_bible_chapter(html_content: Any):
     return chapter_content
 
 
-for index, item in enumerate(book.items):
-    if not isinstance(item, epub.EpubHtml):
-        continue
-    if index != 100:
-        continue
-
-    html = item.get_content().decode()
-    verses = parse_bible_chapter(html)
-    print(verses)
-    # pandoc.write(
-    #     chapter_doc,
-    #     file="/Users/trentcowden/Downloads/net/TEST.md",
-    #     format="markdown",
-    # )
-    # for element in pandoc.iter(chapter_doc):
-    # print(element)
-
-    continue
-
-    proc = subprocess.Popen(
-        ["pandoc", "-f", "html", "-t", "markdown", "-"],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-    )
-    content, error = proc.communicate(item.content)
-
-    print(content.decode())
-
-    # if "Psalm" in md:
-    #     print(md)
-
+def get_chapter_id(md: str) -> Optional[str]:
     # regex pattern to match between "##" and the next newline
     pattern = r"# (.*?)\n"
-    md = content.decode()
     # find all matches in the content
     matches = re.findall(pattern, md)
 
     if len(matches) == 0:
-        print(item.file_name)
-        continue
+        return None
 
     # Likely a TOC page.
     if len(matches[0].split(" ")) == 1:
-        continue
+        return None
 
     if "Chapter" in matches[0]:
         full = matches[0].replace("Chapter ", "").strip()
@@ -168,22 +71,146 @@ for index, item in enumerate(book.items):
         full = matches[0].strip()
         book = "Psalms"
     else:
-        continue
+        return None
 
-    if book not in BOOK_NAMES:
+    book_id = parse_book(book)
+    if book_id is None:
         print(f"Book not found: {book}")
-        continue
-    book_id = BOOK_NAMES[book]
+        return None
     chapter_num = full.split(" ")[-1]
 
-    file_name = f"{book_id}.{chapter_num}.md"
+    return f"{book_id}.{chapter_num}"
+
+
+def pandoc_items(items: List[bytes]) -> List[str]:
+    # The original approach: one pandoc process per item.
+    markdown = []
+    for content in items:
+        proc = subprocess.Popen(
+            ["pandoc", "-f", "html", "-t", "markdown", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        md, error = proc.communicate(content)
+        markdown.append(md.decode())
+
+    return markdown
+
+
+def split_batched_markdown(md: str, count: int) -> List[str]:
+    # Splits pandoc's output for a batch back into one document per item.
+    parts = ITEM_BREAK_RE.split(md)
+    markdown = [""] * count
+    for index, item_md in zip(parts[1::2], parts[2::2]):
+        markdown[int(index)] = item_md.strip("\n") + "\n"
+
+    return markdown
+
+
+def pandoc_batched_items(items: List[bytes]) -> List[str]:
+    """
+    Converts every item with a single pandoc process by joining their bodies
+    into one document, with a marker paragraph in front of each.
+    """
+    html = []
+    for index, content in enumerate(items):
+        text = content.decode()
+        body = BODY_RE.search(text)
+        html.append(f"<p>{ITEM_BREAK}{index}</p>")
+        html.append(body.group(1) if body else text)
+
+    proc = subprocess.run(
+        ["pandoc", "-f", "html", "-t", "markdown", "-"],
+        input="\n".join(html).encode(),
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+
+    return split_batched_markdown(proc.stdout.decode(), len(items))
+
+
+def chapter_to_markdown(html_content: Any) -> str:
+    """
+    Converts a chapter without pandoc, reusing parse_bible_chapter. Only the
+    title heading and the verses are kept.
+    """
+    soup = BeautifulSoup(html_content, "html.parser")
+    heading = soup.find(["h1", "h2"])
+
+    paragraphs = [[]]
+    for part in parse_bible_chapter(html_content):
+        if part == "":
+            paragraphs.append([])
+        else:
+            paragraphs[-1].append(f"[{part['number']}] {part['text']}")
+
+    md = "\n\n".join(" ".join(verses) for verses in paragraphs if verses)
+    if heading is None:
+        return md
+    return f"# {heading.get_text().strip()}\n\n{md}"
+
+
+def soup_items(items: List[bytes]) -> List[str]:
+    return [chapter_to_markdown(content) for content in items]
+
+
+ENGINES: Dict[str, Callable[[List[bytes]], List[str]]] = {
+    "pandoc": pandoc_items,
+    "pandoc-batch": pandoc_batched_items,
+    "soup": soup_items,
+}
+
+
+def read_items(epub_path: str) -> Iterator[bytes]:
+    for item in iter_chapters(epub_path):
+        yield item.get_content()
+
+
+def convert_epub(
+    items: Iterable[bytes],
+    engine: str = "pandoc-batch",
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Yields the chapter id and Markdown of every chapter in the items, handing
+    them to the engine `batch_size` at a time so that only one batch of items
+    is in memory at once.
+    """
+    items = iter(items)
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        for md in ENGINES[engine](batch):
+            chapter_id = get_chapter_id(md)
+            if chapter_id is not None:
+                yield chapter_id, md
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an EPUB Bible to Markdown.")
+    parser.add_argument("epub", nargs="?", default=EPUB_PATH)
+    parser.add_argument(
+        "--out",
+        help="where to write the Markdown (default: the EPUB's path without .epub)",
+    )
+    parser.add_argument("--engine", choices=list(ENGINES), default="pandoc-batch")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    out = args.out or os.path.splitext(args.epub)[0]
 
     # create needed directories
-    # dir_name = "{0}/{1}".format(base_name, os.path.dirname(file_name))
-    dir_name = f"/Users/trentcowden/Downloads/net"
-    if not os.path.exists(dir_name):
-        os.makedirs(dir_name)
-
-    # write content to file
-    with open(f"{dir_name}/{file_name}", "w", encoding="utf-8") as f:
-        f.write(md)
+    if not os.path.exists(out):
+        os.makedirs(out)
+
+    for chapter_id, md in convert_epub(
+        read_items(args.epub), args.engine, args.batch_size
+    ):
+        # write content to file
+        with open(f"{out}/{chapter_id}.md", "w", encoding="utf-8") as f:
+            f.write(md)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,332 @@
+import argparse
+import hashlib
+import http.client
 import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, TypeVar
 
 source_id = 3034
 
-books = json.load(open("data/books.json"))
+API_URL = "https://audio-bible.youversionapi.com/3.1/chapter.json"
+AUDIO_DIR = "data/net_audio"
+MANIFEST_NAME = "manifest.json"
+# Chapters that still failed after every retry, to be tried again with
+# --failed.
+FAILED_PATH = "data/net_audio_failed.json"
 
+T = TypeVar("T")
 
-def get_chapter(chapter_id: str):
-    fetch_url = (
-        "https://audio-bible.youversionapi.com/3.1/chapter.json"
-        "?version_id="
-        f"{source_id}"
-        f"&reference={chapter_id}"
+
+def is_retryable(error: Exception) -> bool:
+    # Missing chapters and bad requests won't fix themselves.
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+
+def with_retries(
+    action: Callable[[], T],
+    retries: int = 4,
+    backoff: float = 1,
+    sleep: Callable[[float], None] = time.sleep,
+) -> T:
+    """
+    Calls `action`, retrying it up to `retries` times when it fails with a
+    network error and waiting `backoff` seconds, doubling each time, in
+    between.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return action()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            sleep(backoff * 2**attempt)
+
+    raise AssertionError("unreachable")
+
+
+def get_audio_url(chapter_id: str, api_url: str = API_URL) -> str:
+    fetch_url = f"{api_url}?version_id={source_id}&reference={chapter_id}"
+
+    with urllib.request.urlopen(fetch_url, timeout=30) as resp:
+        json_response = json.loads(resp.read().decode("utf-8"))
+
+    # The API gives protocol-relative URLs like //audio-bible-cdn...
+    return urllib.parse.urljoin(
+        fetch_url,
+        json_response["response"]["data"][0]["download_urls"]["format_mp3_32k"],
     )
 
-    print(fetch_url)
+
+class Manifest:
+    """
+    What was downloaded for each chapter: the source URL, size, SHA-256 and
+    the ETag/Last-Modified to make conditional requests with. Entries that
+    aren't `complete` describe the .part file of an interrupted download.
+
+    Changes are saved every `save_every` of them and on `save`, so a crash
+    loses at most the last few, which are then just downloaded again.
+    """
+
+    def __init__(self, path: str, save_every: int = 50):
+        self.path = path
+        self.save_every = save_every
+        self.lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+        self.unsaved = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.entries = json.load(file)
+
+    def get(self, chapter_id: str) -> dict:
+        with self.lock:
+            return dict(self.entries.get(chapter_id, {}))
+
+    def set(self, chapter_id: str, entry: dict):
+        with self.lock:
+            self.entries[chapter_id] = entry
+            self.unsaved += 1
+            if self.unsaved >= self.save_every:
+                self._save()
+
+    def save(self):
+        with self.lock:
+            if self.unsaved:
+                self._save()
+
+    def _save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+        self.unsaved = 0
+
+
+def get_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def is_complete(entry: dict, path: str, verify: bool = False) -> bool:
+    if not entry.get("complete") or not os.path.exists(path):
+        return False
+    if os.path.getsize(path) != entry["size"]:
+        return False
+    return not verify or get_sha256(path) == entry["sha256"]
+
+
+def download(
+    chapter_id: str, url: str, path: str, manifest: Manifest, verify: bool = False
+) -> str:
+    """
+    Brings the chapter's MP3 at `path` up to date with `url`, returning
+    "unchanged", "resumed" or "downloaded".
+    """
+    entry = manifest.get(chapter_id)
+    temp_path = f"{path}.part"
+    validator = entry.get("etag") or entry.get("last_modified")
+
+    headers = {}
+    offset = 0
+    if entry.get("url") == url and is_complete(entry, path, verify):
+        # Only send the file again if it changed.
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    elif (
+        entry.get("url") == url
+        and not entry.get("complete")
+        and validator
+        and os.path.exists(temp_path)
+    ):
+        # Pick up where the last download stopped, as long as the file is
+        # still the same one.
+        offset = os.path.getsize(temp_path)
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator
 
     try:
-        req = urllib.request.Request(fetch_url)
-        resp = urllib.request.urlopen(req).read()
-        json_response = json.loads(resp.decode("utf-8"))
+        resp = urllib.request.urlopen(
+            urllib.request.Request(url, headers=headers), timeout=60
+        )
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return "unchanged"
+        if e.code != 416 or not offset:
+            raise
+        # The partial file is no good, so start over from the beginning.
+        os.remove(temp_path)
+        manifest.set(chapter_id, {"url": url, "complete": False})
+        resp = urllib.request.urlopen(url, timeout=60)
+
+    with resp:
+        resumed = resp.status == 206
+        manifest.set(
+            chapter_id,
+            {
+                "url": url,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "complete": False,
+            },
+        )
+
+        received = 0
+        with open(temp_path, "ab" if resumed else "wb") as file:
+            while True:
+                block = resp.read(64 * 1024)
+                if not block:
+                    break
+                file.write(block)
+                received += len(block)
+
+        length = resp.headers.get("Content-Length")
+        if length is not None and received != int(length):
+            raise ConnectionError(f"Got {received} of {length} bytes")
 
-        urllib.request.urlretrieve(
-            f"https:{json_response['response']['data'][0]['download_urls']['format_mp3_32k']}",
-            f"data/net_audio/{chapter_id}.mp3",
+    entry = manifest.get(chapter_id)
+    entry.update(
+        size=os.path.getsize(temp_path), sha256=get_sha256(temp_path), complete=True
+    )
+    # Only a finished download ever gets the real name.
+    os.replace(temp_path, path)
+    manifest.set(chapter_id, entry)
+
+    return "resumed" if resumed else "downloaded"
+
+
+def get_chapter(
+    chapter_id: str,
+    manifest: Manifest,
+    api_url: str = API_URL,
+    audio_dir: str = AUDIO_DIR,
+    retries: int = 4,
+    backoff: float = 1,
+    verify: bool = False,
+) -> str:
+    path = os.path.join(audio_dir, f"{chapter_id}.mp3")
+
+    def sync(url: str) -> str:
+        return with_retries(
+            lambda: download(chapter_id, url, path, manifest, verify),
+            retries,
+            backoff,
+        )
+
+    def get_url() -> str:
+        return with_retries(
+            lambda: get_audio_url(chapter_id, api_url), retries, backoff
         )
-    except Exception as e:
-        print(f"Error: {e}")
+
+    # Skip the API when we already know where the audio lives, unless it has
+    # moved since.
+    known_url = manifest.get(chapter_id).get("url")
+    if known_url is None:
+        return sync(get_url())
+    try:
+        return sync(known_url)
+    except urllib.error.HTTPError as e:
+        if e.code not in (403, 404, 410):
+            raise
+    return sync(get_url())
+
+
+def get_chapters(
+    chapter_ids: List[str],
+    jobs: int = 8,
+    api_url: str = API_URL,
+    audio_dir: str = AUDIO_DIR,
+    retries: int = 4,
+    backoff: float = 1,
+    verify: bool = False,
+) -> List[str]:
+    """
+    Syncs the audio of every chapter on `jobs` threads and returns the
+    chapters that failed.
+    """
+    os.makedirs(audio_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(audio_dir, MANIFEST_NAME))
+
+    def get(chapter_id: str) -> bool:
+        try:
+            status = get_chapter(
+                chapter_id, manifest, api_url, audio_dir, retries, backoff, verify
+            )
+        except Exception as e:
+            print(f"Error: {chapter_id}: {e}")
+            return False
+        print(f"{status.capitalize()} {chapter_id}")
+        return True
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            succeeded = list(executor.map(get, chapter_ids))
+    finally:
+        manifest.save()
+
+    return [
+        chapter_id
+        for chapter_id, chapter_succeeded in zip(chapter_ids, succeeded)
+        if not chapter_succeeded
+    ]
+
+
+def save_failed(failed: List[str], path: str = FAILED_PATH):
+    if not failed:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(failed, file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Sync audio to {AUDIO_DIR}.")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=8, help="downloads to run at once"
+    )
+    parser.add_argument(
+        "--retries", type=int, default=4, help="retries after a network error"
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check every file's SHA-256 against the manifest",
+    )
+    parser.add_argument(
+        "--failed",
+        action="store_true",
+        help=f"only download the chapters that failed last time ({FAILED_PATH})",
+    )
+    args = parser.parse_args()
+
+    if args.failed:
+        with open(FAILED_PATH, "r", encoding="utf-8") as file:
+            chapter_ids = json.load(file)
+    else:
+        books = json.load(open("data/books.json"))
+        chapter_ids = [chapter for book in books for chapter in book["chapters"]]
+
+    failed = get_chapters(
+        chapter_ids, args.jobs, retries=args.retries, verify=args.verify
+    )
+    save_failed(failed)
+    print(f"Synced {len(chapter_ids) - len(failed)} of {len(chapter_ids)}")
+    if failed:
+        print(f"Rerun with --failed to retry the {len(failed)} in {FAILED_PATH}")
 
 
-for book in books:
-    for chapter in book["chapters"]:
-        get_chapter(chapter)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+LEXICON_PATH = "data/lexicon.sqlite"
+
+# The ID schemes that resolve to lexical ids.
+SCHEMES = ["aug", "bdb", "strong", "twot"]
+
+# Each entry is stored as its original JSON and only decoded when it's asked
+# for. Aliases map every other ID scheme onto lexical ids; a Strong's number
+# or BDB section can cover more than one entry.
+SCHEMA = """
+CREATE TABLE entries (id TEXT PRIMARY KEY, data TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE strongs (id TEXT PRIMARY KEY, data TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE aliases (
+    scheme TEXT NOT NULL,
+    key TEXT NOT NULL,
+    id TEXT NOT NULL,
+    PRIMARY KEY (scheme, key, id)
+) WITHOUT ROWID;
+"""
+
+STRONG_RE = re.compile(r"([HG]?)0*(\d+)([a-z]?)", re.IGNORECASE)
+
+
+def normalize_strong(strong: str, language: str = "H") -> str:
+    # The Hebrew maps use bare numbers like "7225", the definitions "H7225".
+    match = STRONG_RE.fullmatch(strong.strip())
+    if match is None:
+        return strong.strip()
+    prefix, number, suffix = match.groups()
+    return f"{(prefix or language).upper()}{number}{suffix.lower()}"
+
+
+def read_json(path: str):
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def get_aliases(
+    lexical_index: List[dict], index: List[dict], hebrew_maps: Dict[str, dict]
+) -> Iterator[Tuple[str, str, str]]:
+    # Yields (scheme, key, lexical id) from every source that has one. The
+    # Hebrew maps were derived from the same sources, so they mostly repeat
+    # each other.
+    for entry in lexical_index:
+        xref = entry.get("xref") or {}
+        if "@bdb" in xref:
+            yield "bdb", xref["@bdb"], entry["@id"]
+        if "@strong" in xref:
+            yield "strong", normalize_strong(xref["@strong"]), entry["@id"]
+        # A few entries cite more than one TWOT article.
+        for twot in xref.get("@twot", "").split(","):
+            if twot:
+                yield "twot", twot.strip(), entry["@id"]
+
+    for item in index:
+        yield "aug", item["@aug"], item["#text"]
+    for aug, lexical_id in hebrew_maps.get("idMap", {}).items():
+        yield "aug", aug, lexical_id
+    for lexical_id, bdb in hebrew_maps.get("bdbMap", {}).items():
+        yield "bdb", bdb, lexical_id
+    for lexical_id, strong in hebrew_maps.get("strongMap", {}).items():
+        yield "strong", normalize_strong(strong), lexical_id
+    for lexical_id, twot in hebrew_maps.get("twotMap", {}).items():
+        yield "twot", twot, lexical_id
+
+
+def build_lexicon(
+    strongs_definitions: Dict[str, dict],
+    lexical_index: List[dict],
+    index: List[dict],
+    hebrew_maps: Dict[str, dict],
+    path: str,
+):
+    temp_path = f"{path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    connection = sqlite3.connect(temp_path)
+    try:
+        with connection:
+            connection.executescript(SCHEMA)
+            # Inserting in key order keeps the tables' pages full and in order.
+            connection.executemany(
+                "INSERT INTO entries VALUES (?, ?)",
+                sorted(
+                    (entry["@id"], json.dumps(entry, ensure_ascii=False))
+                    for entry in lexical_index
+                ),
+            )
+            connection.executemany(
+                "INSERT INTO strongs VALUES (?, ?)",
+                sorted(
+                    (normalize_strong(strong), json.dumps(entry, ensure_ascii=False))
+                    for strong, entry in strongs_definitions.items()
+                ),
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO aliases VALUES (?, ?, ?)",
+                sorted(set(get_aliases(lexical_index, index, hebrew_maps))),
+            )
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+    os.replace(temp_path, path)
+
+
+def build_lexicon_from_data(data_dir: str = "data", path: str = LEXICON_PATH):
+    hebrew_dir = os.path.join(data_dir, "hebrew")
+    hebrew_maps = {
+        name[: -len(".json")]: read_json(os.path.join(hebrew_dir, name))
+        for name in sorted(os.listdir(hebrew_dir))
+        if name.endswith("Map.json")
+    }
+    build_lexicon(
+        read_json(os.path.join(data_dir, "strongs_definitions.json")),
+        read_json(os.path.join(data_dir, "lexicalIndex.json")),
+        read_json(os.path.join(data_dir, "index.json")),
+        hebrew_maps,
+        path,
+    )
+
+
+class LexiconStore:
+    """
+    Looks up lexicon entries by lexical id, Strong's number, BDB section,
+    TWOT number or augmented Strong's id. Opening it reads nothing but the
+    schema, and each lookup only reads the index pages for its key and the
+    entry it finds, decoding that one entry.
+    """
+
+    def __init__(self, path: str = LEXICON_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        uri = f"file:{os.path.abspath(path)}?mode=ro"
+        self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        # Read pages straight out of the OS's page cache.
+        self.connection.execute("PRAGMA mmap_size = 268435456")
+
+    def _get(self, table: str, key: str) -> Optional[dict]:
+        row = self.connection.execute(
+            f"SELECT data FROM {table} WHERE id = ?", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def entry(self, lexical_id: str) -> Optional[dict]:
+        """The lexicalIndex.json entry with the lexical id, like "aac"."""
+        return self._get("entries", lexical_id)
+
+    def strongs(self, strong: str) -> Optional[dict]:
+        """The Strong's definition for a number like "H7225" or "7225"."""
+        return self._get("strongs", normalize_strong(strong))
+
+    def resolve(self, scheme: str, key: str) -> List[str]:
+        """The lexical ids an ID from one of SCHEMES refers to."""
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown ID scheme {scheme!r}, expected one of {SCHEMES}")
+        if scheme == "strong":
+            key = normalize_strong(key)
+        rows = self.connection.execute(
+            "SELECT id FROM aliases WHERE scheme = ? AND key = ?", (scheme, key)
+        )
+        return [row[0] for row in rows]
+
+    def lookup(self, scheme: str, key: str) -> List[dict]:
+        """The entries an ID refers to, where the scheme can also be "lexical"."""
+        if scheme == "lexical":
+            lexical_ids: Iterable[str] = [key]
+        else:
+            lexical_ids = self.resolve(scheme, key)
+        entries = (self.entry(lexical_id) for lexical_id in lexical_ids)
+        return [entry for entry in entries if entry is not None]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self) -> "LexiconStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=f"Build {LEXICON_PATH} from the lexicon JSON in data/."
+    )
+    parser.add_argument(
+        "--lookup",
+        nargs=2,
+        metavar=("SCHEME", "KEY"),
+        help=f"look an ID up instead of building (lexical, {', '.join(SCHEMES)})",
+    )
+    args = parser.parse_args()
+
+    if args.lookup is not None:
+        scheme, key = args.lookup
+        with LexiconStore() as store:
+            for entry in store.lookup(scheme, key):
+                print(json.dumps(entry, ensure_ascii=False))
+            if scheme == "strong":
+                print(json.dumps(store.strongs(key), ensure_ascii=False))
+        return
+
+    build_lexicon_from_data()
+
+
+if __name__ == "__main__":
+    main()
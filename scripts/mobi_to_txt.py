@@ -1,109 +1,63 @@
-import json
+import argparse
+import os
 import re
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterable, Iterator, Optional, Tuple
 
-from bs4 import BeautifulSoup
-from ebooklib import epub
-from markdownify import MarkdownConverter, markdownify
-
-BOOK_NAMES = {
-    "Genesis": "GEN",
-    "Exodus": "EXO",
-    "Leviticus": "LEV",
-    "Numbers": "NUM",
-    "Deuteronomy": "DEU",
-    "Joshua": "JOS",
-    "Judges": "JDG",
-    "Ruth": "RUT",
-    "1 Samuel": "1SA",
-    "2 Samuel": "2SA",
-    "1 Kings": "1KI",
-    "2 Kings": "2KI",
-    "1 Chronicles": "1CH",
-    "2 Chronicles": "2CH",
-    "Ezra": "EZR",
-    "Nehemiah": "NEH",
-    "Esther": "EST",
-    "Job": "JOB",
-    "Psalm": "PSA",
-    "Proverbs": "PRO",
-    "Ecclesiastes": "ECC",
-    "Song of Solomon": "SNG",
-    "Isaiah": "ISA",
-    "Jeremiah": "JER",
-    "Lamentations": "LAM",
-    "Ezekiel": "EZK",
-    "Daniel": "DAN",
-    "Hosea": "HOS",
-    "Joel": "JOL",
-    "Amos": "AMO",
-    "Obadiah": "OBA",
-    "Jonah": "JON",
-    "Micah": "MIC",
-    "Nahum": "NAM",
-    "Habakkuk": "HAB",
-    "Zephaniah": "ZEP",
-    "Haggai": "HAG",
-    "Zechariah": "ZEC",
-    "Malachi": "MAL",
-    "Matthew": "MAT",
-    "Mark": "MRK",
-    "Luke": "LUK",
-    "John": "JHN",
-    "Acts": "ACT",
-    "Romans": "ROM",
-    "1 Corinthians": "1CO",
-    "2 Corinthians": "2CO",
-    "Galatians": "GAL",
-    "Ephesians": "EPH",
-    "Philippians": "PHP",
-    "Colossians": "COL",
-    "1 Thessalonians": "1TH",
-    "2 Thessalonians": "2TH",
-    "1 Timothy": "1TI",
-    "2 Timothy": "2TI",
-    "Titus": "TIT",
-    "Philemon": "PHM",
-    "Hebrews": "HEB",
-    "James": "JAS",
-    "1 Peter": "1PE",
-    "2 Peter": "2PE",
-    "1 John": "1JN",
-    "2 John": "2JN",
-    "3 John": "3JN",
-    "Jude": "JUD",
-    "Revelation": "REV",
+from bs4 import BeautifulSoup, Declaration, Doctype, ProcessingInstruction
+from markdownify import MarkdownConverter
+
+from chapter_writer import FORMATS, ChapterWriter, get_output_path
+from epub_reader import EPUB_PATH, iter_chapters
+from references import parse_book
+
+
+def paragraph(text: str) -> str:
+    return "\n" + text.strip() + "\n"
+
+
+def heading(text: str) -> str:
+    return "*" + text.strip().replace("*", "") + "*\n"
+
+
+# How each class of paragraph is converted, in order of precedence for
+# paragraphs with more than one of them.
+PARAGRAPHS = {
+    "paragraphtitle": lambda text: "",
+    "bodytext": paragraph,
+    "bodyblock": paragraph,
+    "poetry": paragraph,
+    "otpoetry": paragraph,
+    "quote": paragraph,
+    "poetrybreak": lambda text: "\n" + text,
+    "psasuper": lambda text: f"*{text}*\n\n",
+    "lamhebrew": heading,
+    "hebrew": heading,
+    "sosspeaker": heading,
 }
+PRECEDENCE = {name: i for i, name in enumerate(PARAGRAPHS)}
+
+# Fix spacing around verses.
+VERSE_SPACING_RE = re.compile(r"([^ \n])\[")
 
 
 class MyConverter(MarkdownConverter):
-    def convert_p(self, el, text, convert_as_inline):
-        if "paragraphtitle" in el.get("class"):
-            return ""
-            # return "\n## " + text.strip().replace("*", "") + "\n\n"
-        elif "bodytext" in el.get("class"):
-            return "\n" + text.strip() + "\n"
-        elif "bodyblock" in el.get("class"):
-            return "\n" + text.strip() + "\n"
-        elif "poetry" in el.get("class"):
-            return "\n" + text.strip() + "\n"
-        elif "otpoetry" in el.get("class"):
-            return "\n" + text.strip() + "\n"
-        elif "quote" in el.get("class"):
-            return "\n" + text.strip() + "\n"
-        elif "poetrybreak" in el.get("class"):
-            return "\n" + text
-        elif "psasuper" in el.get("class"):
-            return f"*{text}*\n\n"
-        elif "lamhebrew" in el.get("class"):
-            return "**" + text.strip().replace("*", "") + "**\n"
-        elif "hebrew" in el.get("class"):
-            return "**" + text.strip().replace("*", "") + "**\n"
-        elif "sosspeaker" in el.get("class"):
-            return "**" + text.strip().replace("*", "") + "**\n"
+    # Emphasis is always a single `*` in the app, so b, i and the headings
+    # above all use it. Nothing is escaped, since every backslash would be
+    # removed afterwards anyway.
+    def __init__(self, **options):
+        options.setdefault("escape_asterisks", False)
+        options.setdefault("escape_underscores", False)
+        options.setdefault("escape_misc", False)
+        super().__init__(**options)
 
-        else:
+    def convert_p(self, el, text, convert_as_inline):
+        classes = [name for name in el.get("class") or () if name in PARAGRAPHS]
+        if not classes:
             # print("Not found", el.get("class"))
             return text + "\n"
+        return PARAGRAPHS[min(classes, key=PRECEDENCE.__getitem__)](text)
 
     def convert_b(self, el, text, convert_as_inline):
         return f"*{text}*"
@@ -112,9 +66,10 @@ class MyConverter(MarkdownConverter):
         return f"*{text}*"
 
     def convert_span(self, el, text, convert_as_inline):
-        if "verse" in el.get("class"):
+        classes = el.get("class") or ()
+        if "verse" in classes:
             return f"[{text.strip().split(':')[1]}]"
-        elif "smcaps" in el.get("class"):
+        elif "smcaps" in classes:
             return text.strip().upper()
         else:
             # print("Not found", el.get("class"))
@@ -127,126 +82,189 @@ class MyConverter(MarkdownConverter):
         return ""
 
 
-# Create shorthand method for conversion
-def md(html, **options):
-    return MyConverter(**options).convert(html)
-
-
-book = epub.read_epub("/Users/trentcowden/Downloads/net.epub")
+converter = MyConverter()
 
-chapters = []
-
-for index, item in enumerate(book.items):
-    if not isinstance(item, epub.EpubHtml):
-        continue
-    if index != 200:
-        continue
-
-    html = item.get_content().decode()
-    soup = BeautifulSoup(html, features="html.parser")
 
+def get_chapter_id(soup: BeautifulSoup) -> Optional[str]:
     h1 = soup.find("h1")
     if h1 is None:
         h2 = soup.find("h2")
         if h2 is None:
-            continue
+            return None
         full = h2.text.strip()
     else:
         full = h1.text.replace("Chapter", "").strip()
     book = " ".join(full.split(" ")[0:-1])
 
-    if book not in BOOK_NAMES:
-        continue
-
-    book_id = BOOK_NAMES[book]
-    chapter_num = full.split(" ")[-1]
-
-    file_name = f"{book_id}.{chapter_num}.md"
-    print(file_name)
-
-    # if "otpoetry" in html:
-    #     print("otpoerty", file_name)
-    # if "bodyblock" in html:
-    #     print("bodyblock", file_name)
-    # if "quote" in html:
-    #     print("quote", file_name)
-    # if "sosspeaker" in html:
-    #     print("sosspeaker", file_name)
-    # if "poetrybreak" in html:
-    #     print("poetrybreak", file_name)
-    if "hebrew" in html and "lamhebrew" not in html:
-        print("hebrew", file_name)
-    # if "lamhebrew" in html:
-    #     print("lamhebrew", file_name)
-    # if "1PE.3" in file_name:
-    #     print(html)
+    book_id = parse_book(book)
+    if book_id is None:
+        return None
+
+    return f"{book_id}.{full.split(' ')[-1]}"
 
+
+def convert_chapter(html: str, parser: str) -> Optional[Tuple[str, str, str]]:
+    """
+    Converts an EPUB item to Markdown, parsing it only once. Returns the
+    chapter id, any text before verse 1 (which belongs to the previous
+    chapter) and the chapter's own Markdown, or None if it isn't a chapter.
+    """
+    soup = BeautifulSoup(html, features=parser)
+
+    chapter_id = get_chapter_id(soup)
+    if chapter_id is None:
+        return None
+
+    # Keep `<?xml ...?>` and the doctype out of the Markdown.
+    declarations = (Declaration, Doctype, ProcessingInstruction)
+    for node in soup.find_all(string=lambda node: isinstance(node, declarations)):
+        node.extract()
+
+    text = converter.convert_soup(soup)
+    text = text.replace("\\", "")
+    text = text.replace("\n\n\n", "\n\n")
+    text = text.replace("]]", "")
+    text = text.replace("[[", "")
+    text = text.strip()
+
+    first_verse = re.search(r"\[[0-9]+\]", text)
+    if first_verse is None:
+        raise ValueError(f"{chapter_id} has no verses")
+
+    text_before_1 = ""
+    if first_verse.group() != "[1]":
+        print("First verse is not 1", chapter_id)
+        text_before_1 = text.split("[1]")[0]
+        text = text.replace(text_before_1, "")
+
+    text = VERSE_SPACING_RE.sub(r"\1 [", text)
+    text = text.replace("***", "*")
+    text = text.replace("**", "*")
+
+    return chapter_id, text_before_1, text
+
+
+def default_parser() -> str:
+    # lxml is several times faster than Python's own HTML parser.
     try:
-        text = md(html)
-        text = text.replace("xml version\\='1\\.0' encoding\\='utf\\-8'?", "")
-        text = text.replace("\\", "")
-        text = text.replace("\n\n\n", "\n\n")
-        text = text.replace("]]", "")
-        text = text.replace("[[", "")
-        text = text.strip()
-
-        pattern = r"\[([0-9]+)\]"
-
-        verses = []
-        last_end = 0
-
-        for match in re.finditer(pattern, text):
-            # Add the text before the match, combined with the matched delimiter
-            start, end = match.span()
-
-            verses.append(match.group(1) + text[last_end:start])
-            last_end = end
-
-        # Add any remaining part of the string after the last match
-        if last_end < len(text):
-            verses.append(text[last_end:])
-
-        # verses = [
-        #     verse.strip() if not verse.endswith("\n\n") else verse.strip() + "\n\n"
-        #     for verse in re.split(r"\[([0-9]+)\]", text)
-        #     if verse
-        # ]
-        print(verses)
-
-        # verses_with_breaks = []
-        # for verse in verses:
-        #     if verse.endswith("\n\n"):
-        #         verses_with_breaks.append(verse.strip())
-        #         verses_with_breaks.append("\n\n")
-        #     else:
-        #         verses_with_breaks.append(verse.strip())
-
-        # print(verses_with_breaks)
-
-        first_verse = re.findall(r"\[[0-9]+\]", text)[0]
-
-        if first_verse != "[1]":
-            print("First verse is not 1", file_name)
-            text_before_1 = text.split("[1]")[0]
-            # Add text to previous chapter
-            chapters[-1]["md"] += "\n\n" + text_before_1
-            text = text.replace(text_before_1, "")
-
-        # Fix spacing around verses.
-        text = re.sub(r"([^ \n])\[", r"\1 [", text)
-
-        text = text.replace("***", "*")
-        text = text.replace("**", "*")
-        chapters.append(
-            {
-                "chapterId": f"{book_id}.{chapter_num}",
-                "md": text,
-            }
-        )
-        open(f"/Users/trentcowden/Downloads/net/{file_name}", "w").write(text)
+        import lxml  # noqa: F401
+    except ImportError:
+        return "html.parser"
+    return "lxml"
+
+
+def convert_item(html: str, parser: str) -> Optional[Tuple[str, str, str]]:
+    # Phase one: convert a single item, on its own.
+    try:
+        converted = convert_chapter(html, parser)
     except Exception as e:
         print(html)
+        return None
+    if converted is not None:
+        print(f"{converted[0]}.md")
+    return converted
+
+
+def convert_items(
+    htmls: Iterable[str], parser: str, jobs: int = 1
+) -> Iterator[Optional[Tuple[str, str, str]]]:
+    if jobs <= 1:
+        for html in htmls:
+            yield convert_item(html, parser)
+        return
+
+    # Only read a few items ahead of the ones being converted, so that the
+    # whole EPUB never has to be in memory. Results are handed back in order,
+    # so the merge sees the chapters in the same order as a serial run would.
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending: Deque[Future] = deque()
+        for html in htmls:
+            pending.append(executor.submit(convert_item, html, parser))
+            if len(pending) >= jobs * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def merge_chapters(
+    converted: Iterable[Optional[Tuple[str, str, str]]]
+) -> Iterator[dict]:
+    """
+    Phase two: yields the chapters in order once any text before verse 1 of
+    the chapter after them has been added.
+    """
+    # Held back until the next chapter is seen, since that chapter may start
+    # with text that belongs to this one.
+    previous_chapter = None
+
+    for item in converted:
+        if item is None:
+            continue
+        chapter_id, text_before_1, text = item
 
-
-with open("data/net_chapters.json", "w", encoding="utf-8") as file:
-    json.dump(chapters, file)
+        if text_before_1 and previous_chapter is not None:
+            # Add text to previous chapter
+            previous_chapter["md"] += "\n\n" + text_before_1
+
+        if previous_chapter is not None:
+            yield previous_chapter
+        previous_chapter = {
+            "chapterId": chapter_id,
+            "md": text,
+        }
+
+    if previous_chapter is not None:
+        yield previous_chapter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the NET EPUB to chapters.")
+    parser.add_argument("epub", nargs="?", default=EPUB_PATH)
+    parser.add_argument(
+        "--name", default="net", help="write data/<name>_chapters (default: net)"
+    )
+    parser.add_argument(
+        "--md-dir",
+        help="also write each chapter's Markdown here (default: the EPUB's path "
+        "without .epub)",
+    )
+    parser.add_argument(
+        "--no-md", action="store_true", help="don't write the Markdown files"
+    )
+    parser.add_argument("--format", choices=FORMATS, default="json")
+    parser.add_argument(
+        "--by-book", action="store_true", help="write one file per book"
+    )
+    parser.add_argument(
+        "--parser",
+        choices=["lxml", "html.parser", "html5lib"],
+        default=default_parser(),
+        help="BeautifulSoup parser to use (default: lxml if installed)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="number of processes to convert items on (default: one per core)",
+    )
+    args = parser.parse_args()
+    jobs = args.jobs or os.cpu_count() or 1
+    md_dir = args.md_dir or os.path.splitext(args.epub)[0]
+    if not args.no_md:
+        os.makedirs(md_dir, exist_ok=True)
+
+    htmls = (item.get_content().decode() for item in iter_chapters(args.epub))
+    output_path = get_output_path(args.name, args.format, args.by_book)
+
+    with ChapterWriter(output_path, args.format, args.by_book) as writer:
+        converted = convert_items(htmls, args.parser, jobs)
+        for chapter in merge_chapters(converted):
+            writer.write(chapter)
+            if not args.no_md:
+                with open(f"{md_dir}/{chapter['chapterId']}.md", "w") as file:
+                    file.write(chapter["md"])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,111 +1,229 @@
 import json
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Iterator, List, Tuple
 
-cross_references = open("./cross_references.txt").read()
-
-book_map = {
-    "Gen": "GEN",
-    "Exod": "EXO",
-    "Lev": "LEV",
-    "Num": "NUM",
-    "Deut": "DEU",
-    "Josh": "JOS",
-    "Judg": "JDG",
-    "Ruth": "RUT",
-    "1Sam": "1SA",
-    "2Sam": "2SA",
-    "1Kgs": "1KI",
-    "2Kgs": "2KI",
-    "1Chr": "1CH",
-    "2Chr": "2CH",
-    "Ezra": "EZR",
-    "Neh": "NEH",
-    "Esth": "EST",
-    "Job": "JOB",
-    "Ps": "PSA",
-    "Prov": "PRO",
-    "Eccl": "ECC",
-    "Song": "SNG",
-    "Isa": "ISA",
-    "Jer": "JER",
-    "Lam": "LAM",
-    "Ezek": "EZK",
-    "Dan": "DAN",
-    "Hos": "HOS",
-    "Joel": "JOL",
-    "Amos": "AMO",
-    "Obad": "OBA",
-    "Jonah": "JON",
-    "Mic": "MIC",
-    "Nah": "NAM",
-    "Hab": "HAB",
-    "Zeph": "ZEP",
-    "Hag": "HAG",
-    "Zech": "ZEC",
-    "Mal": "MAL",
-    "Matt": "MAT",
-    "Mark": "MRK",
-    "Luke": "LUK",
-    "John": "JHN",
-    "Acts": "ACT",
-    "Rom": "ROM",
-    "1Cor": "1CO",
-    "2Cor": "2CO",
-    "Gal": "GAL",
-    "Eph": "EPH",
-    "Phil": "PHP",
-    "Col": "COL",
-    "1Thess": "1TH",
-    "2Thess": "2TH",
-    "1Tim": "1TI",
-    "2Tim": "2TI",
-    "Titus": "TIT",
-    "Phlm": "PHM",
-    "Heb": "HEB",
-    "Jas": "JAS",
-    "1Pet": "1PE",
-    "2Pet": "2PE",
-    "1John": "1JN",
-    "2John": "2JN",
-    "3John": "3JN",
-    "Jude": "JUD",
-    "Rev": "REV",
-}
-
-references = {}
-
-for index, line in enumerate(cross_references.split("\n")):
-    if len(line.split()) < 2:
-        print(index, line)
-    verse = line.split()[0]
-    reference = line.split()[1]
-
-    (original_book, original_chapter, original_verse) = verse.split(".")
-    original_book = book_map[original_book]
-
-    if "-" in reference:
-        (start_book, start_chapter, start_verse) = reference.split("-")[0].split(".")
-        (end_book, end_chapter, end_verse) = reference.split("-")[1].split(".")
-        start_book = book_map[start_book]
-        end_book = book_map[end_book]
-        start = f"{start_book}.{start_chapter}.{start_verse}"
-        end = f"{end_book}.{end_chapter}.{end_verse}"
-    else:
-        (start_book, start_chapter, start_verse) = reference.split(".")
-        start_book = book_map[start_book]
-        start = f"{start_book}.{start_chapter}.{start_verse}"
-        end = None
-
-    original = f"{original_book}.{original_chapter}.{original_verse}"
-
-    if original in references:
-        if end:
-            references[original].append([start, end])
-        else:
-            references[original].append([start])
-    else:
-        if end:
-            references[original] = [[start, end]]
-        else:
-            references[original] = [[start]]
-
-json.dump(references, open("./data/references.json", "w+", encoding="utf-8"))
+from references import parse_references
+from verse_ids import format_verse_id, load_verses, parse_verse_id, read_uint32s
+
+# data/references.bin holds the cross references as packed verse ids (see
+# verse_ids.py) in little-endian uint32 tables:
+#
+#   HEADER
+#   sources: every verse with references, sorted
+#   offsets: where each source's references start, plus the total at the end
+#   starts: the first verse of each reference
+#   ends: the last verse of each reference, or 0 if it is a single verse
+#
+# data/references_reverse.bin has the same layout, with every verse that is
+# referenced (ranges expanded) as the sources, the verses referencing it as
+# the starts and no ends.
+MAGIC = b"TOVXREF1"
+HEADER = struct.Struct("<8sII")  # magic, source count, reference count
+
+Reference = Tuple[int, int, int]
+
+
+def read_cross_references(path: str, batch_size: int = 10000) -> Iterator[Reference]:
+    """
+    Yields (verse, start, end) for each line of the OpenBible cross
+    references, with an end of 0 for references to a single verse. Lines are
+    parsed `batch_size` at a time with references.parse_references.
+    """
+
+    def parse(sources: List[str], targets: List[str]) -> Iterator[Reference]:
+        verses, source_ends = parse_references(sources)
+        if any(source_ends):
+            raise ValueError(f"{path} has a range as the verse of a reference")
+        starts, ends = parse_references(targets)
+        return zip(verses, starts, ends)
+
+    sources: List[str] = []
+    targets: List[str] = []
+    with open(path, "r", encoding="utf-8") as file:
+        for index, line in enumerate(file):
+            columns = line.split()
+            if len(columns) < 2:
+                if columns:
+                    print(index, line)
+                continue
+            # Skip the header.
+            if columns[0] == "From":
+                continue
+
+            sources.append(columns[0])
+            targets.append(columns[1])
+            if len(sources) == batch_size:
+                yield from parse(sources, targets)
+                sources, targets = [], []
+
+    yield from parse(sources, targets)
+
+
+def write_references_json(references: Iterable[Reference], path: str):
+    # The app's format: {"GEN.1.1": [["JHN.1.1"], ["JHN.1.1", "JHN.1.3"]]}
+    references_json: Dict[str, List[List[str]]] = {}
+    verse_ids: Dict[int, str] = {}
+    for verse, start, end in references:
+        for packed in (verse, start, end):
+            if packed not in verse_ids:
+                verse_ids[packed] = format_verse_id(packed) if packed else ""
+
+        reference = [verse_ids[start], verse_ids[end]] if end else [verse_ids[start]]
+        references_json.setdefault(verse_ids[verse], []).append(reference)
+
+    with open(path, "w+", encoding="utf-8") as file:
+        json.dump(references_json, file)
+
+
+def compile_references(references: Iterable[Reference], path: str):
+    verses = array("I")
+    starts = array("I")
+    ends = array("I")
+    for verse, start, end in references:
+        verses.append(verse)
+        starts.append(start)
+        ends.append(end)
+
+    # A stable sort keeps each verse's references in the file's order.
+    order = sorted(range(len(verses)), key=verses.__getitem__)
+    sources = array("I")
+    offsets = array("I")
+    for position, index in enumerate(order):
+        if not sources or sources[-1] != verses[index]:
+            sources.append(verses[index])
+            offsets.append(position)
+    offsets.append(len(order))
+
+    tables = [
+        sources,
+        offsets,
+        array("I", (starts[index] for index in order)),
+        array("I", (ends[index] for index in order)),
+    ]
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(sources), len(order)))
+        for table in tables:
+            if sys.byteorder == "big":
+                table.byteswap()
+            table.tofile(file)
+
+
+def expand_range(verses: array, start: int, end: int) -> array:
+    # Every verse from start to end, following verses into the next chapter
+    # or book.
+    if not end:
+        return array("I", [start])
+    expanded = verses[bisect_left(verses, start) : bisect_right(verses, end)]
+    return expanded or array("I", [start])
+
+
+def reverse_references(
+    references: Iterable[Reference], verses: array
+) -> Iterator[Reference]:
+    """
+    Yields (verse, source, 0) for every verse that is referenced by a source,
+    once per source, sorted by verse.
+    """
+    pairs = array("Q")
+    for source, start, end in references:
+        for verse in expand_range(verses, start, end):
+            pairs.append(verse << 32 | source)
+
+    previous = None
+    for pair in sorted(pairs):
+        if pair != previous:
+            yield (pair >> 32, pair & 0xFFFFFFFF, 0)
+            previous = pair
+
+
+class CrossReferenceIndex:
+    """
+    Looks up cross references in a compiled references.bin by binary search,
+    straight from a memory map of the file.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, source_count, reference_count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a compiled cross reference index")
+
+        self.view = memoryview(self.map)
+        tables = []
+        offset = HEADER.size
+        for count in (source_count, source_count + 1, reference_count, reference_count):
+            tables.append(read_uint32s(self.view, offset, count))
+            offset += count * 4
+        self.sources, self.offsets, self.starts, self.ends = tables
+
+    def lookup(self, verse: int) -> List[Tuple[int, int]]:
+        """
+        Returns the (start, end) packed ids of a packed verse's references. In
+        a reverse index these are the verses that reference it, with an end of
+        0.
+        """
+        position = bisect_left(self.sources, verse)
+        if position == len(self.sources) or self.sources[position] != verse:
+            return []
+
+        return [
+            (self.starts[index], self.ends[index])
+            for index in range(self.offsets[position], self.offsets[position + 1])
+        ]
+
+    def get(self, verse_id: str) -> List[List[str]]:
+        # The same shape as references.json.
+        try:
+            verse = parse_verse_id(verse_id)
+        except (KeyError, ValueError):
+            return []
+
+        return [
+            [format_verse_id(start), format_verse_id(end)]
+            if end
+            else [format_verse_id(start)]
+            for start, end in self.lookup(verse)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def close(self):
+        for table in (self.sources, self.offsets, self.starts, self.ends):
+            table.release()
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self) -> "CrossReferenceIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main():
+    cross_references_path = "./cross_references.txt"
+    write_references_json(
+        read_cross_references(cross_references_path), "./data/references.json"
+    )
+    compile_references(
+        read_cross_references(cross_references_path), "./data/references.bin"
+    )
+    compile_references(
+        reverse_references(
+            read_cross_references(cross_references_path),
+            load_verses("./data/chapterLengths.json"),
+        ),
+        "./data/references_reverse.bin",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import json
+import os
+import time
+import tracemalloc
+from typing import ContextManager, Dict, Optional
+
+# Set to a report path (or 1 for the default one) to profile without --profile,
+# and set the other one to 1 to trace memory too.
+PROFILE_ENV = "TOV_PROFILE"
+PROFILE_MEMORY_ENV = "TOV_PROFILE_MEMORY"
+REPORT_PATH = "data/profile.json"
+
+# What gets timed: named steps of a conversion, whole books, single chapters
+# and reading or writing files.
+KINDS = ["stages", "books", "chapters", "io"]
+
+Records = Dict[str, Dict[str, dict]]
+
+
+class _Timer:
+    __slots__ = ("profiler", "kind", "name", "memory", "start")
+
+    def __init__(self, profiler: "Profiler", kind: str, name: str, memory: bool):
+        self.profiler = profiler
+        self.kind = kind
+        self.name = name
+        self.memory = memory and tracemalloc.is_tracing()
+
+    def __enter__(self):
+        if self.memory:
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        peak = tracemalloc.get_traced_memory()[1] if self.memory else 0
+        self.profiler.add(self.kind, self.name, seconds, peak)
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+class Profiler:
+    """
+    Adds up the wall time of everything timed with `time`, by kind and name.
+    With `trace_memory`, tracemalloc runs for the whole profile and things
+    timed with `memory=True` also get their peak memory. Tracing slows every
+    allocation down a lot, so only compare times within a report.
+    """
+
+    enabled = True
+
+    def __init__(self, trace_memory: bool = False):
+        self.records: Records = {kind: {} for kind in KINDS}
+        self.trace_memory = trace_memory
+        self.start = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def time(self, kind: str, name: str, memory: bool = False) -> ContextManager:
+        return _Timer(self, kind, name, memory)
+
+    def _record(self, kind: str, name: str) -> dict:
+        record = self.records[kind].get(name)
+        if record is None:
+            record = self.records[kind][name] = {
+                "calls": 0,
+                "seconds": 0.0,
+                "peak_memory": 0,
+            }
+        return record
+
+    def add(self, kind: str, name: str, seconds: float, peak_memory: int = 0):
+        record = self._record(kind, name)
+        record["calls"] += 1
+        record["seconds"] += seconds
+        record["peak_memory"] = max(record["peak_memory"], peak_memory)
+
+    def merge(self, records: Records):
+        # Adds in the records of a profile taken in another process.
+        for kind, named in records.items():
+            for name, other in named.items():
+                record = self._record(kind, name)
+                record["calls"] += other["calls"]
+                record["seconds"] += other["seconds"]
+                record["peak_memory"] = max(record["peak_memory"], other["peak_memory"])
+
+    def report(self) -> dict:
+        report: dict = {"seconds": time.perf_counter() - self.start}
+        if self.trace_memory and tracemalloc.is_tracing():
+            report["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        report.update(self.records)
+        return report
+
+    def summary(self, top: int = 10) -> str:
+        lines = []
+        for kind in KINDS:
+            named = self.records[kind]
+            if not named:
+                continue
+            total = sum(record["seconds"] for record in named.values())
+            lines.append(f"{kind} ({len(named)}, {total:.3f}s):")
+            slowest = sorted(named, key=lambda name: named[name]["seconds"])
+            for name in reversed(slowest[-top:]):
+                record = named[name]
+                line = (
+                    f"  {name:<24} {record['seconds']:9.4f}s "
+                    f"{record['seconds'] / total if total else 0:6.1%} "
+                    f"{record['calls']:7} calls"
+                )
+                if record["peak_memory"]:
+                    line += f" {record['peak_memory'] / 1e6:8.1f} MB peak"
+                lines.append(line)
+        return "\n".join(lines)
+
+    def write(self, path: str):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=2)
+        os.replace(temp_path, path)
+
+    def stop(self):
+        if self.trace_memory:
+            tracemalloc.stop()
+
+
+class NullProfiler(Profiler):
+    """Stands in for a Profiler when profiling is off, doing nothing at all."""
+
+    enabled = False
+
+    def __init__(self):
+        super().__init__(trace_memory=False)
+
+    def time(self, kind: str, name: str, memory: bool = False) -> ContextManager:
+        return _NO_TIMER
+
+    def add(self, kind: str, name: str, seconds: float, peak_memory: int = 0):
+        pass
+
+    def merge(self, records: Records):
+        pass
+
+
+NO_PROFILER = NullProfiler()
+
+
+def _is_set(name: str) -> bool:
+    return os.environ.get(name, "") not in ("", "0")
+
+
+def get_report_path(flag: Optional[str]) -> Optional[str]:
+    # Where to write the report, from --profile or the environment, or None
+    # when profiling is off.
+    if flag is not None:
+        return flag
+    if not _is_set(PROFILE_ENV):
+        return None
+    value = os.environ[PROFILE_ENV]
+    return REPORT_PATH if value == "1" else value
+
+
+def get_profiler(report_path: Optional[str], trace_memory: bool = False) -> Profiler:
+    if report_path is None:
+        return NO_PROFILER
+    return Profiler(trace_memory or _is_set(PROFILE_MEMORY_ENV))
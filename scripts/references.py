@@ -0,0 +1,292 @@
+import re
+from array import array
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, Iterable, Optional, Tuple
+
+from verse_ids import NUMBER_MASK, biblical_order, pack_verse
+
+# Every book's OSIS id and English name, by USFM id.
+_BOOK_FORMS = {
+    "GEN": ("Gen", "Genesis"),
+    "EXO": ("Exod", "Exodus"),
+    "LEV": ("Lev", "Leviticus"),
+    "NUM": ("Num", "Numbers"),
+    "DEU": ("Deut", "Deuteronomy"),
+    "JOS": ("Josh", "Joshua"),
+    "JDG": ("Judg", "Judges"),
+    "RUT": ("Ruth", "Ruth"),
+    "1SA": ("1Sam", "1 Samuel"),
+    "2SA": ("2Sam", "2 Samuel"),
+    "1KI": ("1Kgs", "1 Kings"),
+    "2KI": ("2Kgs", "2 Kings"),
+    "1CH": ("1Chr", "1 Chronicles"),
+    "2CH": ("2Chr", "2 Chronicles"),
+    "EZR": ("Ezra", "Ezra"),
+    "NEH": ("Neh", "Nehemiah"),
+    "EST": ("Esth", "Esther"),
+    "JOB": ("Job", "Job"),
+    "PSA": ("Ps", "Psalms"),
+    "PRO": ("Prov", "Proverbs"),
+    "ECC": ("Eccl", "Ecclesiastes"),
+    "SNG": ("Song", "Song of Solomon"),
+    "ISA": ("Isa", "Isaiah"),
+    "JER": ("Jer", "Jeremiah"),
+    "LAM": ("Lam", "Lamentations"),
+    "EZK": ("Ezek", "Ezekiel"),
+    "DAN": ("Dan", "Daniel"),
+    "HOS": ("Hos", "Hosea"),
+    "JOL": ("Joel", "Joel"),
+    "AMO": ("Amos", "Amos"),
+    "OBA": ("Obad", "Obadiah"),
+    "JON": ("Jonah", "Jonah"),
+    "MIC": ("Mic", "Micah"),
+    "NAM": ("Nah", "Nahum"),
+    "HAB": ("Hab", "Habakkuk"),
+    "ZEP": ("Zeph", "Zephaniah"),
+    "HAG": ("Hag", "Haggai"),
+    "ZEC": ("Zech", "Zechariah"),
+    "MAL": ("Mal", "Malachi"),
+    "MAT": ("Matt", "Matthew"),
+    "MRK": ("Mark", "Mark"),
+    "LUK": ("Luke", "Luke"),
+    "JHN": ("John", "John"),
+    "ACT": ("Acts", "Acts"),
+    "ROM": ("Rom", "Romans"),
+    "1CO": ("1Cor", "1 Corinthians"),
+    "2CO": ("2Cor", "2 Corinthians"),
+    "GAL": ("Gal", "Galatians"),
+    "EPH": ("Eph", "Ephesians"),
+    "PHP": ("Phil", "Philippians"),
+    "COL": ("Col", "Colossians"),
+    "1TH": ("1Thess", "1 Thessalonians"),
+    "2TH": ("2Thess", "2 Thessalonians"),
+    "1TI": ("1Tim", "1 Timothy"),
+    "2TI": ("2Tim", "2 Timothy"),
+    "TIT": ("Titus", "Titus"),
+    "PHM": ("Phlm", "Philemon"),
+    "HEB": ("Heb", "Hebrews"),
+    "JAS": ("Jas", "James"),
+    "1PE": ("1Pet", "1 Peter"),
+    "2PE": ("2Pet", "2 Peter"),
+    "1JN": ("1John", "1 John"),
+    "2JN": ("2John", "2 John"),
+    "3JN": ("3John", "3 John"),
+    "JUD": ("Jude", "Jude"),
+    "REV": ("Rev", "Revelation"),
+}
+
+# Every book's USFM id, OSIS id and English name, in biblical order.
+BOOKS = [(book_id, *_BOOK_FORMS[book_id]) for book_id in biblical_order]
+
+# Books with a single chapter, whose references can leave the chapter out,
+# like "Jude 3".
+SINGLE_CHAPTER_BOOKS = {"OBA", "PHM", "2JN", "3JN", "JUD"}
+
+# Other names books go by, like the NET's "Psalm 23" headings.
+ALIASES = {
+    "Psalm": "PSA",
+    "Song of Songs": "SNG",
+    "Canticles": "SNG",
+    "Revelations": "REV",
+}
+
+BOOK_NAMES = {name: book_id for book_id, _, name in BOOKS}
+OSIS_IDS = {book_id: osis for book_id, osis, _ in BOOKS}
+
+Reference = Tuple[int, int]
+
+
+def _get_key(name: str) -> str:
+    # Case, spaces and periods don't matter in book names.
+    return name.casefold().replace(" ", "").replace(".", "")
+
+
+def _get_names() -> Dict[str, str]:
+    names: Dict[str, str] = {}
+
+    def add(name: str, book_id: str):
+        key = _get_key(name)
+        if names.setdefault(key, book_id) != book_id:
+            raise ValueError(f"{name!r} is both {names[key]} and {book_id}")
+
+    for book_id, osis, name in BOOKS:
+        add(book_id, book_id)
+        for each in (osis, name):
+            add(each, book_id)
+            # "1 Samuel" is also "I Samuel", and "1Sam" is "I Sam".
+            if each[0] in "123":
+                add("I" * int(each[0]) + " " + each[1:], book_id)
+    for name, book_id in ALIASES.items():
+        add(name, book_id)
+    return names
+
+
+_NAMES = _get_names()
+
+# Book names are found with a trie of their keys, one nested dict per
+# character, where _BOOK_ID holds the id of a book whose name ends there. The
+# longest name wins, so "Phil" doesn't cut "Philemon" short.
+_BOOK_ID = ""
+
+
+def _build_trie(names: Dict[str, str]) -> dict:
+    trie: dict = {}
+    for key, book_id in names.items():
+        node = trie
+        for character in key:
+            node = node.setdefault(character, {})
+        node[_BOOK_ID] = book_id
+    return trie
+
+
+_TRIE = _build_trie(_NAMES)
+
+# The chapter and verse after a book: "3:4" or "3.4", or just a chapter.
+_LOCATION_RE = re.compile(r"[\s.]*(\d+)(?:\s*[:.]\s*(\d+))?\s*")
+_RANGE_RE = re.compile(r"[-–—]\s*")
+
+# How many parsed references each cache keeps. That's every verse of the Bible
+# twice over, without growing forever in a long-running process.
+CACHE_SIZE = 1 << 16
+
+
+def _match_book(text: str, start: int) -> Tuple[Optional[str], int]:
+    # The book whose name starts at `start` of some casefolded text, and where
+    # its name ends.
+    node = _TRIE
+    book_id = None
+    end = start
+    for position in range(start, len(text)):
+        character = text[position]
+        if character in " .":
+            continue
+        node = node.get(character)
+        if node is None:
+            break
+        if _BOOK_ID in node and not (
+            position + 1 < len(text) and text[position + 1].isalpha()
+        ):
+            book_id = node[_BOOK_ID]
+            end = position + 1
+    return book_id, end
+
+
+def parse_book(name: str) -> Optional[str]:
+    """
+    Returns the USFM id of a book from its USFM id, OSIS id or English name,
+    or None if it isn't one.
+    """
+    return _NAMES.get(_get_key(name))
+
+
+# Every verse shows up in many references, so remember the ones packed.
+@lru_cache(maxsize=CACHE_SIZE)
+def _pack_dotted(verse: str) -> int:
+    # Packs a verse like "Gen.1.1" or "GEN.1.1", or returns 0 if it isn't in
+    # that form.
+    parts = verse.split(".")
+    if len(parts) != 3 or not (parts[1].isdigit() and parts[2].isdigit()):
+        return 0
+    book_id = _NAMES.get(parts[0].casefold())
+    chapter, number = int(parts[1]), int(parts[2])
+    if book_id is None or not (chapter and number):
+        return 0
+    return pack_verse(book_id, chapter, number)
+
+
+def _parse_dotted(reference: str) -> Optional[Reference]:
+    # OSIS and USFM references, which are most of them, without the trie.
+    start, _, end = reference.partition("-")
+    first = _pack_dotted(start)
+    if not first:
+        return None
+    if not end:
+        return first, 0
+    last = _pack_dotted(end)
+    if last < first:
+        return None
+    return first, last
+
+
+def _get_location(reference: str, book_id: str, location: re.Match) -> Tuple[int, int]:
+    # The chapter and verse of a _LOCATION_RE match, with a verse of 0 for a
+    # whole chapter. A lone number after a single chapter book is a verse.
+    chapter = int(location.group(1))
+    verse = location.group(2)
+    if verse is None and book_id in SINGLE_CHAPTER_BOOKS:
+        chapter, verse = 1, location.group(1)
+    if not chapter or (verse is not None and not int(verse)):
+        raise ValueError(f"{reference!r} has a chapter or verse 0")
+    return chapter, int(verse or 0)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_reference(reference: str) -> Reference:
+    """
+    Packs a reference like "GEN.1.1", "Gen.1.1-Gen.1.3", "1 Samuel 3:4-6" or
+    "Genesis 1:1–2:3" into the packed ids (see verse_ids.py) of its first and
+    last verses, with a last verse of 0 if it's a single verse. A whole
+    chapter, like "Psalm 23", is verse 0 of it.
+    """
+    dotted = _parse_dotted(reference)
+    if dotted is not None:
+        return dotted
+
+    text = reference.strip().casefold()
+    book_id, position = _match_book(text, 0)
+    if book_id is None:
+        raise ValueError(f"Can't find the book of {reference!r}")
+    location = _LOCATION_RE.match(text, position)
+    if location is None:
+        raise ValueError(f"Can't find the chapter of {reference!r}")
+    chapter, verse = _get_location(reference, book_id, location)
+    start = pack_verse(book_id, chapter, verse)
+    position = location.end()
+    if position == len(text):
+        return start, 0
+
+    dash = _RANGE_RE.match(text, position)
+    if dash is None:
+        raise ValueError(f"Can't parse {reference!r}")
+    position = dash.end()
+
+    # The end of a range can name its own book, like OSIS ranges do, or be
+    # another chapter and verse, or just a verse when the start has one.
+    end_book_id, book_end = _match_book(text, position)
+    if end_book_id is not None:
+        book_id, position = end_book_id, book_end
+    location = _LOCATION_RE.match(text, position)
+    if location is None or location.end() != len(text):
+        raise ValueError(f"Can't parse {reference!r}")
+    if location.group(2) is None and end_book_id is None and verse:
+        end = pack_verse(book_id, chapter, int(location.group(1)))
+    else:
+        end = pack_verse(book_id, *_get_location(reference, book_id, location))
+
+    if end < start:
+        raise ValueError(f"{reference!r} ends before it starts")
+    return start, end
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_verse(reference: str) -> int:
+    # Packs a reference to a single verse, in any form parse_reference takes.
+    verse = _pack_dotted(reference)
+    if verse & NUMBER_MASK:
+        return verse
+    start, end = parse_reference(reference)
+    if end or not start & NUMBER_MASK:
+        raise ValueError(f"{reference!r} isn't a single verse")
+    return start
+
+
+def parse_references(references: Iterable[str]) -> Tuple[array, array]:
+    """
+    Parses many references at once into arrays of their first and last
+    verses, like parse_reference, parsing each different reference once.
+    """
+    parsed = list(map(parse_reference, references))
+    starts = array("I", map(itemgetter(0), parsed))
+    ends = array("I", map(itemgetter(1), parsed))
+    return starts, ends
@@ -0,0 +1,328 @@
+import argparse
+import json
+import mmap
+import re
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from verse_ids import format_verse_id, pack_verse, read_uint32s
+
+# A search index is one file laid out as:
+#
+#   HEADER
+#   every term, UTF-8, sorted and separated by newlines
+#   offsets: where each term's postings start, plus the end, as uint32s
+#   postings
+#
+# A term's postings start with its verse list as varints: the list's size in
+# bytes, then each verse as the delta from the last packed verse id and the
+# number of times the term occurs in it. Every occurrence's position in its
+# verse follows, one byte each, so that a verse's positions can be found by
+# counting the occurrences before it. Looking up a single term only needs the
+# verse list.
+MAGIC = b"TOVSRCH1"
+HEADER = struct.Struct("<8sIII")  # magic, term count, terms size, postings size
+
+MAX_POSITION = 0xFF
+
+VERSE_RE = re.compile(r"\[(\d+)\]")
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+Postings = Dict[int, List[int]]
+
+
+def tokenize(text: str) -> List[str]:
+    # Case, punctuation and Markdown don't matter, and a curly apostrophe
+    # splits words just like a straight one does.
+    return TOKEN_RE.findall(text.casefold())
+
+
+def split_verses(chapter: dict) -> Iterator[Tuple[int, str]]:
+    # Yields the packed verse id and text of every verse in a chapter. Text
+    # before the first verse (headings and the like) isn't part of a verse.
+    book_id, chapter_number = chapter["chapterId"].split(".")
+    parts = VERSE_RE.split(chapter["md"])
+    for number, text in zip(parts[1::2], parts[2::2]):
+        yield pack_verse(book_id, int(chapter_number), int(number)), text
+
+
+def read_chapters(path: str) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as file:
+        if path.endswith(".ndjson"):
+            for line in file:
+                yield json.loads(line)
+        else:
+            yield from json.load(file)
+
+
+def encode_varints(numbers: Iterable[int], out: bytearray):
+    for number in numbers:
+        while number > 0x7F:
+            out.append(number & 0x7F | 0x80)
+            number >>= 7
+        out.append(number)
+
+
+def decode_varints(data, start: int, end: int) -> List[int]:
+    numbers = []
+    number = 0
+    shift = 0
+    for byte in data[start:end]:
+        number |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            numbers.append(number)
+            number = 0
+            shift = 0
+    return numbers
+
+
+def encode_postings(term: str, postings: Postings) -> bytes:
+    verses = bytearray()
+    positions = bytearray()
+    last_verse = 0
+    for verse in sorted(postings):
+        verse_positions = postings[verse]
+        if verse_positions[-1] > MAX_POSITION:
+            raise ValueError(f"{term} is too far into {format_verse_id(verse)}")
+        encode_varints((verse - last_verse, len(verse_positions)), verses)
+        positions.extend(verse_positions)
+        last_verse = verse
+
+    out = bytearray()
+    encode_varints([len(verses)], out)
+    return bytes(out + verses + positions)
+
+
+def build_index(chapters: Iterable[dict], path: str):
+    index: Dict[str, Postings] = {}
+    # Where to carry on numbering positions if a verse shows up twice.
+    verse_lengths: Dict[int, int] = {}
+
+    for chapter in chapters:
+        for verse, text in split_verses(chapter):
+            first = verse_lengths.get(verse, 0)
+            tokens = tokenize(text)
+            for position, term in enumerate(tokens, first):
+                index.setdefault(term, {}).setdefault(verse, []).append(position)
+            verse_lengths[verse] = first + len(tokens)
+
+    write_index(index, path)
+
+
+def write_index(index: Dict[str, Postings], path: str):
+    terms = sorted(index)
+    offsets = array("I", [0])
+    postings = bytearray()
+    for term in terms:
+        postings += encode_postings(term, index[term])
+        offsets.append(len(postings))
+    if sys.byteorder == "big":
+        offsets.byteswap()
+
+    terms_blob = "\n".join(terms).encode("utf-8")
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(terms), len(terms_blob), len(postings)))
+        file.write(terms_blob)
+        # Keep the offsets 4-byte aligned.
+        file.write(b"\0" * (-len(terms_blob) % 4))
+        offsets.tofile(file)
+        file.write(postings)
+
+
+class SearchIndex:
+    """
+    Answers term, phrase and prefix queries from a search index file, reading
+    only the postings of the terms in the query. Results are packed verse ids
+    in biblical order.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, term_count, terms_size, postings_size = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a search index")
+
+        start = HEADER.size
+        terms_blob = self.map[start : start + terms_size]
+        self.terms = terms_blob.decode("utf-8").split("\n") if term_count else []
+
+        start += terms_size + -terms_size % 4
+        self.view = memoryview(self.map)
+        self.offsets = read_uint32s(self.view, start, term_count + 1)
+        self.postings_start = start + (term_count + 1) * 4
+
+    def _tokenize(self, text: str) -> List[str]:
+        # How queries are split into the terms of the index.
+        return tokenize(text)
+
+    def _find(self, token: str) -> int:
+        # The term's number, or -1 if it isn't in the index.
+        term = bisect_left(self.terms, token)
+        if term < len(self.terms) and self.terms[term] == token:
+            return term
+        return -1
+
+    def _verses(self, term: int) -> Tuple[List[int], List[int], int]:
+        # The verses a term is in, how often it occurs in each and where its
+        # positions start.
+        start = self.postings_start + self.offsets[term]
+
+        # The size of the verse list is a varint of its own.
+        size = 0
+        shift = 0
+        while True:
+            byte = self.map[start]
+            start += 1
+            size |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+
+        numbers = decode_varints(self.map, start, start + size)
+        verses = list(numbers[::2])
+        for i in range(1, len(verses)):
+            verses[i] += verses[i - 1]
+        return verses, numbers[1::2], start + size
+
+    def _positions(
+        self, verses: Tuple[List[int], List[int], int], candidates: Set[int]
+    ) -> Postings:
+        # Where a term occurs in each of the candidate verses.
+        postings = {}
+        offset = verses[2]
+        for verse, count in zip(verses[0], verses[1]):
+            if verse in candidates:
+                postings[verse] = list(self.map[offset : offset + count])
+            offset += count
+        return postings
+
+    def verses(self, term: str) -> List[int]:
+        """Every verse a term of the index is in."""
+        number = self._find(term)
+        return self._verses(number)[0] if number >= 0 else []
+
+    def occurrences(self, term: str) -> Postings:
+        """Every verse a term of the index is in, with its positions there."""
+        number = self._find(term)
+        if number < 0:
+            return {}
+        verses = self._verses(number)
+        return self._positions(verses, set(verses[0]))
+
+    def term(self, word: str) -> List[int]:
+        """Every verse containing the word."""
+        tokens = self._tokenize(word)
+        if len(tokens) != 1:
+            return self.phrase(word)
+        return self.verses(tokens[0])
+
+    def prefix(self, prefix: str) -> List[int]:
+        """Every verse containing a word that starts with the prefix."""
+        tokens = self._tokenize(prefix)
+        if len(tokens) != 1:
+            return []
+        start = bisect_left(self.terms, tokens[0])
+        end = bisect_left(self.terms, tokens[0] + "\U0010ffff", start)
+
+        verses = set()
+        for term in range(start, end):
+            verses.update(self._verses(term)[0])
+        return sorted(verses)
+
+    def phrase(self, text: str) -> List[int]:
+        """Every verse containing the words of the text next to each other."""
+        tokens = self._tokenize(text)
+        if not tokens:
+            return []
+        terms = [self._find(token) for token in tokens]
+        if -1 in terms:
+            return []
+
+        # Narrow the verses down with the rarest word first.
+        verse_lists = {term: self._verses(term) for term in terms}
+        candidates = set(min((verses[0] for verses in verse_lists.values()), key=len))
+        for verses in verse_lists.values():
+            candidates.intersection_update(verses[0])
+        if len(tokens) == 1 or not candidates:
+            return sorted(candidates)
+
+        postings = {
+            term: self._positions(verses, candidates)
+            for term, verses in verse_lists.items()
+        }
+        matches = []
+        for verse in sorted(candidates):
+            following = [set(postings[term][verse]) for term in terms]
+            if any(
+                all(start + i in following[i] for i in range(1, len(terms)))
+                for start in postings[terms[0]][verse]
+            ):
+                matches.append(verse)
+        return matches
+
+    def search(self, query: str) -> List[int]:
+        """
+        Verses matching every part of a query, where a part is a "quoted
+        phrase", a prefix* or a word.
+        """
+        results = None
+        for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+            if phrase:
+                verses = self.phrase(phrase)
+            elif word.endswith("*"):
+                verses = self.prefix(word[:-1])
+            else:
+                verses = self.term(word)
+            results = set(verses) if results is None else results & set(verses)
+        return sorted(results or [])
+
+    def close(self):
+        self.offsets.release()
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build data/<translation>_search.bin from the chapter output."
+    )
+    parser.add_argument("translation", nargs="?", default="bsb")
+    parser.add_argument(
+        "--chapters",
+        help="chapters to index (default: data/<translation>_chapters.json)",
+    )
+    parser.add_argument("--query", help="search the index instead of building it")
+    args = parser.parse_args()
+    index_path = f"data/{args.translation}_search.bin"
+
+    if args.query is not None:
+        with SearchIndex(index_path) as index:
+            start = time.perf_counter()
+            verses = index.search(args.query)
+            elapsed = time.perf_counter() - start
+        for verse in verses:
+            print(format_verse_id(verse))
+        print(f"{len(verses)} verses in {elapsed * 1000:.1f}ms")
+        return
+
+    chapters_path = args.chapters or f"data/{args.translation}_chapters.json"
+    build_index(read_chapters(chapters_path), index_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import os
+import random
+import re
+import struct
+import sys
+import time
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from parse_cross_references import CrossReferenceIndex, Reference, compile_references
+from search_index import read_chapters, split_verses, tokenize
+from verse_ids import format_verse_id, parse_verse_id
+
+# Finds each verse's most similar verses without comparing every pair of
+# verses. Every verse gets a MinHash signature of the pairs of neighbouring
+# words in it, and the signatures are cut into bands: verses that have a
+# whole band in common are compared, and the rest are assumed not to be
+# alike. With BANDS bands of ROWS hashes, verses whose word pairs are about
+# (1 / BANDS) ** (1 / ROWS) alike have even odds of being compared.
+#
+# The similar verses are written in the layout of references.bin (see
+# parse_cross_references.py), most similar first and with no ends.
+NUM_HASHES = 60
+BANDS = 20
+ROWS = NUM_HASHES // BANDS
+SEED = 0
+PRIME = (1 << 31) - 1
+
+
+def _get_hashes() -> List[Tuple[int, int]]:
+    # The a and b of each (a * x + b) % PRIME hash, the same on every run.
+    rng = random.Random(SEED)
+    return [(rng.randrange(1, PRIME), rng.randrange(PRIME)) for _ in range(NUM_HASHES)]
+
+
+_HASHES = _get_hashes()
+
+TOP_K = 10
+# How alike two verses' word pairs have to be (by Jaccard index) to count as
+# similar.
+MIN_SIMILARITY = 0.2
+# Bands that hundreds of verses share are boilerplate, not similarity.
+MAX_BUCKET = 100
+
+CACHE_DIR = "data/.similar_cache"
+# Bump whenever get_shingles or get_signature change (PRIME included) so that
+# cached signatures are computed again.
+SIGNATURE_VERSION = 1
+# A book's signatures are cached in CACHE_DIR as:
+#
+#   CACHE_HEADER
+#   its verses
+#   NUM_HASHES hashes for each verse
+#
+# as little-endian uint32s.
+CACHE_MAGIC = b"TOVSIMH1"
+CACHE_HEADER = struct.Struct("<8s32sI")  # magic, digest of the book, verse count
+
+Verse = Tuple[int, List[str]]
+
+
+def get_shingles(words: List[str]) -> Set[int]:
+    # Every pair of neighbouring words, or the word of a one word verse, as a
+    # CRC-32, which (unlike hash) is the same on every run.
+    if len(words) == 1:
+        return {zlib.crc32(words[0].encode())}
+    return {
+        zlib.crc32(f"{first} {second}".encode())
+        for first, second in zip(words, words[1:])
+    }
+
+
+def get_signature(shingles: Set[int]) -> List[int]:
+    return [min([(a * x + b) % PRIME for x in shingles]) for a, b in _HASHES]
+
+
+def split_books(chapters: Iterable[dict]) -> Dict[str, List[Verse]]:
+    # The words of every verse with any, by book, in reading order.
+    books: Dict[str, List[Verse]] = {}
+    for chapter in chapters:
+        book_id = chapter["chapterId"].split(".")[0]
+        for verse, text in split_verses(chapter):
+            words = tokenize(text)
+            if words:
+                books.setdefault(book_id, []).append((verse, words))
+    return books
+
+
+def get_book_digest(verses: List[Verse]) -> bytes:
+    hasher = hashlib.sha256(
+        f"{SIGNATURE_VERSION} {NUM_HASHES} {SEED} {PRIME}\n".encode()
+    )
+    for verse, words in verses:
+        hasher.update(f"{verse} {' '.join(words)}\n".encode())
+    return hasher.digest()
+
+
+def load_signatures(cache_path: str, digest: bytes) -> Optional[array]:
+    try:
+        with open(cache_path, "rb") as file:
+            data = file.read()
+    except OSError:
+        return None
+    if len(data) < CACHE_HEADER.size:
+        return None
+    magic, cached_digest, count = CACHE_HEADER.unpack_from(data)
+    if (magic, cached_digest) != (CACHE_MAGIC, digest):
+        return None
+    offset = CACHE_HEADER.size + count * 4
+    if len(data) != offset + count * NUM_HASHES * 4:
+        return None
+
+    signatures = array("I", data[offset:])
+    if sys.byteorder == "big":
+        signatures.byteswap()
+    return signatures
+
+
+def save_signatures(
+    cache_path: str, digest: bytes, verses: List[Verse], signatures: array
+):
+    tables = [array("I", (verse for verse, _ in verses)), array("I", signatures)]
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(CACHE_HEADER.pack(CACHE_MAGIC, digest, len(verses)))
+        for table in tables:
+            if sys.byteorder == "big":
+                table.byteswap()
+            table.tofile(file)
+    os.replace(temp_path, cache_path)
+
+
+def get_signatures(
+    verses: List[Verse], shingles: List[Set[int]], cache_path: Optional[str] = None
+) -> array:
+    """
+    Returns the signatures of a book's verses back to back, from `cache_path`
+    if they were cached there for the same verses.
+    """
+    if cache_path is not None:
+        digest = get_book_digest(verses)
+        signatures = load_signatures(cache_path, digest)
+        if signatures is not None:
+            return signatures
+
+    signatures = array("I")
+    for verse_shingles in shingles:
+        signatures.extend(get_signature(verse_shingles))
+    if cache_path is not None:
+        save_signatures(cache_path, digest, verses, signatures)
+    return signatures
+
+
+def find_similar(
+    verses: List[int],
+    shingles: List[Set[int]],
+    signatures: array,
+    top_k: int = TOP_K,
+) -> Iterator[Reference]:
+    """
+    Yields (verse, similar verse, 0) for up to `top_k` verses similar to each
+    verse, by verse and then most similar first.
+    """
+    buckets: Dict[Tuple[int, ...], List[int]] = {}
+    for index in range(len(verses)):
+        signature = signatures[index * NUM_HASHES : (index + 1) * NUM_HASHES]
+        for band in range(BANDS):
+            key = (band, *signature[band * ROWS : (band + 1) * ROWS])
+            buckets.setdefault(key, []).append(index)
+
+    candidates = set()
+    for bucket in buckets.values():
+        if 1 < len(bucket) <= MAX_BUCKET:
+            for position, first in enumerate(bucket):
+                for second in bucket[position + 1 :]:
+                    candidates.add((first, second))
+
+    similar: Dict[int, List[Tuple[float, int]]] = {}
+    for first, second in candidates:
+        if verses[first] == verses[second]:
+            continue
+        similarity = len(shingles[first] & shingles[second]) / len(
+            shingles[first] | shingles[second]
+        )
+        if similarity >= MIN_SIMILARITY:
+            similar.setdefault(first, []).append((-similarity, verses[second]))
+            similar.setdefault(second, []).append((-similarity, verses[first]))
+
+    for index in sorted(similar, key=verses.__getitem__):
+        for _, other in sorted(similar[index])[:top_k]:
+            yield verses[index], other, 0
+
+
+def build_similar(
+    chapters: Iterable[dict],
+    path: str,
+    cache_dir: Optional[str] = None,
+    name: str = "bsb",
+    top_k: int = TOP_K,
+):
+    """
+    Writes the similar verses of some chapters to `path`. With a `cache_dir`,
+    only the signatures of books that changed since the last build (of the
+    translation called `name`) are computed again.
+    """
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    verses: List[int] = []
+    shingles: List[Set[int]] = []
+    signatures = array("I")
+    books = split_books(chapters)
+    for book_id, book in books.items():
+        book_shingles = [get_shingles(words) for _, words in book]
+        cache_path = (
+            os.path.join(cache_dir, f"{name}_{book_id}.bin")
+            if cache_dir is not None
+            else None
+        )
+        signatures.extend(get_signatures(book, book_shingles, cache_path))
+        verses.extend(verse for verse, _ in book)
+        shingles.extend(book_shingles)
+
+    compile_references(find_similar(verses, shingles, signatures, top_k), path)
+
+    if cache_dir is not None:
+        prune_cache(cache_dir, name, books)
+
+
+def prune_cache(cache_dir: str, name: str, book_ids: Iterable[str]):
+    # Removes the cached signatures of the translation's books that aren't in
+    # its chapters anymore. Book ids are three characters, so "net" leaves
+    # alone the cache of "net_epub".
+    keep = {f"{name}_{book_id}.bin" for book_id in book_ids}
+    for file_name in os.listdir(cache_dir):
+        if (
+            re.fullmatch(rf"{re.escape(name)}_\w{{3}}\.bin", file_name)
+            and file_name not in keep
+        ):
+            os.remove(os.path.join(cache_dir, file_name))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build data/<translation>_similar.bin from the chapter output."
+    )
+    parser.add_argument("translation", nargs="?", default="bsb")
+    parser.add_argument(
+        "--chapters",
+        help="chapters to index (default: data/<translation>_chapters.json)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"compute every book's signatures instead of reusing {CACHE_DIR}",
+    )
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument(
+        "--lookup", help="print the verses similar to a verse like GEN.1.1 instead"
+    )
+    args = parser.parse_args()
+    index_path = f"data/{args.translation}_similar.bin"
+
+    if args.lookup is not None:
+        with CrossReferenceIndex(index_path) as index:
+            for verse, _ in index.lookup(parse_verse_id(args.lookup)):
+                print(format_verse_id(verse))
+        return
+
+    start = time.perf_counter()
+    build_similar(
+        read_chapters(args.chapters or f"data/{args.translation}_chapters.json"),
+        index_path,
+        None if args.no_cache else CACHE_DIR,
+        args.translation,
+        args.top_k,
+    )
+    print(f"Built {index_path} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from typing import Dict, Iterator, Optional, Tuple
+
+# Finds where every chapter and verse of a USFM book starts, so that a single
+# chapter or verse can be read out of a memory map of the book without
+# decoding the rest of it. A chapter runs from its \c marker up to the next
+# one and a verse from its \v marker up to the next verse or chapter.
+#
+# Indexes can be cached on disk, keyed on the book's size and modification
+# time, as:
+#
+#   HEADER
+#   chapter numbers
+#   chapter offsets
+#   the first verse of each chapter, plus the verse count at the end
+#   verse numbers
+#   verse offsets
+#
+# all little-endian uint32s, with offsets in bytes.
+MAGIC = b"TOVUSFM1"
+HEADER = struct.Struct("<8sQqII")  # magic, size, mtime_ns, chapters, verses
+INDEX_DIR = "data/.usfm_cache"
+
+_MARKER_RE = re.compile(rb"\\([cv])\s+(\d+)")
+
+
+def decode(data: bytes) -> str:
+    # Like reading the file in text mode, every kind of line ending reads as
+    # a "\n".
+    text = data.decode("utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def get_index_path(book_file_path: str, index_dir: str) -> str:
+    # Books of different translations share file names, so the directory is
+    # part of the name too, like "web_usfm_GEN.usfm.idx".
+    directory = os.path.basename(os.path.dirname(os.path.abspath(book_file_path)))
+    return os.path.join(
+        index_dir, f"{directory}_{os.path.basename(book_file_path)}.idx"
+    )
+
+
+class UsfmBook:
+    """
+    Reads single chapters and verses of a USFM book out of a memory map of
+    the file. The markers are found with one scan of the book, or loaded from
+    `index_dir` if the book hasn't changed since they were last cached there.
+    """
+
+    def __init__(self, path: str, index_dir: Optional[str] = None):
+        self.path = path
+        with open(path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            # Empty files can't be memory mapped.
+            self.map = (
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if stat.st_size
+                else b""
+            )
+        self.size = stat.st_size
+
+        index = None
+        if index_dir is not None:
+            index_path = get_index_path(path, index_dir)
+            index = self._load_index(index_path, stat.st_mtime_ns)
+        if index is None:
+            index = self._scan()
+            if index_dir is not None:
+                os.makedirs(index_dir, exist_ok=True)
+                self._save_index(index_path, stat.st_mtime_ns, index)
+
+        (
+            self.chapter_numbers,
+            self.chapter_offsets,
+            self.chapter_verses,
+            self.verse_numbers,
+            self.verse_offsets,
+        ) = index
+        self.chapters: Dict[int, int] = {}
+        for position, number in enumerate(self.chapter_numbers):
+            self.chapters.setdefault(number, position)
+
+    def _scan(self) -> Tuple[array, ...]:
+        index = tuple(array("I") for _ in range(5))
+        chapter_numbers, chapter_offsets, chapter_verses, verse_numbers, offsets = index
+        for match in _MARKER_RE.finditer(self.map):
+            if match.group(1) == b"c":
+                chapter_numbers.append(int(match.group(2)))
+                chapter_offsets.append(match.start())
+                chapter_verses.append(len(verse_numbers))
+            # Verses before the first chapter aren't in one.
+            elif chapter_numbers:
+                verse_numbers.append(int(match.group(2)))
+                offsets.append(match.start())
+        chapter_verses.append(len(verse_numbers))
+        return index
+
+    def _load_index(self, index_path: str, mtime_ns: int) -> Optional[Tuple]:
+        try:
+            with open(index_path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, size, indexed_mtime_ns, chapter_count, verse_count = (
+            HEADER.unpack_from(data)
+        )
+        if magic != MAGIC or (size, indexed_mtime_ns) != (self.size, mtime_ns):
+            return None
+        counts = [chapter_count] * 2 + [chapter_count + 1] + [verse_count] * 2
+        if len(data) != HEADER.size + 4 * sum(counts):
+            return None
+
+        index = []
+        offset = HEADER.size
+        for count in counts:
+            table = array("I", data[offset : offset + count * 4])
+            if sys.byteorder == "big":
+                table.byteswap()
+            index.append(table)
+            offset += count * 4
+        return tuple(index)
+
+    def _save_index(self, index_path: str, mtime_ns: int, index: Tuple):
+        temp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(
+                HEADER.pack(MAGIC, self.size, mtime_ns, len(index[0]), len(index[3]))
+            )
+            for table in index:
+                if sys.byteorder == "big":
+                    table = array("I", table)
+                    table.byteswap()
+                table.tofile(file)
+        os.replace(temp_path, index_path)
+
+    def _chapter_end(self, position: int) -> int:
+        if position + 1 < len(self.chapter_offsets):
+            return self.chapter_offsets[position + 1]
+        return self.size
+
+    def chapter_range(self, chapter: int) -> Optional[Tuple[int, int]]:
+        """Returns the start and end byte offsets of a chapter."""
+        position = self.chapters.get(chapter)
+        if position is None:
+            return None
+        return self.chapter_offsets[position], self._chapter_end(position)
+
+    def verse_range(self, chapter: int, verse: int) -> Optional[Tuple[int, int]]:
+        """Returns the start and end byte offsets of a verse."""
+        position = self.chapters.get(chapter)
+        if position is None:
+            return None
+        first = self.chapter_verses[position]
+        last = self.chapter_verses[position + 1]
+        for index in range(first, last):
+            if self.verse_numbers[index] == verse:
+                end = (
+                    self.verse_offsets[index + 1]
+                    if index + 1 < last
+                    else self._chapter_end(position)
+                )
+                return self.verse_offsets[index], end
+        return None
+
+    def _text(self, location: Optional[Tuple[int, int]]) -> Optional[str]:
+        if location is None:
+            return None
+        start, end = location
+        return decode(self.map[start:end])
+
+    def chapter(self, chapter: int) -> Optional[str]:
+        return self._text(self.chapter_range(chapter))
+
+    def verse(self, chapter: int, verse: int) -> Optional[str]:
+        return self._text(self.verse_range(chapter, verse))
+
+    def iter_chapters(self) -> Iterator[Tuple[int, str]]:
+        # Every chapter's number and USFM, in the order they're in the book.
+        for position, number in enumerate(self.chapter_numbers):
+            start = self.chapter_offsets[position]
+            yield number, decode(self.map[start : self._chapter_end(position)])
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+
+    def __enter__(self) -> "UsfmBook":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print the USFM of one chapter or verse of a book."
+    )
+    parser.add_argument("book", help="a USFM file, like data/web_usfm/GEN.usfm")
+    parser.add_argument("chapter", type=int)
+    parser.add_argument("verse", type=int, nargs="?")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"scan the book instead of caching its index in {INDEX_DIR}",
+    )
+    args = parser.parse_args()
+
+    with UsfmBook(args.book, None if args.no_cache else INDEX_DIR) as book:
+        if args.verse is None:
+            text = book.chapter(args.chapter)
+        else:
+            text = book.verse(args.chapter, args.verse)
+    if text is None:
+        reference = str(args.chapter)
+        if args.verse is not None:
+            reference += f":{args.verse}"
+        sys.exit(f"{args.book} has no {reference}")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,423 @@
+import argparse
+import hashlib
 import json
 import os
 import re
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from chapter_writer import FORMATS, ChapterWriter, get_output_path
+from profiler import (
+    NO_PROFILER,
+    PROFILE_ENV,
+    PROFILE_MEMORY_ENV,
+    REPORT_PATH,
+    Profiler,
+    Records,
+    get_profiler,
+    get_report_path,
+)
+from usfm_reader import UsfmBook
+from verse_ids import biblical_order
+
+# Splits a chapter into the pieces usfm_to_markdown cares about in one scan:
+# runs of plain text (which may hold simple `\w word|strong="..."\w*` tags),
+# the `|strong="..."\w*` end of a word tag that wraps other markers, poetry
+# markers, every other marker (dropping the `+` of nested ones) and newlines.
+_TOKEN_RE = re.compile(
+    r"(?P<text>(?:[^\\\n|]+"
+    r"|\\\+?w [^\\\n|]+\|strong=\"[^\"\s]*\"\\\+?w\*"
+    r"|\|(?!strong=\"[^\"\s]*\"\\\+?w\*)"
+    r"|\\(?!\+?[a-z0-9]))+)"
+    r"|(?P<strong>\|strong=\"[^\"\s]*\")\\\+?w\*"
+    r"|\\\+?(?P<poetry>q\d+)"
+    r"|\\\+?(?P<name>[a-z0-9]+)(?P<star>\*?)"
+    r"|\n"
+)
+
+# The end of a simple word tag, once its start has been dropped.
+_STRONG_RE = re.compile(r"\|strong=\"[^\"\s]*\"\\\+?w\*")
+
+_CHAPTER_NUMBER_RE = re.compile(r" +\d+ +")
+_VERSE_NUMBER_RE = re.compile(r" (\d+) *")
+_LORD_RE = re.compile(r"\s+Lord")
+_SPACES_RE = re.compile(r" {2,}")
+
+_VERSE_MARKER_RE = re.compile(r"\[(\d+)\]")
+_ASTRAL_RE = re.compile("[\U00010000-\U0010ffff]")
+
+# Stands in for a marker that is only dropped at the very end, so that it
+# still separates the text around it while spacing and Selahs are resolved.
+_GAP = "\x00"
+
+# Token kinds.
+TEXT = 0
+STRONG = 1
+POETRY = 2
+MARKER = 3
+
+# What a line of tokens holds, so that most lines can skip most steps.
+HAS_NOTES = 1
+HAS_POETRY = 2
+HAS_PARAGRAPHS = 4
+
+Token = Tuple[int, str, bool]
+
+
+def _unwrap_words(text: str) -> str:
+    if "\\" not in text:
+        return text
+    return _STRONG_RE.sub("", text.replace("\\+w ", "").replace("\\w ", ""))
+
+
+def _tokenize(usfm_text: str) -> List[Tuple[List[Token], int]]:
+    lines: List[Tuple[List[Token], int]] = []
+    line: List[Token] = []
+    flags = 0
+
+    for text, strong, poetry, name, star in _TOKEN_RE.findall(usfm_text):
+        if text:
+            line.append((TEXT, text, False))
+        elif name:
+            line.append((MARKER, name, star == "*"))
+            if name[0] in "fx":
+                flags |= HAS_NOTES
+            elif name[0] == "p":
+                flags |= HAS_PARAGRAPHS
+        elif poetry:
+            line.append((POETRY, poetry, False))
+            flags |= HAS_POETRY
+        elif strong:
+            line.append((STRONG, strong, False))
+        else:
+            lines.append((line, flags))
+            line = []
+            flags = 0
+
+    lines.append((line, flags))
+    return lines
+
+
+def _strip_notes(tokens: List[Token]) -> List[Token]:
+    notes = [
+        index
+        for index, (kind, name, _) in enumerate(tokens)
+        if kind == MARKER and name[0] in "fx"
+    ]
+    if not notes:
+        return tokens
+
+    # Footnotes run from the first `\f` marker to the last `\f*` on the line.
+    starts = [index for index in notes if tokens[index][1][0] == "f"]
+    ends = [index for index in starts if tokens[index][1:] == ("f", True)]
+    if ends and starts[0] < ends[-1]:
+        start, end = starts[0], ends[-1]
+        if tokens[start] != (MARKER, "f", False) or start + 1 < end:
+            tokens = tokens[:start] + tokens[end + 1 :]
+
+    # Cross references run to the nearest `\x*` and take the space before them.
+    result: List[Token] = []
+    start = None
+    for index, token in enumerate(tokens):
+        if start is None:
+            if token[0] == MARKER and token[1][0] == "x":
+                start = index
+            else:
+                result.append(token)
+        elif token == (MARKER, "x", True) and (
+            index > start + 1 or tokens[start] != (MARKER, "x", False)
+        ):
+            if result and result[-1][0] == TEXT and result[-1][1].endswith(" "):
+                text = result.pop()[1][:-1]
+                if text:
+                    result.append((TEXT, text, False))
+            start = None
+
+    if start is not None:
+        result.extend(tokens[start:])
+    return result
+
+
+def _lines(
+    raw_lines: List[Tuple[List[Token], int]]
+) -> Iterator[Tuple[List[Token], bool]]:
+    """
+    Yields the tokenized lines of a chapter with chapter numbers, notes,
+    poetry markers, verse numbers and paragraphs resolved, and whether each
+    ends in a newline.
+    """
+    joined: List[Token] = []
+    joined_flags = 0
+    first = True
+
+    for index, (tokens, flags) in enumerate(raw_lines):
+        # The chapter number only goes if there is a space after it.
+        if (
+            index == 0
+            and len(tokens) > 1
+            and tokens[0] == (MARKER, "c", False)
+            and tokens[1][0] == TEXT
+        ):
+            number = _CHAPTER_NUMBER_RE.match(tokens[1][1])
+            if number:
+                rest = tokens[1][1][number.end() :]
+                tokens = ([(TEXT, rest, False)] if rest else []) + tokens[2:]
+
+        if flags & HAS_NOTES:
+            tokens = _strip_notes(tokens)
+        if flags & HAS_POETRY:
+            tokens = [token for token in tokens if token[0] != POETRY]
+
+        # A verse marker at the start of a line pulls it onto the previous one.
+        if (
+            index > 0
+            and len(tokens) > 1
+            and tokens[0] == (MARKER, "v", False)
+            and tokens[1][0] == TEXT
+        ):
+            number = _VERSE_NUMBER_RE.match(tokens[1][1])
+            if number:
+                verse = f"[{number.group(1)}] {tokens[1][1][number.end():]}"
+                joined.append((TEXT, verse, False))
+                joined.extend(tokens[2:])
+                joined_flags |= flags
+                continue
+
+        if index > 0:
+            yield from _split_paragraphs(joined, joined_flags, first, True)
+            first = False
+        joined = tokens
+        joined_flags = flags
+
+    yield from _split_paragraphs(joined, joined_flags, first, False)
+
+
+def _split_paragraphs(
+    tokens: List[Token], flags: int, first: bool, newline: bool
+) -> Iterator[Tuple[List[Token], bool]]:
+    if not flags & HAS_PARAGRAPHS:
+        yield _lstrip_line(tokens, first), newline
+        return
+
+    line: List[Token] = []
+
+    for token in tokens:
+        kind, name, star = token
+        if kind != MARKER or name[0] != "p":
+            line.append(token)
+        elif name != "pi1":
+            # Paragraph markers become line breaks, leaving the rest of their
+            # name behind (`\pmo` reads as "mo").
+            yield _lstrip_line(line, first), True
+            first = False
+            rest = name[1:] + ("*" if star else "")
+            line = [(TEXT, rest, False)] if rest else []
+
+    yield _lstrip_line(line, first), newline
+
+
+def _lstrip_line(line: List[Token], first: bool) -> List[Token]:
+    # Lines lose a single leading space.
+    if not first and line and line[0][0] == TEXT and line[0][1].startswith(" "):
+        text = line[0][1][1:]
+        line = ([(TEXT, text, False)] if text else []) + line[1:]
+    return line
+
+
+class _Writer:
+    __slots__ = ("parts", "skip_spaces", "gaps")
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.skip_spaces = False
+        self.gaps = False
+
+    def text(self, text: str):
+        if self.skip_spaces:
+            text = _unwrap_words(text).lstrip(" ")
+            if not text:
+                return
+            self.skip_spaces = False
+        self.parts.append(text)
+
+    def markup(self, markup: str, skip_spaces: bool = False):
+        self.parts.append(markup)
+        self.skip_spaces = skip_spaces
+
+    def gap(self):
+        self.markup(_GAP)
+        self.gaps = True
+
+    def rstrip(self):
+        parts = self.parts
+        while parts:
+            text = _unwrap_words(parts[-1]).rstrip(" ")
+            if text:
+                parts[-1] = text
+                return
+            parts.pop()
+
+
+def _find(tokens: List[Token], start: int, token: Token) -> Optional[int]:
+    for index in range(start, len(tokens)):
+        if tokens[index] == token:
+            return index
+    return None
+
+
+def _find_last(tokens: List[Token], start: int, token: Token) -> Optional[int]:
+    for index in range(len(tokens) - 1, start - 1, -1):
+        if tokens[index] == token:
+            return index
+    return None
+
+
+def _render_line(tokens: List[Token], newline: bool, out: _Writer):
+    # Markup to write (and whether to trim the spaces before it) when each
+    # paired closing marker is reached.
+    closers = {}
+    span_ends = {}
+    headings = set()
+    removing = False
+
+    for index, (kind, value, star) in enumerate(tokens):
+        if index in closers:
+            markup, strip = closers.pop(index)
+            if not removing:
+                if strip:
+                    out.rstrip()
+                if markup:
+                    out.markup(markup)
+            continue
+        if removing:
+            continue
+
+        if kind == TEXT:
+            out.text(value)
+            continue
+        if kind == STRONG:
+            out.text(value)
+            out.gap()
+            continue
+
+        # The text right after the marker, which some markers take a space from.
+        following = ""
+        if index + 1 < len(tokens) and tokens[index + 1][0] == TEXT:
+            following = tokens[index + 1][1]
+        spaced = following.startswith(" ")
+        more = following != " "
+
+        # Strong's word tags keep only their text.
+        if value == "w" and not star and spaced:
+            end = next(
+                (i for i in range(index + 1, len(tokens)) if tokens[i][0] == STRONG),
+                None,
+            )
+            if end is not None and (end > index + 2 or more):
+                closers[end] = ("", False)
+                tokens[index + 1] = (TEXT, following[1:], False)
+                continue
+
+        # Words of Jesus are bold, italics are italic.
+        elif value in ("wj", "it") and span_ends.get(value, -1) < index:
+            end = _find(tokens, index + 1, (MARKER, value, True))
+            if end is not None and (star or end > index + 1):
+                markup = "**" if value == "wj" else "*"
+                closers[end] = (markup, True)
+                span_ends[value] = end
+                out.markup(markup, skip_spaces=True)
+                if star:
+                    out.text("*")
+                continue
+
+        elif value == "bd" and not star and spaced:
+            end = _find(tokens, index + 1, (MARKER, "bd", True))
+            if end is not None and (end > index + 2 or more):
+                closers[end] = ("**", False)
+                tokens[index + 1] = (TEXT, following[1:], False)
+                out.markup("**")
+                continue
+
+        # Selahs get a line of their own.
+        elif value == "qs" and span_ends.get(value, -1) < index:
+            end = _find_last(tokens, index + 1, (MARKER, "qs", True))
+            if end is not None and (star or end > index + 1):
+                if spaced and not star and (end > index + 2 or more):
+                    tokens[index + 1] = (TEXT, following[1:], False)
+                closers[end] = ("*", False)
+                span_ends[value] = end
+                out.markup("\n*")
+                if star:
+                    out.text("*")
+                continue
+
+        # Speakers and psalm descriptions are italic to the end of the line.
+        elif value in ("sp", "d") and not star and value not in headings:
+            if newline and index + 1 < len(tokens):
+                headings.add(value)
+                out.markup("*", skip_spaces=True)
+                continue
+
+        # Section headings are dropped along with their line break.
+        elif value in ("s1", "ms1") and not star:
+            if newline and index + 1 < len(tokens):
+                removing = True
+                continue
+
+        out.gap()
+
+    if removing:
+        if newline and "d" in headings:
+            out.markup("\n")
+        return
+
+    for heading in ("sp", "d"):
+        if heading in headings:
+            out.rstrip()
+            out.markup("*")
+    if newline:
+        out.markup("\n\n" if "d" in headings else "\n")
+    out.skip_spaces = False
 
 
 # Function to convert USFM to Markdown
-def usfm_to_markdown(usfm_text: str):
+def usfm_to_markdown(usfm_text: str, profiler: Profiler = NO_PROFILER):
+    with profiler.time("stages", "tokenize"):
+        raw_lines = _tokenize(usfm_text)
+
+    out = _Writer()
+    if profiler.enabled:
+        # Resolve every line up front so the two steps are timed apart.
+        with profiler.time("stages", "resolve lines"):
+            lines = list(_lines(raw_lines))
+        with profiler.time("stages", "render"):
+            for tokens, newline in lines:
+                _render_line(tokens, newline, out)
+    else:
+        for tokens, newline in _lines(raw_lines):
+            _render_line(tokens, newline, out)
+
+    with profiler.time("stages", "tidy"):
+        # Word tags in runs of text are only unwrapped once the chapter is
+        # done.
+        markdown = _unwrap_words("".join(out.parts))
+        if "(Selah)" in markdown:
+            markdown = markdown.replace("(Selah)", "*(Selah)*")
+        if "‘ " in markdown:
+            markdown = markdown.replace("‘ ", "‘")
+        if out.gaps:
+            markdown = markdown.replace(_GAP, "")
+
+        # Tidy up the whitespace.
+        if "Lord" in markdown:
+            markdown = _LORD_RE.sub(" Lord", markdown)
+        return _SPACES_RE.sub(" ", markdown).strip()
+
+
+# The original regex cascade that usfm_to_markdown replaces. It is kept as the
+# reference the tokenizer is checked against (see tests/test_usfm_to_md.py).
+def usfm_to_markdown_regex(usfm_text: str):
     # Remove weird pluses that some USFM files have.
     usfm_text = re.sub(r"\\\+", r"\\", usfm_text)
 
@@ -69,126 +481,335 @@ def usfm_to_markdown(usfm_text: str):
     return usfm_text.strip()
 
 
-chapters = []
-
-unsorted_book_files = os.listdir("data/bsb_usfm")
-
-# Define the biblical order of the books
-biblical_order = [
-    "GEN",
-    "EXO",
-    "LEV",
-    "NUM",
-    "DEU",
-    "JOS",
-    "JDG",
-    "RUT",
-    "1SA",
-    "2SA",
-    "1KI",
-    "2KI",
-    "1CH",
-    "2CH",
-    "EZR",
-    "NEH",
-    "EST",
-    "JOB",
-    "PSA",
-    "PRO",
-    "ECC",
-    "SNG",
-    "ISA",
-    "JER",
-    "LAM",
-    "EZK",
-    "DAN",
-    "HOS",
-    "JOL",
-    "AMO",
-    "OBA",
-    "JON",
-    "MIC",
-    "NAM",
-    "HAB",
-    "ZEP",
-    "HAG",
-    "ZEC",
-    "MAL",
-    "MAT",
-    "MRK",
-    "LUK",
-    "JHN",
-    "ACT",
-    "ROM",
-    "1CO",
-    "2CO",
-    "GAL",
-    "EPH",
-    "PHP",
-    "COL",
-    "1TH",
-    "2TH",
-    "1TI",
-    "2TI",
-    "TIT",
-    "PHM",
-    "HEB",
-    "JAS",
-    "1PE",
-    "2PE",
-    "1JN",
-    "2JN",
-    "3JN",
-    "JUD",
-    "REV",
-]
+# Bump whenever usfm_to_markdown's output changes so that cached books are
+# converted again.
+CONVERTER_VERSION = 2
+CACHE_DIR = "data/.usfm_cache"
+
+
+def get_book_id(file_name: str):
+    # BSB files are named like 01GENBSB.usfm, WEB and NET files like GEN.usfm.
+    name = file_name.split(".")[0]
+    return name if len(name) == 3 else name[2:5]
 
 
 def sort_books(file_names: List[str]):
     # Create a dictionary that maps book id to its order
     order_map = {book: i for i, book in enumerate(biblical_order)}
 
-    # Extract book IDs from file names
-    book_ids = [name.split(".")[0] for name in file_names]
-
-    # Sort the book IDs based on their order in the Bible, then reconstruct filenames
-    sorted_books = sorted(book_ids, key=lambda book: order_map.get(book, float("inf")))
-    sorted_file_names = [f"{book}.usfm" for book in sorted_books]
-
-    return sorted_file_names
-
-
-# Example usage
-sorted_book_files = sort_books(unsorted_book_files)
-
-# Example usage
-for book_file in sorted_book_files:
-    book_file_path = f"data/bsb_usfm/{book_file}"
-
-    # Read the USFM file
-    with open(book_file_path, "r", encoding="utf-8") as file:
-        usfm_content = file.read()
-
-    book_id = os.path.basename(book_file)[2:5]
-    print(f"Processing {book_id}...")
-
-    chapters_raw = usfm_content.split("\\c ")
-
-    for index, chapter in enumerate(chapters_raw):
-        if index == 0:
+    # Sort the file names based on the order of their books in the Bible
+    return sorted(
+        file_names,
+        key=lambda name: order_map.get(get_book_id(name), float("inf")),
+    )
+
+
+def get_text_offsets(md: str) -> List[int]:
+    """
+    Where each verse starts in a chapter's Markdown, by verse number, then
+    where the Markdown ends, so that verse N (with its "[N]" marker) is
+    md[offsets[N - 1] : offsets[N]] and anything before verse 1 is
+    md[: offsets[0]]. Verses a chapter skips are empty. Offsets count UTF-16
+    code units, like JavaScript string indexes.
+    """
+    starts: Dict[int, int] = {}
+    for match in _VERSE_MARKER_RE.finditer(md):
+        starts.setdefault(int(match.group(1)), match.start())
+
+    offsets = [0] * (max(starts, default=0) + 1)
+    offsets[-1] = len(md)
+    for verse in range(len(offsets) - 1, 0, -1):
+        offsets[verse - 1] = starts.get(verse, offsets[verse])
+
+    # Characters outside the BMP take two UTF-16 code units.
+    if _ASTRAL_RE.search(md):
+        offsets = [
+            offset + len(_ASTRAL_RE.findall(md, 0, offset)) for offset in offsets
+        ]
+    return offsets
+
+
+def get_profile_name(book_file_path: str) -> str:
+    # Books of every translation share ids, so profiles name them after their
+    # directory too, like "bsb_usfm/GEN".
+    return "/".join(
+        [
+            os.path.basename(os.path.dirname(book_file_path)),
+            get_book_id(os.path.basename(book_file_path)),
+        ]
+    )
+
+
+def convert_book(book_file_path: str, profiler: Profiler = NO_PROFILER) -> List[dict]:
+    book_id = get_book_id(os.path.basename(book_file_path))
+    name = get_profile_name(book_file_path) if profiler.enabled else book_id
+    chapters = []
+
+    with profiler.time("books", name, memory=True):
+        # Map the USFM file and find its chapters
+        with profiler.time("io", "read"):
+            book = UsfmBook(book_file_path)
+
+        with book:
+            for chapter_number, chapter in book.iter_chapters():
+                # Convert to Markdown
+                with profiler.time("chapters", f"{name}.{chapter_number}"):
+                    md = usfm_to_markdown(chapter, profiler)
+                    chapters.append(
+                        {
+                            "chapterId": f"{book_id}.{chapter_number}",
+                            "md": md,
+                            "textOffsets": get_text_offsets(md),
+                        }
+                    )
+
+    return chapters
+
+
+def profile_book(book_file_path: str, trace_memory: bool) -> Tuple[List[dict], Records]:
+    # Converts a book in a worker process with a profiler of its own, whose
+    # records are sent back to be merged.
+    profiler = Profiler(trace_memory)
+    try:
+        return convert_book(book_file_path, profiler), profiler.records
+    finally:
+        profiler.stop()
+
+
+def get_cache_source(book_file_path: str) -> str:
+    # The directory a book is in, like "bsb_usfm", which starts the names of
+    # its cache entries.
+    return os.path.basename(os.path.dirname(os.path.abspath(book_file_path)))
+
+
+def get_cache_path(book_file_path: str, cache_dir: str) -> str:
+    # Key the cache on the converter version, the file name (which gives the
+    # chapter ids) and the USFM itself.
+    file_name = os.path.basename(book_file_path)
+    hasher = hashlib.sha256(f"{CONVERTER_VERSION}\n{file_name}\n".encode())
+    with open(book_file_path, "rb") as file:
+        hasher.update(file.read())
+
+    source = get_cache_source(book_file_path)
+    return os.path.join(cache_dir, f"{source}.{file_name}.{hasher.hexdigest()}.json")
+
+
+def prune_cache(cache_dir: str, cache_paths: Iterable[str], sources: Iterable[str]):
+    # Removes the entries of the sources' books that aren't among their
+    # current cache paths, i.e. older versions of a book and books that are
+    # gone, along with entries from before they were named by source.
+    keep = {os.path.basename(cache_path) for cache_path in cache_paths}
+    prefixes = tuple(f"{source}." for source in sources)
+    for file_name in os.listdir(cache_dir):
+        if file_name in keep or not file_name.endswith(".json"):
             continue
-
-        chapter_number = re.search(r"\d+", chapter)
-        if chapter_number:
-            chapter_number = chapter_number.group()
-
-        # Convert to Markdown
-        chapters.append(
-            {
-                "chapterId": f"{book_id}.{chapter_number}",
-                "md": usfm_to_markdown("\\c " + chapter),
+        unnamed = re.fullmatch(r"[0-9a-f]{64}\.json", file_name)
+        if file_name.startswith(prefixes) or unnamed:
+            os.remove(os.path.join(cache_dir, file_name))
+
+
+def load_cached_book(cache_path: str) -> Optional[List[dict]]:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_book(cache_path: str, chapters: List[dict]):
+    # Write to a temporary file first so an interrupted run can't leave a
+    # truncated entry behind.
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(chapters, file)
+    os.replace(temp_path, cache_path)
+
+
+def _convert_books(
+    book_file_paths: List[str], jobs: int, profiler: Profiler = NO_PROFILER
+) -> Iterator[List[dict]]:
+    if jobs <= 1 or len(book_file_paths) <= 1:
+        for book_file_path in book_file_paths:
+            yield convert_book(book_file_path, profiler)
+        return
+
+    if profiler.enabled:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            profiled = {
+                book_file_path: executor.submit(
+                    profile_book, book_file_path, profiler.trace_memory
+                )
+                for book_file_path in sorted(
+                    book_file_paths, key=os.path.getsize, reverse=True
+                )
             }
+            for book_file_path in book_file_paths:
+                chapters, records = profiled.pop(book_file_path).result()
+                profiler.merge(records)
+                yield chapters
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # Start with the biggest books so that Psalms isn't left running alone.
+        futures = {
+            book_file_path: executor.submit(convert_book, book_file_path)
+            for book_file_path in sorted(
+                book_file_paths, key=os.path.getsize, reverse=True
+            )
+        }
+
+        # Drop each book once it's handed over so memory stays flat.
+        for book_file_path in book_file_paths:
+            yield futures.pop(book_file_path).result()
+
+
+def convert_books(
+    book_file_paths: List[str],
+    jobs: int = 1,
+    cache_dir: Optional[str] = None,
+    profiler: Profiler = NO_PROFILER,
+) -> Iterator[List[dict]]:
+    """
+    Yields the converted chapters of each book in the order the books were
+    given, converting them on `jobs` processes. With a `cache_dir`, books
+    whose USFM hasn't changed since they were last converted are loaded from
+    it instead, and the cached books of their directories that aren't among
+    them are removed. Conversions (and the cache) are timed by `profiler`.
+    """
+    cached = {}
+    cache_paths = {}
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        for book_file_path in book_file_paths:
+            cache_path = get_cache_path(book_file_path, cache_dir)
+            cache_paths[book_file_path] = cache_path
+            if os.path.exists(cache_path):
+                cached[book_file_path] = cache_path
+        prune_cache(
+            cache_dir,
+            cache_paths.values(),
+            {get_cache_source(path) for path in book_file_paths},
         )
 
-with open("data/bsb_chapters.json", "w", encoding="utf-8") as file:
-    json.dump(chapters, file)
+    stale = [path for path in book_file_paths if path not in cached]
+    converted = _convert_books(stale, jobs, profiler)
+
+    for book_file_path in book_file_paths:
+        chapters = None
+        if book_file_path in cached:
+            with profiler.time("io", "load cached book"):
+                chapters = load_cached_book(cached[book_file_path])
+
+        if chapters is None:
+            if book_file_path in cached:
+                chapters = convert_book(book_file_path, profiler)
+            else:
+                chapters = next(converted)
+            if cache_dir is not None:
+                with profiler.time("io", "save cached book"):
+                    save_cached_book(cache_paths[book_file_path], chapters)
+
+        yield chapters
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert USFM Bibles to data/<translation>_chapters.json."
+    )
+    parser.add_argument(
+        "translations",
+        nargs="*",
+        help="translations to convert: bsb, web and/or net (default: bsb)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes to convert books on, 0 for one per core",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"reconvert every book instead of reusing {CACHE_DIR}",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="json",
+        help="write a JSON array, one JSON chapter per line or a chapter store",
+    )
+    parser.add_argument(
+        "--by-book",
+        action="store_true",
+        help="write one file per book into data/<translation>_chapters/",
+    )
+    parser.add_argument(
+        "--name",
+        help="write data/<name>_chapters instead, for a single translation",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=REPORT_PATH,
+        metavar="REPORT",
+        help="time every stage, book and chapter into a JSON report "
+        f"(default: {REPORT_PATH}, or set {PROFILE_ENV})",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="also trace each book's peak memory, which slows everything down "
+        f"(or set {PROFILE_MEMORY_ENV})",
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="slowest entries to print when profiling"
+    )
+    args = parser.parse_args()
+    translations = args.translations or ["bsb"]
+    if args.name is not None and len(translations) != 1:
+        parser.error("--name needs exactly one translation")
+    for translation in translations:
+        if not os.path.isdir(f"data/{translation}_usfm"):
+            parser.error(f"no USFM source found for {translation!r}")
+    jobs = args.jobs or os.cpu_count() or 1
+    report_path = get_report_path(args.profile)
+    profiler = get_profiler(report_path, args.profile_memory)
+
+    book_file_paths = [
+        (translation, f"data/{translation}_usfm/{book_file}")
+        for translation in translations
+        for book_file in sort_books(os.listdir(f"data/{translation}_usfm"))
+    ]
+
+    converted = zip(
+        book_file_paths,
+        convert_books(
+            [path for _, path in book_file_paths],
+            jobs,
+            None if args.no_cache else CACHE_DIR,
+            profiler,
+        ),
+    )
+    # Books come back grouped by translation, so each translation's chapters
+    # can be written out as soon as they are converted.
+    for translation, books in groupby(converted, key=lambda book: book[0][0]):
+        output_path = get_output_path(
+            args.name or translation, args.format, args.by_book
+        )
+        with ChapterWriter(output_path, args.format, args.by_book) as writer:
+            for (_, book_file_path), book_chapters in books:
+                book_id = get_book_id(os.path.basename(book_file_path))
+                print(f"Processed {translation.upper()} {book_id}...")
+                with profiler.time("io", "write"):
+                    for chapter in book_chapters:
+                        writer.write(chapter)
+
+    if report_path is not None:
+        profiler.write(report_path)
+        print(profiler.summary(args.top))
+        print(f"Wrote profile to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
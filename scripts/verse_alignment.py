@@ -0,0 +1,319 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from search_index import read_chapters, split_verses, tokenize
+from verse_ids import (
+    BOOK_SHIFT,
+    CHAPTER_SHIFT,
+    NUMBER_MASK,
+    biblical_order,
+    format_verse_id,
+    parse_verse_id,
+    read_uint32s,
+)
+
+# data/alignment.bin maps each translation's verses to the verses with the
+# same text in the other translations, as packed verse ids (see verse_ids.py)
+# in little-endian uint32 tables:
+#
+#   HEADER
+#   one NAME per translation
+#   then for each translation, in the same order:
+#     starts: the first row of every chapter slot (book ordinal << 8 |
+#       chapter), plus the total at the end
+#     one column per translation, in the same order, with that translation's
+#       verse for each row, or 0 where it has none
+#
+# Every chapter gets a row for each verse number up to its last verse, so a
+# verse's row is its chapter's start plus its number minus one and looking up
+# a counterpart never has to search. A translation's own column is 0 for
+# verse numbers it skips.
+MAGIC = b"TOVALGN1"
+HEADER = struct.Struct("<8sI")  # magic, translation count
+NAME = struct.Struct("<8sI")  # translation, row count
+CHAPTER_SLOTS = (len(biblical_order) + 1) << (BOOK_SHIFT - CHAPTER_SHIFT)
+
+ALIGNMENT_PATH = "data/alignment.bin"
+TRANSLATIONS = ["bsb", "web", "net"]
+
+# How alike two verses' words have to be for a verse left over in one
+# translation to match one left over in another, and how much of a verse has
+# to show up in a neighbour for it to count as merged into that neighbour.
+MIN_SIMILARITY = 0.4
+MIN_CONTAINMENT = 0.8
+
+Verses = Dict[int, List[str]]
+
+
+def read_verses(chapters: Iterable[dict]) -> Verses:
+    # The words of every verse by packed id, in reading order. A verse marker
+    # with no words after it isn't a verse, and neither is a verse 0.
+    verses: Verses = {}
+    for chapter in chapters:
+        for verse, text in split_verses(chapter):
+            words = tokenize(text)
+            if words and verse & NUMBER_MASK:
+                verses.setdefault(verse, []).extend(words)
+    return verses
+
+
+def _similarity(words: Set[str], other: Set[str]) -> float:
+    return len(words & other) / len(words | other)
+
+
+def _containment(words: List[str], other: List[str]) -> float:
+    # Counts repeated words as many times as they're repeated, so that short
+    # verses aren't found in every longer one.
+    return sum((Counter(words) & Counter(other)).values()) / len(words)
+
+
+def align(source: Verses, target: Verses) -> Dict[int, int]:
+    """
+    Maps each verse of `source` to its counterpart in `target`, leaving out
+    verses that have none. Verses with the same id in both are counterparts.
+    The rest are matched by the words they share: first with the verses
+    `target` has left over in the same book, which catches passages numbered
+    differently, and then with the counterparts of the verses around them in
+    the same chapter, which catches verses merged into a neighbour.
+    """
+    counterparts = {verse: verse for verse in source if verse in target}
+    matched = set(counterparts)
+    left_over: Dict[int, List[int]] = {}
+    for verse in target:
+        if verse not in source:
+            left_over.setdefault(verse >> BOOK_SHIFT, []).append(verse)
+
+    unmatched = [verse for verse in source if verse not in counterparts]
+    words = {verse: set(source[verse]) for verse in unmatched}
+
+    candidates = []
+    for verse in unmatched:
+        for other in left_over.get(verse >> BOOK_SHIFT, []):
+            similarity = _similarity(words[verse], set(target[other]))
+            if similarity >= MIN_SIMILARITY:
+                candidates.append((similarity, verse, other))
+    # The best matches go first, and ties in reading order.
+    for _, verse, other in sorted(candidates, key=lambda candidate: -candidate[0]):
+        if verse not in counterparts and other not in matched:
+            counterparts[verse] = other
+            matched.add(other)
+
+    order = list(source)
+    positions = {verse: position for position, verse in enumerate(order)}
+    for verse in unmatched:
+        if verse in counterparts:
+            continue
+        position = positions[verse]
+        neighbours = []
+        for step in (-1, 1):
+            index = position + step
+            while 0 <= index < len(order) and order[index] not in counterparts:
+                index += step
+            if 0 <= index < len(order) and order[index] >> CHAPTER_SHIFT == (
+                verse >> CHAPTER_SHIFT
+            ):
+                neighbours.append(counterparts[order[index]])
+
+        scores = [
+            (_containment(source[verse], target[other]), other) for other in neighbours
+        ]
+        if scores and max(scores)[0] >= MIN_CONTAINMENT:
+            counterparts[verse] = max(scores)[1]
+
+    return counterparts
+
+
+def get_starts(verses: Iterable[int]) -> array:
+    # The first row of every chapter slot, plus the total at the end.
+    last_verses = array("I", bytes(4 * CHAPTER_SLOTS))
+    for verse in verses:
+        slot = verse >> CHAPTER_SHIFT
+        last_verses[slot] = max(last_verses[slot], verse & NUMBER_MASK)
+
+    starts = array("I", [0])
+    for last_verse in last_verses:
+        starts.append(starts[-1] + last_verse)
+    return starts
+
+
+def compile_alignment(translations: Dict[str, Verses], path: str):
+    names = list(translations)
+    tables = []
+    counts = []
+    for name in names:
+        verses = translations[name]
+        starts = get_starts(verses)
+        rows = starts[-1]
+        counts.append(rows)
+        tables.append(starts)
+
+        for other in names:
+            counterparts = (
+                {verse: verse for verse in verses}
+                if other == name
+                else align(verses, translations[other])
+            )
+            column = array("I", bytes(4 * rows))
+            for verse, counterpart in counterparts.items():
+                row = starts[verse >> CHAPTER_SHIFT] + (verse & NUMBER_MASK) - 1
+                column[row] = counterpart
+            tables.append(column)
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(names)))
+        for name, count in zip(names, counts):
+            file.write(NAME.pack(name.encode("ascii"), count))
+        for table in tables:
+            if sys.byteorder == "big":
+                table.byteswap()
+            table.tofile(file)
+    os.replace(temp_path, path)
+
+
+class VerseAlignment:
+    """
+    Looks up a verse's counterparts in other translations in a compiled
+    alignment.bin, straight from a memory map of the file.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, translation_count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a compiled verse alignment")
+
+        self.translations: List[str] = []
+        counts = []
+        offset = HEADER.size
+        for _ in range(translation_count):
+            name, count = NAME.unpack_from(self.map, offset)
+            self.translations.append(name.rstrip(b"\0").decode("ascii"))
+            counts.append(count)
+            offset += NAME.size
+        self.numbers = {name: i for i, name in enumerate(self.translations)}
+
+        self.view = memoryview(self.map)
+        self.starts = []
+        self.columns = []
+        for count in counts:
+            self.starts.append(read_uint32s(self.view, offset, CHAPTER_SLOTS + 1))
+            offset += (CHAPTER_SLOTS + 1) * 4
+            columns = []
+            for _ in range(translation_count):
+                columns.append(read_uint32s(self.view, offset, count))
+                offset += count * 4
+            self.columns.append(columns)
+
+    def _number(self, translation: str) -> int:
+        number = self.numbers.get(translation)
+        if number is None:
+            raise ValueError(f"{translation!r} isn't in the alignment")
+        return number
+
+    def _row(self, number: int, verse: int) -> Optional[int]:
+        slot = verse >> CHAPTER_SHIFT
+        verse_number = verse & NUMBER_MASK
+        if slot >= CHAPTER_SLOTS or not verse_number:
+            return None
+        starts = self.starts[number]
+        row = starts[slot] + verse_number - 1
+        return row if row < starts[slot + 1] else None
+
+    def lookup(self, source: str, target: str, verse: int) -> int:
+        """
+        Returns the packed id of the verse in `target` that matches a packed
+        verse of `source`, or 0 if it has none.
+        """
+        number = self._number(source)
+        column = self.columns[number][self._number(target)]
+        row = self._row(number, verse)
+        return 0 if row is None else column[row]
+
+    def counterparts(self, source: str, verse: int) -> Dict[str, int]:
+        # The verse in every translation, including `source` itself.
+        number = self._number(source)
+        row = self._row(number, verse)
+        return {
+            translation: 0 if row is None else column[row]
+            for translation, column in zip(self.translations, self.columns[number])
+        }
+
+    def close(self):
+        for table in self.starts:
+            table.release()
+        for columns in self.columns:
+            for column in columns:
+                column.release()
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self) -> "VerseAlignment":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build data/alignment.bin from each translation's chapters."
+    )
+    parser.add_argument(
+        "translations",
+        nargs="*",
+        default=TRANSLATIONS,
+        help="translations to align (default: bsb, web and net)",
+    )
+    parser.add_argument(
+        "--chapters",
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("TRANSLATION", "PATH"),
+        help="read a translation's chapters from PATH instead of "
+        "data/<translation>_chapters.json",
+    )
+    parser.add_argument(
+        "--lookup",
+        nargs=2,
+        metavar=("TRANSLATION", "VERSE"),
+        help="print a verse like GEN.1.1 in every translation instead",
+    )
+    args = parser.parse_args()
+
+    if args.lookup is not None:
+        translation, verse_id = args.lookup
+        with VerseAlignment(ALIGNMENT_PATH) as alignment:
+            counterparts = alignment.counterparts(translation, parse_verse_id(verse_id))
+        for name, verse in counterparts.items():
+            print(name, format_verse_id(verse) if verse else "-")
+        return
+
+    chapters_paths = dict(args.chapters)
+    compile_alignment(
+        {
+            translation: read_verses(
+                read_chapters(
+                    chapters_paths.get(
+                        translation, f"data/{translation}_chapters.json"
+                    )
+                )
+            )
+            for translation in args.translations
+        },
+        ALIGNMENT_PATH,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import json
+import sys
+from array import array
+from typing import Tuple
+
+# Define the biblical order of the books
+biblical_order = [
+    "GEN",
+    "EXO",
+    "LEV",
+    "NUM",
+    "DEU",
+    "JOS",
+    "JDG",
+    "RUT",
+    "1SA",
+    "2SA",
+    "1KI",
+    "2KI",
+    "1CH",
+    "2CH",
+    "EZR",
+    "NEH",
+    "EST",
+    "JOB",
+    "PSA",
+    "PRO",
+    "ECC",
+    "SNG",
+    "ISA",
+    "JER",
+    "LAM",
+    "EZK",
+    "DAN",
+    "HOS",
+    "JOL",
+    "AMO",
+    "OBA",
+    "JON",
+    "MIC",
+    "NAM",
+    "HAB",
+    "ZEP",
+    "HAG",
+    "ZEC",
+    "MAL",
+    "MAT",
+    "MRK",
+    "LUK",
+    "JHN",
+    "ACT",
+    "ROM",
+    "1CO",
+    "2CO",
+    "GAL",
+    "EPH",
+    "PHP",
+    "COL",
+    "1TH",
+    "2TH",
+    "1TI",
+    "2TI",
+    "TIT",
+    "PHM",
+    "HEB",
+    "JAS",
+    "1PE",
+    "2PE",
+    "1JN",
+    "2JN",
+    "3JN",
+    "JUD",
+    "REV",
+]
+
+# Verses are packed into one integer as (book ordinal << 16) | (chapter << 8)
+# | verse, where Genesis is book 1. Packed ids sort in biblical order.
+BOOK_SHIFT = 16
+CHAPTER_SHIFT = 8
+NUMBER_MASK = 0xFF
+
+book_ordinals = {book: i + 1 for i, book in enumerate(biblical_order)}
+
+
+def pack_verse(book_id: str, chapter: int, verse: int) -> int:
+    if not 0 <= chapter <= NUMBER_MASK or not 0 <= verse <= NUMBER_MASK:
+        raise ValueError(f"Can't pack {book_id}.{chapter}.{verse}")
+    return (book_ordinals[book_id] << BOOK_SHIFT) | (chapter << CHAPTER_SHIFT) | verse
+
+
+def unpack_verse(packed: int) -> Tuple[str, int, int]:
+    return (
+        biblical_order[(packed >> BOOK_SHIFT) - 1],
+        (packed >> CHAPTER_SHIFT) & NUMBER_MASK,
+        packed & NUMBER_MASK,
+    )
+
+
+def parse_verse_id(verse_id: str) -> int:
+    # Packs a verse id like "GEN.1.1".
+    book_id, chapter, verse = verse_id.split(".")
+    return pack_verse(book_id, int(chapter), int(verse))
+
+
+def format_verse_id(packed: int) -> str:
+    return "{}.{}.{}".format(*unpack_verse(packed))
+
+
+def load_verses(chapter_lengths_path: str = "data/chapterLengths.json") -> array:
+    # Every verse of the Bible as packed ids, in order.
+    with open(chapter_lengths_path, "r", encoding="utf-8") as file:
+        chapter_lengths = json.load(file)
+
+    verses = array("I")
+    for book in chapter_lengths:
+        for chapter in book["chapters"]:
+            first = pack_verse(book["abbr"], int(chapter["chapter"]), 1)
+            verses.extend(range(first, first + int(chapter["verses"])))
+
+    return verses
+
+
+def read_uint32s(view: memoryview, offset: int, count: int) -> memoryview:
+    # A little-endian uint32 column of a compiled file. It's read in place on
+    # little-endian machines and from a swapped copy on big-endian ones.
+    column = view[offset : offset + count * 4]
+    if sys.byteorder == "little":
+        return column.cast("I")
+    swapped = array("I")
+    swapped.frombytes(column)
+    column.release()
+    swapped.byteswap()
+    return memoryview(swapped)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The data scripts are run as plain files, so make them importable as modules.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
@@ -0,0 +1,96 @@
+import json
+
+from bench_pipeline import (
+    bench_emit,
+    chapter_to_xhtml,
+    compare,
+    measure,
+    write_cross_references,
+)
+from parse_cross_references import read_cross_references
+from verse_ids import parse_verse_id
+
+
+def result(items_per_second, peak_memory=1000):
+    return {"items_per_second": items_per_second, "peak_memory": peak_memory}
+
+
+def test_measure_keeps_fastest_run():
+    runs = iter([3.0, 1.0, 2.0, 5.0])
+
+    def benchmark():
+        return {"seconds": next(runs), "items": 10, "bytes": 2_000_000}
+
+    measured = measure(benchmark, repeat=3)
+    assert measured["seconds"] == 1.0
+    assert measured["items_per_second"] == 10
+    assert measured["mb_per_second"] == 2
+    assert measured["peak_memory"] >= 0
+
+
+def test_compare():
+    baseline = {
+        "same": result(100),
+        "slower": result(100),
+        "hungrier": result(100, 1000),
+        "removed": result(100),
+    }
+    results = {
+        "same": result(95),
+        "slower": result(80),
+        "hungrier": result(100, 1200),
+        "new": result(1),
+    }
+    assert compare(results, baseline, 0.1) == [
+        "slower: 25% slower",
+        "hungrier: 20% more peak memory",
+    ]
+    assert compare(results, baseline, 0.5) == []
+
+
+def test_write_cross_references(tmp_path):
+    chapter_lengths_path = tmp_path / "chapterLengths.json"
+    chapter_lengths_path.write_text(
+        json.dumps(
+            [
+                {"abbr": "GEN", "chapters": [{"chapter": "1", "verses": "31"}]},
+                {"abbr": "1SA", "chapters": [{"chapter": "3", "verses": "21"}]},
+            ]
+        )
+    )
+    path = str(tmp_path / "cross_references.txt")
+    write_cross_references(path, str(chapter_lengths_path))
+
+    references = list(read_cross_references(path))
+    assert references
+    verses = {verse for verse, _, _ in references}
+    assert verses <= {parse_verse_id(f"GEN.1.{v}") for v in range(1, 32)} | {
+        parse_verse_id(f"1SA.3.{v}") for v in range(1, 22)
+    }
+    assert any(end for _, _, end in references)
+
+    # The same seed makes the same file.
+    again = str(tmp_path / "again.txt")
+    write_cross_references(again, str(chapter_lengths_path))
+    assert list(read_cross_references(again)) == references
+
+
+def test_chapter_to_xhtml():
+    xhtml = chapter_to_xhtml(
+        {"chapterId": "GEN.2", "md": "[1] Thus the heavens & earth\n\n[2] By day"},
+        "Genesis",
+    )
+    assert "<h1>Genesis Chapter 2</h1>" in xhtml
+    assert (
+        '<p class="bodytext"><span class="verse">GEN 2:1</span> '
+        "Thus the heavens &amp; earth</p>"
+    ) in xhtml
+    assert '<span class="verse">GEN 2:2</span> By day' in xhtml
+
+
+def test_bench_emit(tmp_path):
+    chapters = [{"chapterId": "GEN.1", "md": "[1] In the beginning"}]
+    run = bench_emit(chapters, "json", str(tmp_path))()
+    assert run["items"] == 1
+    assert run["bytes"] == len(json.dumps(chapters))
+    assert json.loads((tmp_path / "chapters.json").read_text()) == chapters
@@ -0,0 +1,144 @@
+import os
+
+import pytest
+
+from build import (
+    BUILT,
+    FAILED,
+    FRESH,
+    MISSING,
+    SKIPPED,
+    Builder,
+    Target,
+    get_dependencies,
+    get_local_imports,
+    get_targets,
+    select_targets,
+)
+
+COPY = """import sys
+
+from helper import shout
+
+with open(sys.argv[1]) as source, open(sys.argv[2], "w") as out:
+    out.write(shout(source.read()))
+"""
+HELPER = """def shout(text):
+    return text.upper()
+"""
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "scripts").mkdir()
+    (tmp_path / "data").mkdir()
+    (tmp_path / "scripts" / "copy.py").write_text(COPY)
+    (tmp_path / "scripts" / "helper.py").write_text(HELPER)
+    (tmp_path / "scripts" / "fail.py").write_text("raise SystemExit(3)")
+    (tmp_path / "data" / "source.txt").write_text("in the beginning")
+    return tmp_path
+
+
+def copy(name, source, out, default=True):
+    return Target(name, "scripts/copy.py", [source, out], [source], [out], default)
+
+
+TARGETS = [
+    copy("first", "data/source.txt", "data/first.txt"),
+    copy("second", "data/first.txt", "data/second.txt"),
+    copy("other", "data/source.txt", "data/other.txt", default=False),
+]
+
+
+def test_local_imports(root):
+    assert get_local_imports("scripts/copy.py", str(root)) == [
+        "scripts/copy.py",
+        "scripts/helper.py",
+    ]
+
+
+def test_dependencies():
+    dependencies = get_dependencies(TARGETS)
+    assert dependencies == {"first": set(), "second": {"first"}, "other": set()}
+
+    assert select_targets(TARGETS, [], dependencies) == TARGETS[:2]
+    assert select_targets(TARGETS, ["second"], dependencies) == TARGETS[:2]
+    assert select_targets(TARGETS, ["other"], dependencies) == TARGETS[2:]
+    with pytest.raises(ValueError):
+        select_targets(TARGETS, ["third"], dependencies)
+
+    with pytest.raises(ValueError):
+        get_dependencies(TARGETS + [copy("again", "data/other.txt", "data/first.txt")])
+
+    cycle = [
+        copy("a", "data/b.txt", "data/a.txt"),
+        copy("b", "data/a.txt", "data/b.txt"),
+    ]
+    with pytest.raises(ValueError):
+        select_targets(cycle, [], get_dependencies(cycle))
+
+
+def test_repo_targets():
+    targets = get_targets("net.epub")
+    dependencies = get_dependencies(targets)
+    assert dependencies["search:bsb"] == {"chapters:bsb"}
+    assert not dependencies["references"]
+    assert [target.name for target in targets if not target.default] == [
+        "chapters:net-epub",
+        "audio",
+    ]
+    # The tracked NET chapters come from the EPUB, and the builder already
+    # runs a target per core.
+    outputs = [output for target in targets for output in target.outputs]
+    assert "data/net_chapters.json" not in outputs
+    assert dependencies["search:net"] == {"chapters:net"}
+    for target in targets:
+        if target.script == "scripts/usfm_to_md.py":
+            assert target.args[target.args.index("--jobs") + 1] == "1"
+
+
+def test_rebuilds_only_stale_targets(root):
+    def build():
+        return Builder(TARGETS, str(root), jobs=2).build()
+
+    assert Builder(TARGETS, str(root)).plan() == {"first": BUILT, "second": BUILT}
+    assert build() == {"first": BUILT, "second": BUILT}
+    assert (root / "data" / "second.txt").read_text() == "IN THE BEGINNING"
+    assert build() == {"first": FRESH, "second": FRESH}
+    assert Builder(TARGETS, str(root)).plan() == {"first": FRESH, "second": FRESH}
+
+    # Touching a file doesn't change what's in it.
+    source = root / "data" / "source.txt"
+    os.utime(source, ns=(0, 0))
+    assert build() == {"first": FRESH, "second": FRESH}
+
+    source.write_text("and the earth")
+    assert build() == {"first": BUILT, "second": BUILT}
+    assert (root / "data" / "second.txt").read_text() == "AND THE EARTH"
+
+    # So do changes to the scripts, and outputs that were changed by hand.
+    (root / "data" / "second.txt").write_text("edited")
+    assert build() == {"first": FRESH, "second": BUILT}
+    (root / "scripts" / "helper.py").write_text(HELPER.replace("upper", "lower"))
+    assert build() == {"first": BUILT, "second": BUILT}
+    assert (root / "data" / "second.txt").read_text() == "and the earth"
+
+    assert Builder(TARGETS, str(root), force=True).build(["first"]) == {"first": BUILT}
+
+
+def test_failures_skip_dependents(root):
+    targets = [
+        Target("first", "scripts/fail.py", [], [], ["data/first.txt"]),
+        copy("second", "data/first.txt", "data/second.txt"),
+        copy("other", "data/missing.txt", "data/other.txt"),
+    ]
+    assert Builder(targets, str(root)).build() == {
+        "first": FAILED,
+        "second": SKIPPED,
+        "other": MISSING,
+    }
+    assert Builder(targets, str(root)).plan() == {
+        "first": BUILT,
+        "second": BUILT,
+        "other": MISSING,
+    }
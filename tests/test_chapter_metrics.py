@@ -0,0 +1,64 @@
+from chapter_metrics import (
+    ChapterMetrics,
+    compile_metrics,
+    get_chapter_metrics,
+    get_reading_seconds,
+)
+from usfm_to_md import get_text_offsets
+from verse_ids import parse_verse_id
+
+PSALM = (
+    "## The Lord Is My Shepherd\n\n"
+    "[1] The Lord is my shepherd;\n"
+    "    I shall not want.\n"
+    "[2] He makes me lie down in green pastures;\n\n"
+    "[3] He restores my soul.\n"
+)
+
+CHAPTERS = [
+    {"chapterId": "JHN.11", "md": "[35] Jesus wept. [36] So the Jews said."},
+    {"chapterId": "PSA.23", "md": PSALM, "textOffsets": get_text_offsets(PSALM)},
+]
+
+
+def test_get_chapter_metrics():
+    chapter, verses = get_chapter_metrics(CHAPTERS[1])
+    chapter_id, characters, words, paragraphs, lines = chapter
+    assert chapter_id == parse_verse_id("PSA.23.0")
+    assert characters == len(PSALM)
+    assert (paragraphs, lines) == (3, 5)
+    assert words == 5 + 9 + 8 + 4
+
+    assert [verse for verse, *_ in verses] == [
+        parse_verse_id(f"PSA.23.{number}") for number in (1, 2, 3)
+    ]
+    assert [words for _, _, _, words, _ in verses] == [9, 8, 4]
+    assert [word_offset for *_, word_offset in verses] == [0, 9, 17]
+    offsets = get_text_offsets(PSALM)
+    for number, (_, start, length, _, _) in enumerate(verses, 1):
+        assert (start, start + length) == (offsets[number - 1], offsets[number])
+
+
+def test_compile_metrics(tmp_path):
+    path = str(tmp_path / "metrics.bin")
+    compile_metrics(CHAPTERS, path)
+
+    with ChapterMetrics(path) as metrics:
+        assert (metrics.chapter_count, metrics.verse_count) == (2, 5)
+
+        psalm = metrics.chapter("PSA.23")
+        assert psalm["first_verse"] == 0
+        assert psalm["verses"] == 3
+        assert psalm["characters"] == len(PSALM)
+        assert psalm["reading_seconds"] == get_reading_seconds(psalm["words"])
+
+        john = metrics.chapter("JHN.11")
+        assert (john["first_verse"], john["verses"], john["words"]) == (3, 2, 6)
+
+        verse = metrics.verse("JHN.11.36")
+        assert verse["id"] == parse_verse_id("JHN.11.36")
+        assert (verse["words"], verse["word_offset"]) == (4, 2)
+
+        assert metrics.chapter("JHN.12") is None
+        assert metrics.verse("PSA.23.4") is None
+        assert metrics.verse("Hezekiah.1.1") is None
@@ -0,0 +1,63 @@
+import pytest
+
+from chapter_store import ChapterStore
+from chapter_writer import ChapterWriter
+from usfm_to_md import get_text_offsets
+
+CHAPTERS = [
+    {"chapterId": "RUT.1", "md": "[1] In the days “when” the judges ruled"},
+    {"chapterId": "RUT.2", "md": "[1] Now Naomi had a relative"},
+    {"chapterId": "RUT.10", "md": ""},
+    {"chapterId": "JON.1", "md": "[1] Now the LORD’s word came to Jonah"},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "chapters.bin")
+    with ChapterWriter(path, format="bin") as writer:
+        for chapter in CHAPTERS:
+            writer.write(chapter)
+
+    with ChapterStore(path) as store:
+        yield store
+
+
+def test_reads_every_chapter(store):
+    assert len(store) == len(CHAPTERS)
+    assert list(store) == [chapter["chapterId"] for chapter in CHAPTERS]
+    for chapter in CHAPTERS:
+        assert store[chapter["chapterId"]] == chapter["md"]
+
+
+@pytest.mark.parametrize("chapter_id", ["RUT.3", "GEN.1", "JON", "JON.x", ""])
+def test_missing_chapters(store, chapter_id):
+    assert chapter_id not in store
+    assert store.get(chapter_id) is None
+    with pytest.raises(KeyError):
+        store[chapter_id]
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "chapters.json"
+    path.write_text('[{"chapterId": "RUT.1", "md": ""}]', encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        ChapterStore(str(path))
+
+
+def test_round_trips_text_offsets(tmp_path):
+    md = "# Ruth 1\n\n[1] In the days “when” the judges ruled, [2] a famine"
+    chapters = [
+        {"chapterId": "RUT.1", "md": md, "textOffsets": get_text_offsets(md)},
+        CHAPTERS[1],
+    ]
+    path = str(tmp_path / "chapters.bin")
+    with ChapterWriter(path, format="bin") as writer:
+        for chapter in chapters:
+            writer.write(chapter)
+
+    with ChapterStore(path) as store:
+        assert [store.get_chapter(chapter_id) for chapter_id in store] == chapters
+        assert store.get_text_offsets("RUT.2") is None
+        assert store.get_chapter("RUT.3") is None
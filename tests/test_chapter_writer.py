@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+from chapter_writer import ChapterWriter
+
+CHAPTERS = [
+    {"chapterId": "RUT.1", "md": "[1] In the days “when” the judges ruled"},
+    {"chapterId": "RUT.2", "md": "[1] Now Naomi had a relative"},
+    {"chapterId": "JON.1", "md": "[1] Now the LORD’s word came to Jonah"},
+]
+
+
+def write(path: str, chapters, **options):
+    with ChapterWriter(path, **options) as writer:
+        for chapter in chapters:
+            writer.write(chapter)
+
+
+@pytest.mark.parametrize("chapters", [CHAPTERS, CHAPTERS[:1], []])
+def test_json_matches_json_dump(tmp_path, chapters):
+    path = str(tmp_path / "chapters.json")
+    write(path, chapters)
+
+    with open(path, "r", encoding="utf-8") as file:
+        assert file.read() == json.dumps(chapters)
+
+
+def test_ndjson(tmp_path):
+    path = str(tmp_path / "chapters.ndjson")
+    write(path, CHAPTERS, format="ndjson")
+
+    with open(path, "r", encoding="utf-8") as file:
+        assert [json.loads(line) for line in file] == CHAPTERS
+
+
+def test_by_book(tmp_path):
+    path = str(tmp_path / "chapters")
+    write(path, CHAPTERS, by_book=True)
+
+    assert sorted(os.listdir(path)) == ["JON.json", "RUT.json"]
+    with open(os.path.join(path, "RUT.json"), "r", encoding="utf-8") as file:
+        assert json.load(file) == CHAPTERS[:2]
+
+
+def test_error_keeps_previous_output(tmp_path):
+    path = str(tmp_path / "chapters.json")
+    write(path, CHAPTERS)
+
+    def failing_chapters():
+        yield CHAPTERS[0]
+        raise RuntimeError("conversion failed")
+
+    with pytest.raises(RuntimeError):
+        write(path, failing_chapters())
+
+    assert os.listdir(tmp_path) == ["chapters.json"]
+    with open(path, "r", encoding="utf-8") as file:
+        assert json.load(file) == CHAPTERS
+
+
+def test_by_book_rejects_split_books(tmp_path):
+    with pytest.raises(ValueError):
+        write(str(tmp_path), CHAPTERS + [{"chapterId": "RUT.3"}], by_book=True)
@@ -0,0 +1,56 @@
+from concordance import Concordance, build_concordance, extract_words
+from verse_ids import parse_verse_id
+
+USFM = (
+    "\\id GEN\n"
+    "\\c 1  \n"
+    "\\s1 The Creation \\w God|strong=\"H9999\"\\w*\n"
+    "\\p\n"
+    "\\v 1 \\w In|strong=\"H7225\"\\w* \\w the|strong=\"H7225\"\\w* "
+    "\\w beginning|strong=\"H7225\"\\w*, \\w God|strong=\"H0430\"\\w*\\f + \\fr 1:1  "
+    "\\ft The Hebrew word rendered “God” is \\w Elohim|strong=\"H9999\"\\w*.\\f* "
+    "\\w created|strong=\"H1254\"\\w* the heavens.\n"
+    "\\s1 The \\w Earth|strong=\"H9999\"\\w*\n"
+    "\\v 2 The \\+w earth|strong=\"H0776\"\\+w* \\w was|strong=\"H1961,H1961\"\\w* "
+    "formless.\n"
+)
+
+
+def test_extract_words():
+    assert list(extract_words("GEN", USFM)) == [
+        ("H7225", parse_verse_id("GEN.1.1"), 0),
+        ("H7225", parse_verse_id("GEN.1.1"), 1),
+        ("H7225", parse_verse_id("GEN.1.1"), 2),
+        ("H0430", parse_verse_id("GEN.1.1"), 3),
+        ("H1254", parse_verse_id("GEN.1.1"), 4),
+        ("H0776", parse_verse_id("GEN.1.2"), 1),
+        ("H1961", parse_verse_id("GEN.1.2"), 2),
+        ("H1961", parse_verse_id("GEN.1.2"), 2),
+    ]
+
+
+def test_concordance(tmp_path):
+    book_file_path = tmp_path / "GEN.usfm"
+    book_file_path.write_text(USFM, encoding="utf-8")
+    path = str(tmp_path / "concordance.bin")
+    build_concordance([str(book_file_path)], path)
+
+    with Concordance(path) as concordance:
+        assert concordance.terms == ["H0430", "H0776", "H1254", "H1961", "H7225"]
+        assert concordance.verses("H7225") == [parse_verse_id("GEN.1.1")]
+        assert concordance.occurrences("H7225") == {
+            parse_verse_id("GEN.1.1"): [0, 1, 2]
+        }
+        assert concordance.occurrences("H1961") == {parse_verse_id("GEN.1.2"): [2]}
+        assert concordance.verses("H9999") == []
+
+        # Queries keep Strong's numbers as they are.
+        assert concordance.search("H7225") == [parse_verse_id("GEN.1.1")]
+        assert concordance.search("H7225 H0776") == []
+        assert concordance.search("H1254 H7225") == [parse_verse_id("GEN.1.1")]
+        assert concordance.search("H0*") == [
+            parse_verse_id("GEN.1.1"),
+            parse_verse_id("GEN.1.2"),
+        ]
+        assert concordance.search('"H0430 H1254"') == [parse_verse_id("GEN.1.1")]
+        assert concordance.term("h7225") == []
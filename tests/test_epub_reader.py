@@ -0,0 +1,65 @@
+import zipfile
+
+import pytest
+
+from epub_reader import iter_chapters
+
+CONTAINER = """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf"
+      media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>"""
+
+PACKAGE = """<?xml version="1.0"?>
+<package version="2.0" xmlns="http://www.idpf.org/2007/opf">
+  <manifest>
+    <item id="cover" href="images/cover.jpg" media-type="image/jpeg"/>
+    <item id="gen2" href="Text/Genesis%202.xhtml"
+      media-type="application/xhtml+xml"/>
+    <item id="gen1" href="Text/gen1.xhtml" media-type="application/xhtml+xml"/>
+    <item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>
+  </manifest>
+  <spine toc="ncx">
+    <itemref idref="gen1"/>
+    <itemref idref="cover"/>
+    <itemref idref="gen2"/>
+  </spine>
+</package>"""
+
+
+@pytest.fixture
+def epub_path(tmp_path):
+    path = str(tmp_path / "book.epub")
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("mimetype", "application/epub+zip")
+        archive.writestr("META-INF/container.xml", CONTAINER)
+        archive.writestr("OEBPS/content.opf", PACKAGE)
+        archive.writestr("OEBPS/images/cover.jpg", b"\xff\xd8" * 1000)
+        archive.writestr("OEBPS/Text/gen1.xhtml", "<h1>Genesis Chapter 1</h1>")
+        archive.writestr("OEBPS/Text/Genesis 2.xhtml", "<h1>Genesis Chapter 2</h1>")
+    return path
+
+
+def test_yields_chapters_in_spine_order(epub_path):
+    items = list(iter_chapters(epub_path))
+    assert [item.file_name for item in items] == [
+        "OEBPS/Text/gen1.xhtml",
+        "OEBPS/Text/Genesis 2.xhtml",
+    ]
+
+
+def test_reads_content_on_demand(epub_path):
+    chapters = iter_chapters(epub_path)
+    first = next(chapters)
+    assert first.get_content() == b"<h1>Genesis Chapter 1</h1>"
+    assert next(chapters).get_content() == b"<h1>Genesis Chapter 2</h1>"
+    with pytest.raises(StopIteration):
+        next(chapters)
+
+
+def test_reads_content_after_iterating(epub_path):
+    items = list(iter_chapters(epub_path))
+    assert items[0].get_content() == b"<h1>Genesis Chapter 1</h1>"
+    assert items[1].get_content() == b"<h1>Genesis Chapter 2</h1>"
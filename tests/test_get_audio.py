@@ -0,0 +1,219 @@
+import hashlib
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from get_audio import Manifest, get_chapters, save_failed, with_retries
+
+AUDIO = b"ID3" + bytes(range(256)) * 100
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Chapter ids mapped to how many more times their audio should fail.
+    flaky = {}
+    requests = []
+    audio_bytes_sent = 0
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        self.requests.append(self.path)
+        status = 200
+        headers = {}
+
+        if url.path == "/chapter.json":
+            chapter_id = urllib.parse.parse_qs(url.query)["reference"][0]
+            if chapter_id == "JUD.2":
+                self.send_error(404)
+                return
+            body = json.dumps(
+                {
+                    "response": {
+                        "data": [
+                            {
+                                "download_urls": {
+                                    "format_mp3_32k": f"//{self.headers['Host']}"
+                                    f"/audio/{chapter_id}.mp3"
+                                }
+                            }
+                        ]
+                    }
+                }
+            ).encode()
+        else:
+            chapter_id = url.path.split("/")[-1][: -len(".mp3")]
+            if self.flaky.get(chapter_id):
+                self.flaky[chapter_id] -= 1
+                self.send_error(503)
+                return
+
+            etag = f'"{chapter_id}-1"'
+            headers["ETag"] = etag
+            if self.headers["If-None-Match"] == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            body = AUDIO
+            range_header = self.headers["Range"]
+            if range_header and self.headers["If-Range"] == etag:
+                start = int(range_header[len("bytes=") : -1])
+                if start >= len(AUDIO):
+                    self.send_error(416)
+                    return
+                body = AUDIO[start:]
+                status = 206
+                end = len(AUDIO) - 1
+                headers["Content-Range"] = f"bytes {start}-{end}/{len(AUDIO)}"
+            StubHandler.audio_bytes_sent += len(body)
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def api_url():
+    StubHandler.flaky = {"RUT.2": 2}
+    StubHandler.requests = []
+    StubHandler.audio_bytes_sent = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/chapter.json"
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_chapters(tmp_path, api_url):
+    chapter_ids = ["RUT.1", "RUT.2", "JUD.1", "JUD.2"]
+    failed = get_chapters(
+        chapter_ids, jobs=3, api_url=api_url, audio_dir=str(tmp_path), backoff=0
+    )
+
+    assert failed == ["JUD.2"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "JUD.1.mp3",
+        "RUT.1.mp3",
+        "RUT.2.mp3",
+        "manifest.json",
+    ]
+    assert (tmp_path / "RUT.2.mp3").read_bytes() == AUDIO
+    # The 404 isn't retried, the two 503s are.
+    assert sum("JUD.2" in path for path in StubHandler.requests) == 1
+    assert sum("RUT.2.mp3" in path for path in StubHandler.requests) == 3
+
+
+def test_gives_up_after_retries(tmp_path, api_url):
+    StubHandler.flaky = {"RUT.1": 5}
+    failed = get_chapters(
+        ["RUT.1"], api_url=api_url, audio_dir=str(tmp_path), retries=2, backoff=0
+    )
+
+    assert failed == ["RUT.1"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_resync_only_sends_changes(tmp_path, api_url):
+    StubHandler.flaky = {}
+    chapter_ids = ["RUT.1", "RUT.2"]
+    assert get_chapters(chapter_ids, api_url=api_url, audio_dir=str(tmp_path)) == []
+    assert StubHandler.audio_bytes_sent == 2 * len(AUDIO)
+
+    StubHandler.requests = []
+    assert get_chapters(chapter_ids, api_url=api_url, audio_dir=str(tmp_path)) == []
+    assert StubHandler.audio_bytes_sent == 2 * len(AUDIO)
+    # The audio URLs come from the manifest, not the API.
+    assert all(path.startswith("/audio/") for path in StubHandler.requests)
+
+    # A file that doesn't match the manifest is downloaded again.
+    (tmp_path / "RUT.1.mp3").write_bytes(AUDIO[:10])
+    assert get_chapters(chapter_ids, api_url=api_url, audio_dir=str(tmp_path)) == []
+    assert (tmp_path / "RUT.1.mp3").read_bytes() == AUDIO
+
+
+def test_resumes_partial_download(tmp_path, api_url):
+    (tmp_path / "RUT.1.mp3.part").write_bytes(AUDIO[:1000])
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    manifest.set(
+        "RUT.1",
+        {
+            "url": api_url.replace("chapter.json", "audio/RUT.1.mp3"),
+            "etag": '"RUT.1-1"',
+            "complete": False,
+        },
+    )
+    manifest.save()
+
+    assert get_chapters(["RUT.1"], api_url=api_url, audio_dir=str(tmp_path)) == []
+    assert StubHandler.audio_bytes_sent == len(AUDIO) - 1000
+    assert (tmp_path / "RUT.1.mp3").read_bytes() == AUDIO
+    assert not (tmp_path / "RUT.1.mp3.part").exists()
+
+    entry = Manifest(str(tmp_path / "manifest.json")).get("RUT.1")
+    assert entry["complete"]
+    assert entry["size"] == len(AUDIO)
+    assert entry["sha256"] == hashlib.sha256(AUDIO).hexdigest()
+
+
+def test_restarts_unsatisfiable_resume(tmp_path, api_url):
+    # A partial file longer than the audio can't be resumed.
+    (tmp_path / "RUT.1.mp3.part").write_bytes(AUDIO + b"junk")
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    manifest.set(
+        "RUT.1",
+        {
+            "url": api_url.replace("chapter.json", "audio/RUT.1.mp3"),
+            "etag": '"RUT.1-1"',
+            "complete": False,
+        },
+    )
+    manifest.save()
+
+    assert get_chapters(["RUT.1"], api_url=api_url, audio_dir=str(tmp_path)) == []
+    assert StubHandler.audio_bytes_sent == len(AUDIO)
+    assert (tmp_path / "RUT.1.mp3").read_bytes() == AUDIO
+    assert sum("RUT.1.mp3" in path for path in StubHandler.requests) == 2
+
+
+def test_manifest_saves_in_batches(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = Manifest(path, save_every=2)
+    for chapter_id in ("RUT.1", "RUT.2", "RUT.3"):
+        manifest.set(chapter_id, {"complete": False})
+    assert list(Manifest(path).entries) == ["RUT.1", "RUT.2"]
+
+    manifest.save()
+    assert list(Manifest(path).entries) == ["RUT.1", "RUT.2", "RUT.3"]
+
+
+def test_with_retries_backs_off():
+    delays = []
+    attempts = []
+
+    def action():
+        attempts.append(1)
+        if len(attempts) < 4:
+            raise ConnectionResetError()
+        return "done"
+
+    assert with_retries(action, retries=4, backoff=0.5, sleep=delays.append) == "done"
+    assert delays == [0.5, 1, 2]
+
+
+def test_save_failed(tmp_path):
+    path = str(tmp_path / "failed.json")
+    save_failed(["RUT.1"], path)
+    with open(path, "r", encoding="utf-8") as file:
+        assert json.load(file) == ["RUT.1"]
+
+    save_failed([], path)
+    assert list(tmp_path.iterdir()) == []
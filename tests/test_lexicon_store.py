@@ -0,0 +1,83 @@
+import pytest
+
+from lexicon_store import LexiconStore, build_lexicon, normalize_strong
+
+STRONGS_DEFINITIONS = {
+    "H122": {"lemma": "אָדֹם", "strongs_def": "rosy"},
+    "H7225": {"lemma": "רֵאשִׁית", "strongs_def": "the first"},
+}
+LEXICAL_INDEX = [
+    {
+        "@id": "aez",
+        "def": "rosy",
+        "xref": {"@aug": "b", "@bdb": "a.bd.ae", "@strong": "122", "@twot": "26d"},
+    },
+    {
+        "@id": "afc",
+        "def": "red",
+        "xref": {"@aug": "a", "@bdb": "a.bd.ac", "@strong": "122", "@twot": "26b"},
+    },
+    {
+        "@id": "lqb",
+        "def": "beginning",
+        "xref": {"@bdb": "t.ad.ag", "@strong": "7225", "@twot": "2097e,2097f"},
+    },
+    {"@id": "aaa", "xref": {"@bdb": "a.aa.aa"}},
+]
+INDEX = [{"#text": "lqb", "@aug": "1"}, {"#text": "aez", "@aug": "25"}]
+HEBREW_MAPS = {
+    "idMap": {"1": "lqb"},
+    "strongMap": {"lqb": "7225", "aez": "122"},
+    "bdbMap": {"lqb": "t.ad.ag"},
+    "twotMap": {"lqb": "2097e"},
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "lexicon.sqlite")
+    build_lexicon(STRONGS_DEFINITIONS, LEXICAL_INDEX, INDEX, HEBREW_MAPS, path)
+    with LexiconStore(path) as store:
+        yield store
+
+
+def test_normalize_strong():
+    assert normalize_strong("7225") == "H7225"
+    assert normalize_strong("H0430") == "H430"
+    assert normalize_strong("g26") == "G26"
+    assert normalize_strong("1234A") == "H1234a"
+    assert normalize_strong("a") == "a"
+
+
+def test_entries(store):
+    assert store.entry("lqb")["def"] == "beginning"
+    assert store.entry("zzz") is None
+    assert store.strongs("H7225")["strongs_def"] == "the first"
+    assert store.strongs("07225") == store.strongs("H7225")
+    assert store.strongs("H1") is None
+
+
+def test_resolve(store):
+    assert store.resolve("aug", "1") == ["lqb"]
+    assert store.resolve("aug", "25") == ["aez"]
+    assert store.resolve("bdb", "t.ad.ag") == ["lqb"]
+    assert store.resolve("strong", "H0122") == ["aez", "afc"]
+    assert store.resolve("twot", "2097f") == ["lqb"]
+    assert store.resolve("twot", "2097e,2097f") == []
+    assert store.resolve("aug", "2") == []
+    with pytest.raises(ValueError):
+        store.resolve("osis", "Gen.1.1")
+
+
+def test_lookup(store):
+    assert [entry["@id"] for entry in store.lookup("strong", "122")] == [
+        "aez",
+        "afc",
+    ]
+    assert store.lookup("lexical", "aaa") == [LEXICAL_INDEX[3]]
+    assert store.lookup("lexical", "zzz") == []
+
+
+def test_missing_store(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        LexiconStore(str(tmp_path / "missing.sqlite"))
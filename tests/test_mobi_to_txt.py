@@ -0,0 +1,84 @@
+import pytest
+
+pytest.importorskip("bs4")
+pytest.importorskip("markdownify")
+
+from mobi_to_txt import convert_chapter, convert_items, merge_chapters  # noqa: E402
+
+RUTH_1 = """<!DOCTYPE html>
+<html><body>
+<h1>Ruth Chapter 1</h1>
+<p class="paragraphtitle">Naomi's Family</p>
+<p class="bodytext"><span class="verse">1:1</span> In the days when the judges
+ruled, a man named <b><i>Elimelech</i></b> left.<span class="verse">1:2</span> The
+<span class="smcaps">Lord</span> had visited his_people with *food* [sic].</p>
+<p class="poetry bodytext"><span class="verse">1:3</span> Wherever you go, I will
+go.</p>
+</body></html>"""
+
+# The NET's items sometimes start with the end of the previous chapter.
+RUTH_2 = """<html><body>
+<h1>Ruth Chapter 2</h1>
+<p class="bodytext"><span class="verse">1:22</span> So Naomi returned.</p>
+<p class="bodytext"><span class="verse">2:1</span> Now Naomi had a relative.</p>
+</body></html>"""
+
+CONTENTS = "<html><body><p>Contents</p></body></html>"
+
+
+def test_convert_chapter():
+    chapter_id, text_before_1, md = convert_chapter(RUTH_1, "html.parser")
+    assert (chapter_id, text_before_1) == ("RUT.1", "")
+    # Nothing is escaped, emphasis is a single `*` and the paragraph title and
+    # doctype are left out.
+    assert md == (
+        "[1] In the days when the judges\nruled, a man named *Elimelech* left. "
+        "[2] The\nLORD had visited his_people with *food* [sic].\n\n"
+        "[3] Wherever you go, I will\ngo."
+    )
+
+    assert convert_chapter(CONTENTS, "html.parser") is None
+
+
+def test_convert_chapter_with_text_of_the_previous_chapter():
+    chapter_id, text_before_1, md = convert_chapter(RUTH_2, "html.parser")
+    assert chapter_id == "RUT.2"
+    assert text_before_1.strip() == "[22] So Naomi returned."
+    assert md == "[1] Now Naomi had a relative."
+
+
+def test_merge_chapters():
+    converted = [
+        ("RUT.1", "", "[1] In the days"),
+        None,
+        ("RUT.2", "[22] So Naomi returned.\n\n", "[1] Now Naomi"),
+        ("RUT.3", "", "[1] Naomi said"),
+    ]
+    assert list(merge_chapters(converted)) == [
+        {
+            "chapterId": "RUT.1",
+            "md": "[1] In the days\n\n[22] So Naomi returned.\n\n",
+        },
+        {"chapterId": "RUT.2", "md": "[1] Now Naomi"},
+        {"chapterId": "RUT.3", "md": "[1] Naomi said"},
+    ]
+    assert list(merge_chapters([None])) == []
+
+
+def test_parallel_matches_serial():
+    htmls = [CONTENTS, RUTH_1, RUTH_2] * 3
+    serial = list(convert_items(htmls, "html.parser"))
+    assert list(convert_items(htmls, "html.parser", jobs=2)) == serial
+    assert [item and item[0] for item in serial[:3]] == [None, "RUT.1", "RUT.2"]
+
+
+def test_cleanup_matches_the_replacements_in_order():
+    html = """<html><body>
+<h1>Ruth Chapter 3</h1>
+<p class="bodytext"><span class="verse">3:1</span> One ]\\] two [\\[ three *****
+four ****.</p>
+</body></html>"""
+    # Backslashes go first, so "]\]" becomes "]]" and is removed too, and
+    # "*****" is "***" + "**", which becomes "*" + "**" and then "**".
+    _, _, md = convert_chapter(html, "html.parser")
+    assert md == "[1] One  two  three **\nfour *."
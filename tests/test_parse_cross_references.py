@@ -0,0 +1,133 @@
+import json
+import os
+import struct
+import sys
+
+import pytest
+
+from parse_cross_references import (
+    CrossReferenceIndex,
+    compile_references,
+    read_cross_references,
+    reverse_references,
+    write_references_json,
+)
+from verse_ids import (
+    format_verse_id,
+    load_verses,
+    pack_verse,
+    parse_verse_id,
+    read_uint32s,
+    unpack_verse,
+)
+
+CHAPTER_LENGTHS = os.path.join(
+    os.path.dirname(__file__), "..", "data", "chapterLengths.json"
+)
+
+CROSS_REFERENCES = "\n".join(
+    [
+        "From Verse\tTo Verse\tVotes\t#www.openbible.info CC-BY 2011-12-14",
+        "Rev.22.21\tGen.1.1\t3",
+        "Gen.1.1\tJohn.1.1-John.1.3\t369",
+        "Gen.1.1\tPs.33.6\t203",
+        "Ps.119.176\tIsa.53.6\t50",
+        "Gen.1.1\tHeb.11.3\t280",
+        "",
+    ]
+)
+
+REFERENCES = {
+    "REV.22.21": [["GEN.1.1"]],
+    "GEN.1.1": [["JHN.1.1", "JHN.1.3"], ["PSA.33.6"], ["HEB.11.3"]],
+    "PSA.119.176": [["ISA.53.6"]],
+}
+
+
+@pytest.fixture
+def cross_references_path(tmp_path):
+    path = tmp_path / "cross_references.txt"
+    path.write_text(CROSS_REFERENCES, encoding="utf-8")
+    return str(path)
+
+
+def test_packed_verses_sort_in_biblical_order():
+    verse_ids = ["GEN.1.2", "GEN.2.1", "PSA.119.176", "MAL.4.6", "MAT.1.1"]
+    packed = [parse_verse_id(verse_id) for verse_id in verse_ids]
+
+    assert packed == sorted(packed)
+    assert [format_verse_id(verse) for verse in packed] == verse_ids
+    assert unpack_verse(pack_verse("REV", 22, 21)) == ("REV", 22, 21)
+    with pytest.raises(ValueError):
+        pack_verse("PSA", 1, 256)
+
+
+@pytest.mark.skipif(sys.byteorder == "big", reason="Pretends to be big-endian")
+def test_read_uint32s_on_big_endian(monkeypatch):
+    numbers = [1, 0x01020304, 0xFFFFFFFE]
+    view = memoryview(struct.pack("<3I", *numbers))
+    assert list(read_uint32s(view, 0, 3)) == numbers
+
+    # A big-endian machine sees the little-endian file the other way round.
+    monkeypatch.setattr(sys, "byteorder", "big")
+    view = memoryview(struct.pack(">3I", *numbers))
+    column = read_uint32s(view, 4, 2)
+    assert list(column) == numbers[1:]
+    column.release()
+
+
+def test_references_json(tmp_path, cross_references_path):
+    path = str(tmp_path / "references.json")
+    write_references_json(read_cross_references(cross_references_path), path)
+
+    with open(path, "r", encoding="utf-8") as file:
+        references = json.load(file)
+    assert references == REFERENCES
+    assert list(references) == list(REFERENCES)
+
+
+def test_compiled_index(tmp_path, cross_references_path):
+    path = str(tmp_path / "references.bin")
+    compile_references(read_cross_references(cross_references_path), path)
+
+    with CrossReferenceIndex(path) as index:
+        assert len(index) == len(REFERENCES)
+        for verse_id, references in REFERENCES.items():
+            assert index.get(verse_id) == references
+        assert index.lookup(parse_verse_id("GEN.1.1"))[1] == (
+            parse_verse_id("PSA.33.6"),
+            0,
+        )
+        assert index.get("GEN.1.2") == []
+        assert index.get("REV.22.22") == []
+        assert index.get("XYZ.1.1") == []
+
+
+def test_reverse_index_expands_ranges(tmp_path):
+    references = [
+        (parse_verse_id(verse), parse_verse_id(start), end and parse_verse_id(end))
+        for verse, start, end in [
+            ("JHN.1.1", "GEN.1.30", "GEN.2.2"),
+            ("PSA.33.6", "GEN.1.1", ""),
+            ("HEB.11.3", "GEN.1.1", "GEN.1.1"),
+            ("HEB.11.3", "GEN.1.1", ""),
+            ("REV.1.1", "MAL.4.6", "MAT.1.1"),
+        ]
+    ]
+    path = str(tmp_path / "references_reverse.bin")
+    verses = load_verses(CHAPTER_LENGTHS)
+    compile_references(reverse_references(references, verses), path)
+
+    with CrossReferenceIndex(path) as index:
+        assert index.get("GEN.1.1") == [["PSA.33.6"], ["HEB.11.3"]]
+        for verse_id in ["GEN.1.30", "GEN.1.31", "GEN.2.1", "GEN.2.2"]:
+            assert index.get(verse_id) == [["JHN.1.1"]]
+        assert index.get("GEN.2.3") == []
+        assert index.get("MAL.4.6") == index.get("MAT.1.1") == [["REV.1.1"]]
+        assert len(index) == 7
+
+
+def test_reads_in_batches(cross_references_path):
+    assert list(read_cross_references(cross_references_path, batch_size=2)) == list(
+        read_cross_references(cross_references_path)
+    )
@@ -0,0 +1,113 @@
+import json
+import os
+
+from profiler import (
+    NO_PROFILER,
+    PROFILE_ENV,
+    PROFILE_MEMORY_ENV,
+    REPORT_PATH,
+    Profiler,
+    get_profiler,
+    get_report_path,
+)
+from usfm_to_md import convert_books, usfm_to_markdown
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def test_profiler_adds_up_timings(tmp_path):
+    profiler = Profiler()
+    with profiler.time("stages", "tokenize"):
+        pass
+    with profiler.time("stages", "tokenize"):
+        pass
+    profiler.add("books", "bsb_usfm/GEN", 2.0, 100)
+    profiler.merge(
+        {"books": {"bsb_usfm/GEN": {"calls": 2, "seconds": 1.0, "peak_memory": 300}}}
+    )
+
+    assert profiler.records["stages"]["tokenize"]["calls"] == 2
+    assert profiler.records["books"]["bsb_usfm/GEN"] == {
+        "calls": 3,
+        "seconds": 3.0,
+        "peak_memory": 300,
+    }
+
+    path = str(tmp_path / "profile.json")
+    profiler.write(path)
+    with open(path, "r", encoding="utf-8") as file:
+        report = json.load(file)
+    assert report["books"] == profiler.records["books"]
+    assert "peak_memory" not in report
+
+    summary = profiler.summary(top=1).splitlines()
+    assert summary[0].startswith("stages (1, ")
+    assert summary[1].split()[0] == "tokenize"
+    assert summary[3].split()[0] == "bsb_usfm/GEN"
+
+
+def test_profiler_traces_memory():
+    profiler = Profiler(trace_memory=True)
+    try:
+        with profiler.time("books", "big", memory=True):
+            data = [0] * 1_000_000
+        del data
+        assert profiler.records["books"]["big"]["peak_memory"] >= 8_000_000
+        assert profiler.report()["peak_memory"] >= 8_000_000
+    finally:
+        profiler.stop()
+
+
+def test_null_profiler_records_nothing():
+    with NO_PROFILER.time("stages", "tokenize"):
+        pass
+    NO_PROFILER.add("books", "GEN", 1.0)
+    assert NO_PROFILER.records["stages"] == {}
+    assert NO_PROFILER.records["books"] == {}
+
+
+def test_report_path(monkeypatch):
+    monkeypatch.delenv(PROFILE_ENV, raising=False)
+    monkeypatch.delenv(PROFILE_MEMORY_ENV, raising=False)
+    assert get_report_path(None) is None
+    assert get_report_path("out.json") == "out.json"
+    assert get_profiler(None) is NO_PROFILER
+
+    monkeypatch.setenv(PROFILE_ENV, "1")
+    assert get_report_path(None) == REPORT_PATH
+    monkeypatch.setenv(PROFILE_ENV, "profile.json")
+    assert get_report_path(None) == "profile.json"
+    monkeypatch.setenv(PROFILE_ENV, "0")
+    assert get_report_path(None) is None
+
+    monkeypatch.setenv(PROFILE_MEMORY_ENV, "1")
+    profiler = get_profiler("profile.json")
+    assert profiler.enabled and profiler.trace_memory
+    profiler.stop()
+
+
+def test_profiling_doesnt_change_output():
+    usfm = "\\c 1 \n\\p\n\\v 1 \\w In|strong=\"H7225\"\\w* the beginning (Selah)"
+    profiler = Profiler()
+    assert usfm_to_markdown(usfm, profiler) == usfm_to_markdown(usfm)
+    assert set(profiler.records["stages"]) == {
+        "tokenize",
+        "resolve lines",
+        "render",
+        "tidy",
+    }
+
+
+def test_profiles_books_on_every_process():
+    paths = [
+        os.path.join(DATA, "web_usfm", book_file)
+        for book_file in ("RUT.usfm", "JUD.usfm")
+    ]
+    profiler = Profiler()
+    assert list(convert_books(paths, jobs=2, profiler=profiler)) == list(
+        convert_books(paths)
+    )
+    assert set(profiler.records["books"]) == {"web_usfm/RUT", "web_usfm/JUD"}
+    assert len(profiler.records["chapters"]) == 5
+    assert profiler.records["stages"]["tokenize"]["calls"] == 5
+    assert profiler.records["io"]["read"]["calls"] == 2
@@ -0,0 +1,88 @@
+import pytest
+
+from references import (
+    BOOK_NAMES,
+    BOOKS,
+    parse_book,
+    parse_reference,
+    parse_references,
+    parse_verse,
+)
+from verse_ids import biblical_order, pack_verse, parse_verse_id
+
+
+def ids(*verse_ids):
+    return tuple(parse_verse_id(verse_id) if verse_id else 0 for verse_id in verse_ids)
+
+
+def test_books():
+    assert [book_id for book_id, _, _ in BOOKS] == biblical_order
+    assert BOOK_NAMES["Song of Solomon"] == "SNG"
+    for name in ("GEN", "Gen", "genesis", "Psalm", "Psalms", "PSA", "Ps"):
+        assert parse_book(name) in ("GEN", "PSA")
+    assert parse_book("1 Samuel") == parse_book("I Sam") == parse_book("1SA") == "1SA"
+    assert parse_book("Isa") == "ISA"
+    assert parse_book("Hezekiah") is None
+
+
+@pytest.mark.parametrize(
+    "reference, expected",
+    [
+        ("GEN.1.1", ids("GEN.1.1", "")),
+        ("Gen.1.1", ids("GEN.1.1", "")),
+        ("Gen.1.1-Gen.1.3", ids("GEN.1.1", "GEN.1.3")),
+        ("1Sam.3.4-1Sam.3.6", ids("1SA.3.4", "1SA.3.6")),
+        ("1 Samuel 3:4-6", ids("1SA.3.4", "1SA.3.6")),
+        ("Genesis 1:1–2:3", ids("GEN.1.1", "GEN.2.3")),
+        ("Song of Solomon 2:1", ids("SNG.2.1", "")),
+        ("II Kings 2:11", ids("2KI.2.11", "")),
+        ("Phil 2:5", ids("PHP.2.5", "")),
+        ("Philemon 1:2", ids("PHM.1.2", "")),
+        ("1 John 1:9", ids("1JN.1.9", "")),
+        ("jude 1:3", ids("JUD.1.3", "")),
+        ("Gen 50:26-Exod 1:1", ids("GEN.50.26", "EXO.1.1")),
+        ("Psalm 23", (pack_verse("PSA", 23, 0), 0)),
+        ("Psalms 23-24", (pack_verse("PSA", 23, 0), pack_verse("PSA", 24, 0))),
+        ("Jude 3", ids("JUD.1.3", "")),
+        ("Jude 3-5", ids("JUD.1.3", "JUD.1.5")),
+        ("Jude 1:3", ids("JUD.1.3", "")),
+        ("3 John 14", ids("3JN.1.14", "")),
+        ("Gen 1:1-Obad 21", ids("GEN.1.1", "OBA.1.21")),
+    ],
+)
+def test_parse_reference(reference, expected):
+    assert parse_reference(reference) == expected
+
+
+@pytest.mark.parametrize(
+    "reference",
+    [
+        "",
+        "Gen",
+        "Hezekiah 1:1",
+        "Gen 1:1 and more",
+        "Gen 1:3-1",
+        "Exod 1:1-Gen 1:1",
+        "Gen 0:0",
+        "Gen 0",
+        "Gen 1:0",
+        "GEN.0.1",
+        "Jude 0",
+    ],
+)
+def test_parse_reference_errors(reference):
+    with pytest.raises(ValueError):
+        parse_reference(reference)
+
+
+def test_parse_verse():
+    assert parse_verse("Rev.22.21") == parse_verse("Revelation 22:21")
+    for reference in ("Gen.1.1-Gen.1.3", "Psalm 23"):
+        with pytest.raises(ValueError):
+            parse_verse(reference)
+
+
+def test_parse_references():
+    starts, ends = parse_references(["Gen.1.1", "John 3:16-17", "Gen.1.1"])
+    assert list(starts) == list(ids("GEN.1.1", "JHN.3.16", "GEN.1.1"))
+    assert list(ends) == [0, parse_verse_id("JHN.3.17"), 0]
@@ -0,0 +1,70 @@
+import pytest
+
+from search_index import SearchIndex, build_index, tokenize
+from verse_ids import format_verse_id
+
+CHAPTERS = [
+    {
+        "chapterId": "GEN.1",
+        "md": "# The Creation\n\n[1] In the beginning God created the heavens and "
+        "the earth. [2] Now the earth was formless and void.",
+    },
+    {
+        "chapterId": "PSA.23",
+        "md": "*A Psalm of David.*\n\n[1] The LORD is my shepherd; I shall not "
+        "want. [2] He makes me lie down in green pastures.",
+    },
+    {
+        "chapterId": "JHN.11",
+        "md": "[35] Jesus wept. [36] So the Jews said, “See how He loved him!”",
+    },
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / "search.bin")
+    build_index(CHAPTERS, path)
+    with SearchIndex(path) as index:
+        yield index
+
+
+def verse_ids(verses):
+    return [format_verse_id(verse) for verse in verses]
+
+
+def test_tokenize():
+    tokens = tokenize("The LORD’s *word*, “See!”")
+    assert tokens == ["the", "lord", "s", "word", "see"]
+
+
+def test_term(index):
+    assert verse_ids(index.term("Earth")) == ["GEN.1.1", "GEN.1.2"]
+    assert verse_ids(index.term("the")) == [
+        "GEN.1.1",
+        "GEN.1.2",
+        "PSA.23.1",
+        "JHN.11.36",
+    ]
+    # Headings aren't part of any verse.
+    assert index.term("creation") == []
+    assert index.term("psalm") == []
+
+
+def test_phrase(index):
+    assert verse_ids(index.phrase("the lord is my shepherd")) == ["PSA.23.1"]
+    assert verse_ids(index.phrase("the earth")) == ["GEN.1.1", "GEN.1.2"]
+    assert index.phrase("earth the") == []
+    assert index.phrase("shepherd lie") == []
+
+
+def test_prefix(index):
+    assert verse_ids(index.prefix("Cre")) == ["GEN.1.1"]
+    assert verse_ids(index.prefix("w")) == ["GEN.1.2", "PSA.23.1", "JHN.11.35"]
+    assert index.prefix("x") == []
+
+
+def test_search(index):
+    assert verse_ids(index.search('"the earth" void')) == ["GEN.1.2"]
+    assert verse_ids(index.search("he* the")) == ["GEN.1.1", "JHN.11.36"]
+    assert index.search("") == []
@@ -0,0 +1,105 @@
+import os
+
+from parse_cross_references import CrossReferenceIndex
+import similar_verses
+from similar_verses import (
+    NUM_HASHES,
+    build_similar,
+    get_book_digest,
+    get_shingles,
+    get_signature,
+    get_signatures,
+    split_books,
+)
+from verse_ids import parse_verse_id
+
+CHAPTERS = [
+    {
+        "chapterId": "MAT.3",
+        "md": "[12] His winnowing fork is in His hand to clear His threshing "
+        "floor and to gather His wheat into the barn; but He will burn up the "
+        "chaff with unquenchable fire. [13] At that time Jesus came from "
+        "Galilee to the Jordan to be baptized by John.",
+    },
+    {
+        "chapterId": "LUK.3",
+        "md": "[17] His winnowing fork is in His hand to clear His threshing "
+        "floor and to gather the wheat into His barn; but He will burn up the "
+        "chaff with unquenchable fire. [18] With these and many other "
+        "exhortations, John proclaimed the good news to the people.",
+    },
+    {"chapterId": "JHN.11", "md": "[35] Jesus wept."},
+]
+
+
+def test_shingles_and_signatures():
+    assert get_shingles(["jesus", "wept"]) == get_shingles(["jesus", "wept"])
+    assert len(get_shingles(["wept"])) == 1
+    assert len(get_shingles(["a", "b", "a", "b"])) == 2
+
+    signature = get_signature(get_shingles(["in", "the", "beginning"]))
+    assert len(signature) == NUM_HASHES
+    assert signature == get_signature(get_shingles(["in", "the", "beginning"]))
+    assert signature != get_signature(get_shingles(["in", "the", "end"]))
+
+
+def test_signatures_are_cached_by_book(tmp_path):
+    book = split_books(CHAPTERS)["MAT"]
+    shingles = [get_shingles(words) for _, words in book]
+    cache_path = str(tmp_path / "bsb_MAT.bin")
+
+    signatures = get_signatures(book, shingles, cache_path)
+    assert len(signatures) == len(book) * NUM_HASHES
+    assert os.path.exists(cache_path)
+
+    # The cache is what gets used, until the book changes.
+    assert get_signatures(book, [], cache_path) == signatures
+    changed = [(book[0][0], book[0][1][:-1])] + book[1:]
+    changed_shingles = [get_shingles(words) for _, words in changed]
+    changed_signatures = get_signatures(changed, changed_shingles, cache_path)
+    assert changed_signatures[:NUM_HASHES] != signatures[:NUM_HASHES]
+    assert changed_signatures[NUM_HASHES:] == signatures[NUM_HASHES:]
+    assert get_signatures(changed, [], cache_path) == changed_signatures
+
+
+def test_build_similar(tmp_path):
+    path = str(tmp_path / "similar.bin")
+    build_similar(CHAPTERS, path, str(tmp_path / "cache"))
+
+    with CrossReferenceIndex(path) as index:
+        assert len(index) == 2
+        assert index.lookup(parse_verse_id("MAT.3.12")) == [
+            (parse_verse_id("LUK.3.17"), 0)
+        ]
+        assert index.lookup(parse_verse_id("LUK.3.17")) == [
+            (parse_verse_id("MAT.3.12"), 0)
+        ]
+        assert index.lookup(parse_verse_id("JHN.11.35")) == []
+    assert sorted(os.listdir(tmp_path / "cache")) == [
+        "bsb_JHN.bin",
+        "bsb_LUK.bin",
+        "bsb_MAT.bin",
+    ]
+
+
+def test_digest_has_the_signature_version(monkeypatch):
+    book = split_books(CHAPTERS)["MAT"]
+    digest = get_book_digest(book)
+    monkeypatch.setattr(similar_verses, "SIGNATURE_VERSION", -1)
+    assert get_book_digest(book) != digest
+
+
+def test_prunes_books_that_are_gone(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    (cache_dir / "web_JHN.bin").write_bytes(b"")
+    (cache_dir / "bsb_epub_JHN.bin").write_bytes(b"")
+    build_similar(CHAPTERS, str(tmp_path / "similar.bin"), str(cache_dir))
+    build_similar(CHAPTERS[:2], str(tmp_path / "similar.bin"), str(cache_dir))
+
+    assert sorted(os.listdir(cache_dir)) == [
+        "bsb_LUK.bin",
+        "bsb_MAT.bin",
+        "bsb_epub_JHN.bin",
+        "web_JHN.bin",
+    ]
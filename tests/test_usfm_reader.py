@@ -0,0 +1,72 @@
+import os
+
+from usfm_reader import UsfmBook, get_index_path
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "data")
+
+USFM = (
+    "\\id RUT\r\n\\h Ruth\r\n"
+    "\\c 1\r\n\\p\r\n\\v 1 In the days \\w when|strong=\"H3117\"\\w*\r\n"
+    "\\v 2 The name of the man\r\n"
+    "\\c  2\r\n\\p\r\n\\v 1 Naomi had a relative — “kinsman”\r\n"
+)
+
+
+def test_reads_chapters_and_verses(tmp_path):
+    path = tmp_path / "RUT.usfm"
+    path.write_bytes(USFM.encode("utf-8"))
+
+    with UsfmBook(str(path)) as book:
+        assert list(book.chapter_numbers) == [1, 2]
+        assert book.chapter(1) == (
+            "\\c 1\n\\p\n\\v 1 In the days \\w when|strong=\"H3117\"\\w*\n"
+            "\\v 2 The name of the man\n"
+        )
+        assert book.verse(1, 2) == "\\v 2 The name of the man\n"
+        assert book.verse(2, 1) == "\\v 1 Naomi had a relative — “kinsman”\n"
+        start, end = book.verse_range(2, 1)
+        assert USFM.encode("utf-8")[start:end].startswith(b"\\v 1 Naomi")
+        assert book.chapter(3) is None
+        assert book.verse(1, 3) is None
+        assert [number for number, _ in book.iter_chapters()] == [1, 2]
+
+
+def test_caches_index(tmp_path):
+    path = tmp_path / "web_usfm" / "RUT.usfm"
+    path.parent.mkdir()
+    path.write_bytes(USFM.encode("utf-8"))
+    index_dir = str(tmp_path / "cache")
+    index_path = get_index_path(str(path), index_dir)
+    assert os.path.basename(index_path) == "web_usfm_RUT.usfm.idx"
+
+    with UsfmBook(str(path), index_dir) as book:
+        ranges = [book.chapter_range(1), book.verse_range(2, 1)]
+    assert os.path.exists(index_path)
+
+    # A cached index is used as long as the book doesn't change.
+    with open(index_path, "r+b") as file:
+        file.seek(-4, os.SEEK_END)
+        file.write(b"\0\0\0\0")
+    with UsfmBook(str(path), index_dir) as book:
+        assert book.verse_range(2, 1) == (0, ranges[1][1])
+
+    path.write_bytes(USFM.replace("Ruth", "Rt").encode("utf-8"))
+    with UsfmBook(str(path), index_dir) as book:
+        assert book.chapter_range(1) == (ranges[0][0] - 2, ranges[0][1] - 2)
+
+
+def test_empty_book(tmp_path):
+    path = tmp_path / "EMPTY.usfm"
+    path.write_bytes(b"")
+    with UsfmBook(str(path)) as book:
+        assert book.chapter(1) is None
+        assert list(book.iter_chapters()) == []
+
+
+def test_real_book():
+    path = os.path.join(DATA, "web_usfm", "PHM.usfm")
+    with open(path, "r", encoding="utf-8") as file:
+        usfm = file.read()
+    with UsfmBook(path) as book:
+        assert book.chapter(1) == usfm[usfm.index("\\c 1") :]
+        assert book.verse(1, 25).startswith("\\v 25 ")
@@ -0,0 +1,139 @@
+import os
+
+import pytest
+
+import usfm_to_md
+from usfm_to_md import (
+    convert_book,
+    convert_books,
+    get_cache_path,
+    get_text_offsets,
+    sort_books,
+    usfm_to_markdown,
+    usfm_to_markdown_regex,
+)
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "data")
+
+BOOKS = [
+    (translation, book_file)
+    for translation in ("bsb", "web", "net")
+    for book_file in sorted(os.listdir(os.path.join(DATA, f"{translation}_usfm")))
+]
+
+
+@pytest.mark.parametrize("translation,book_file", BOOKS)
+def test_matches_regex_conversion(translation: str, book_file: str):
+    path = os.path.join(DATA, f"{translation}_usfm", book_file)
+    with open(path, "r", encoding="utf-8") as file:
+        usfm_content = file.read()
+
+    for chapter in usfm_content.split("\\c ")[1:]:
+        chapter = "\\c " + chapter
+        assert usfm_to_markdown(chapter) == usfm_to_markdown_regex(chapter)
+
+
+@pytest.mark.parametrize(
+    "usfm,markdown",
+    [
+        # Only a verse marker that starts a line becomes a verse number.
+        ("\\c 1 \n\\p\n\\v 1 In \\v 2 the", "[1] In 2 the"),
+        # Footnotes run to the last `\f*` on their line.
+        ("\\c 1 \n\\v 1 a\\f + \\ft b\\f* c\\f + d\\f* e", "[1] a e"),
+        # Words of Jesus lose the spaces just inside them.
+        ("\\c 1 \n\\v 1 \\wj  Come. \\wj* x", "[1] **Come.** x"),
+        # `\pmo` is read as `\p` followed by "mo".
+        ("\\c 1 \n\\pmo Then", "mo Then"),
+    ],
+)
+def test_marker_quirks(usfm: str, markdown: str):
+    assert usfm_to_markdown(usfm) == markdown
+    assert usfm_to_markdown_regex(usfm) == markdown
+
+
+def test_sort_books():
+    assert sort_books(["66REVBSB.usfm", "01GENBSB.usfm", "19PSABSB.usfm"]) == [
+        "01GENBSB.usfm",
+        "19PSABSB.usfm",
+        "66REVBSB.usfm",
+    ]
+    assert sort_books(["REV.usfm", "GEN.usfm"]) == ["GEN.usfm", "REV.usfm"]
+
+
+def test_parallel_conversion_keeps_order():
+    paths = [
+        os.path.join(DATA, "web_usfm", book_file)
+        for book_file in ("RUT.usfm", "PSA.usfm", "JUD.usfm")
+    ]
+    assert list(convert_books(paths, jobs=2)) == list(convert_books(paths))
+
+
+def test_cache_skips_unchanged_books(tmp_path, monkeypatch):
+    book_file_path = tmp_path / "RUT.usfm"
+    book_file_path.write_text("\\c 1 \n\\v 1 In the days", encoding="utf-8")
+    paths = [str(book_file_path)]
+    cache_dir = str(tmp_path / "cache")
+
+    chapters = list(convert_books(paths, cache_dir=cache_dir))
+    assert chapters == [
+        [{"chapterId": "RUT.1", "md": "[1] In the days", "textOffsets": [0, 15]}]
+    ]
+
+    def convert_book(book_file_path):
+        raise AssertionError(f"{book_file_path} should have been cached")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(usfm_to_md, "convert_book", convert_book)
+        assert list(convert_books(paths, cache_dir=cache_dir)) == chapters
+
+    book_file_path.write_text("\\c 1 \n\\v 1 When the judges", encoding="utf-8")
+    assert list(convert_books(paths, cache_dir=cache_dir)) == [
+        [{"chapterId": "RUT.1", "md": "[1] When the judges", "textOffsets": [0, 19]}]
+    ]
+
+
+def test_cache_prunes_stale_books(tmp_path):
+    usfm_dir = tmp_path / "bsb_usfm"
+    usfm_dir.mkdir()
+    paths = []
+    for book_id in ("RUT", "JUD"):
+        book_file_path = usfm_dir / f"{book_id}.usfm"
+        book_file_path.write_text("\\c 1 \n\\v 1 Naomi", encoding="utf-8")
+        paths.append(str(book_file_path))
+
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    # Other translations' entries stay, and ones named only by a digest go.
+    other = f"web_usfm.RUT.usfm.{'0' * 64}.json"
+    (cache_dir / other).write_text("[]", encoding="utf-8")
+    (cache_dir / f"{'0' * 64}.json").write_text("[]", encoding="utf-8")
+
+    list(convert_books(paths, cache_dir=str(cache_dir)))
+    entries = sorted(os.listdir(cache_dir))
+    assert len(entries) == 3 and other in entries
+
+    (usfm_dir / "RUT.usfm").write_text("\\c 1 \n\\v 1 Ruth", encoding="utf-8")
+    list(convert_books(paths[:1], cache_dir=str(cache_dir)))
+    cache_name = os.path.basename(get_cache_path(paths[0], str(cache_dir)))
+    assert sorted(os.listdir(cache_dir)) == sorted([cache_name, other])
+
+
+def test_text_offsets():
+    md = "*A psalm*\n\n[1] Hear me. \n[3] Selah 𝄞 \n[4] Amen"
+    offsets = get_text_offsets(md)
+    # Verse 2 is missing, and 𝄞 counts twice like it does in JavaScript.
+    assert offsets == [11, 25, 25, 39, 47]
+    assert md[offsets[0] : offsets[1]] == "[1] Hear me. \n"
+    assert get_text_offsets("No verses") == [9]
+
+
+def test_text_offsets_match_markers():
+    path = os.path.join(DATA, "web_usfm", "PSA.usfm")
+    for chapter in convert_book(path):
+        md = chapter["md"]
+        offsets = chapter["textOffsets"]
+        assert offsets[-1] == len(md)
+        for verse in range(1, len(offsets)):
+            text = md[offsets[verse - 1] : offsets[verse]]
+            assert text.startswith(f"[{verse}]")
+            assert f"[{verse + 1}]" not in text
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from usfm_to_md import convert_book
+from verse_alignment import VerseAlignment, align, compile_alignment, read_verses
+from verse_ids import parse_verse_id
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "data")
+
+# The doxology at the end of Romans 14 in one and Romans 16 in the other, a
+# verse one of them leaves out and a closing verse the other merges into the
+# verse before it.
+FIRST = [
+    {"chapterId": "ROM.14", "md": "[1] Accept the one whose faith is weak"},
+    {
+        "chapterId": "ROM.16",
+        "md": "[1] I commend to you our sister Phoebe "
+        "[2] Now to him who is able to establish you "
+        "[3] to the only wise God be glory forever Amen "
+        "[5] Greet one another with a holy kiss "
+        "[6] The grace of the Lord Jesus Christ be with you all",
+    },
+]
+SECOND = [
+    {
+        "chapterId": "ROM.14",
+        "md": "[1] Now accept one who is weak in faith "
+        "[2] Now to him who is able to make you stand firm "
+        "[3] to the only wise God be the glory forever Amen",
+    },
+    {
+        "chapterId": "ROM.16",
+        "md": "[1] I commend to you Phoebe our sister [4] But this kind "
+        "[5] Greet one another with a holy kiss The grace of the Lord Jesus "
+        "Christ be with you all [6]",
+    },
+]
+
+
+def ids(*verse_ids):
+    return [parse_verse_id(verse_id) for verse_id in verse_ids]
+
+
+def test_read_verses():
+    verses = read_verses(SECOND)
+    assert list(verses) == ids(
+        "ROM.14.1", "ROM.14.2", "ROM.14.3", "ROM.16.1", "ROM.16.4", "ROM.16.5"
+    )
+    assert verses[parse_verse_id("ROM.16.4")] == ["but", "this", "kind"]
+
+
+def test_align():
+    first = read_verses(FIRST)
+    second = read_verses(SECOND)
+    counterparts = align(first, second)
+    assert counterparts == dict(
+        zip(
+            ids("ROM.14.1", "ROM.16.1", "ROM.16.2", "ROM.16.3", "ROM.16.5", "ROM.16.6"),
+            ids("ROM.14.1", "ROM.16.1", "ROM.14.2", "ROM.14.3", "ROM.16.5", "ROM.16.5"),
+        )
+    )
+
+    # Merged verses only go one way, and left out ones have no counterpart.
+    counterparts = align(second, first)
+    assert counterparts[parse_verse_id("ROM.16.5")] == parse_verse_id("ROM.16.5")
+    assert parse_verse_id("ROM.16.4") not in counterparts
+
+
+def test_compiled_alignment(tmp_path):
+    path = str(tmp_path / "alignment.bin")
+    compile_alignment({"bsb": read_verses(FIRST), "web": read_verses(SECOND)}, path)
+
+    with VerseAlignment(path) as alignment:
+        assert alignment.translations == ["bsb", "web"]
+        assert alignment.lookup("bsb", "web", parse_verse_id("ROM.16.2")) == (
+            parse_verse_id("ROM.14.2")
+        )
+        assert alignment.lookup("web", "bsb", parse_verse_id("ROM.14.3")) == (
+            parse_verse_id("ROM.16.3")
+        )
+        assert alignment.counterparts("web", parse_verse_id("ROM.16.4")) == {
+            "bsb": 0,
+            "web": parse_verse_id("ROM.16.4"),
+        }
+        # A verse number a translation skips, one past the end of its
+        # chapter and chapters it doesn't have.
+        for verse_id in ("ROM.16.4", "ROM.16.7", "ROM.15.1", "GEN.1.1"):
+            assert alignment.counterparts("bsb", parse_verse_id(verse_id)) == {
+                "bsb": 0,
+                "web": 0,
+            }
+        with pytest.raises(ValueError):
+            alignment.lookup("bsb", "net", parse_verse_id("ROM.16.1"))
+
+
+def test_aligns_real_translations():
+    def read(book_file):
+        return read_verses(convert_book(os.path.join(DATA, book_file)))
+
+    counterparts = align(read("web_usfm/ROM.usfm"), read("bsb_usfm/46ROMBSB.usfm"))
+    assert [counterparts[verse] for verse in ids("ROM.14.24", "ROM.14.26")] == ids(
+        "ROM.16.25", "ROM.16.27"
+    )
+    assert parse_verse_id("ROM.16.24") not in counterparts
+    assert all(counterparts[verse] == verse for verse in ids("ROM.1.1", "ROM.8.28"))